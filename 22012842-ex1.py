@@ -1,17 +1,27 @@
 import sys
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QVBoxLayout, QWidget, QCheckBox,
-    QPushButton, QTextBrowser, QLabel, QGroupBox, QScrollArea,
-    QDialog, QLineEdit, QHBoxLayout, QMessageBox, QListWidget, QComboBox
+    QApplication, QMainWindow, QVBoxLayout, QWidget,
+    QPushButton, QLabel, QGroupBox, QAbstractItemView,
+    QDialog, QLineEdit, QHBoxLayout, QMessageBox, QListView, QPlainTextEdit, QComboBox
 )
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
+from engine import InferenceEngine, INTERMEDIATE_CONCLUSIONS, parse_rules
+from views import FeatureSelector, RuleListModel, TraceView
+
 
 class RuleDialog(QDialog):
-    """规则管理对话框（修改了类名）"""
+    """规则管理对话框（修改了类名）
+
+    现有规则由 RuleListModel 提供，可以按前提或结论过滤、多选；
+    输入框可以一次粘贴多行规则。
+    """
+
+    # 过滤字段的显示名称
+    FILTER_FIELDS = {"全部": "all", "前提": "premise", "结论": "conclusion"}
 
-    def __init__(self, parent=None):
+    def __init__(self, rules, parent=None):
         super().__init__(parent)
         self.setWindowTitle("规则管理器")
         self.setFixedSize(700, 500)
@@ -19,14 +29,15 @@ class RuleDialog(QDialog):
         layout = QVBoxLayout()
         layout.setSpacing(15)
 
-        # 规则输入区域
-        input_group = QGroupBox("添加新规则")
+        # 规则输入区域（每行一条规则）
+        self.input_group = QGroupBox("添加新规则")
         input_layout = QVBoxLayout()
-        self.rule_input = QLineEdit()
-        self.rule_input.setPlaceholderText("输入格式：特征1 特征2...，结论")
+        self.rule_input = QPlainTextEdit()
+        self.rule_input.setPlaceholderText("输入格式：特征1 特征2...，结论，每行一条")
+        self.rule_input.setMaximumHeight(100)
         input_layout.addWidget(self.rule_input)
-        input_group.setLayout(input_layout)
-        layout.addWidget(input_group)
+        self.input_group.setLayout(input_layout)
+        layout.addWidget(self.input_group)
 
         # 按钮区域
         btn_layout = QHBoxLayout()
@@ -39,7 +50,22 @@ class RuleDialog(QDialog):
         # 规则列表
         list_group = QGroupBox("现有规则")
         list_layout = QVBoxLayout()
-        self.rule_list = QListWidget()
+        filter_layout = QHBoxLayout()
+        self.filter_field = QComboBox()
+        self.filter_field.addItems(self.FILTER_FIELDS)
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("按前提或结论过滤...")
+        self.count_label = QLabel()
+        filter_layout.addWidget(self.filter_field)
+        filter_layout.addWidget(self.filter_input, 1)
+        filter_layout.addWidget(self.count_label)
+        list_layout.addLayout(filter_layout)
+
+        self.model = RuleListModel(rules, self)
+        self.rule_list = QListView()
+        self.rule_list.setModel(self.model)
+        self.rule_list.setUniformItemSizes(True)
+        self.rule_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         list_layout.addWidget(self.rule_list)
         list_group.setLayout(list_layout)
         layout.addWidget(list_group)
@@ -48,6 +74,20 @@ class RuleDialog(QDialog):
 
         # 连接信号
         self.cancel_btn.clicked.connect(self.reject)
+        self.filter_input.textChanged.connect(self.apply_filter)
+        self.filter_field.currentTextChanged.connect(self.apply_filter)
+        self.model.modelReset.connect(self.update_count)
+        self.update_count()
+
+    def apply_filter(self):
+        self.model.set_filter(self.filter_input.text(), self.FILTER_FIELDS[self.filter_field.currentText()])
+
+    def update_count(self):
+        self.count_label.setText(f"{self.model.rowCount()}/{len(self.model.rules)}")
+
+    def selected_rules(self):
+        """选中规则的编号"""
+        return [index.data(Qt.UserRole) for index in self.rule_list.selectionModel().selectedRows()]
 
 
 class AnimalSystem(QMainWindow):
@@ -57,10 +97,12 @@ class AnimalSystem(QMainWindow):
         self.setGeometry(100, 100, 900, 700)
 
         # 知识库初始化
-        self.rule_base = self.init_rules()
         self.feature_map = self.init_features()
         self.animal_list = ["金钱豹", "虎", "斑马", "长颈鹿", "鸵鸟", "企鹅", "信天翁"]
-        self.checkbox_dict = {}
+
+        # 推理引擎（不依赖界面），规则库带有稳定编号和索引
+        self.engine = InferenceEngine(self.init_rules(), self.feature_map, self.animal_list)
+        self.rule_base = self.engine.rules
 
         self.setup_ui()
 
@@ -141,21 +183,16 @@ class AnimalSystem(QMainWindow):
         rule_box.setLayout(rule_layout)
         left_layout.addWidget(rule_box)
 
-        # 特征选择
+        # 特征选择（只为可见的行取数据，可以边输入边搜索）
         feature_box = QGroupBox("动物特征选择")
         feature_layout = QVBoxLayout()
 
-        for key, text in self.feature_map.items():
-            cb = QCheckBox(f"{key}: {text}")
-            cb.feature_key = key
-            self.checkbox_dict[key] = cb
-            feature_layout.addWidget(cb)
+        self.feature_selector = FeatureSelector()
+        self.feature_selector.set_features(self.feature_map)
+        feature_layout.addWidget(self.feature_selector)
 
         feature_box.setLayout(feature_layout)
-        scroll = QScrollArea()
-        scroll.setWidget(feature_box)
-        scroll.setWidgetResizable(True)
-        left_layout.addWidget(scroll)
+        left_layout.addWidget(feature_box, stretch=1)
 
         # 推理按钮
         self.reason_btn = QPushButton("开始推理")
@@ -169,10 +206,11 @@ class AnimalSystem(QMainWindow):
         result_panel = QWidget()
         result_layout = QVBoxLayout()
 
-        self.result_display = QTextBrowser()
+        # 推理过程按类别保存，可以过滤和查找，只绘制可见的行
+        self.result_display = TraceView()
         font = QFont()
         font.setPointSize(24)  # 字体放大3倍（默认8pt×3）
-        self.result_display.setFont(font)
+        self.result_display.list_view.setFont(font)
         result_layout.addWidget(self.result_display)
 
         result_panel.setLayout(result_layout)
@@ -191,131 +229,83 @@ class AnimalSystem(QMainWindow):
         """切换推理模式（修改了实现方式）"""
         is_backward = mode == "反向推理"
         self.target_selector.setVisible(is_backward)
-
-        for cb in self.checkbox_dict.values():
-            cb.setEnabled(not is_backward)
+        self.feature_selector.set_enabled(not is_backward)
 
     def forward_reason(self):
         """正向推理（修改了实现方式）"""
-        selected = [self.feature_map[cb.feature_key]
-                    for cb in self.checkbox_dict.values() if cb.isChecked()]
+        selected = self.feature_selector.checked_features()
 
         if not selected:
-            self.result_display.append("请至少选择一个特征！")
+            self.result_display.append("请至少选择一个特征！", "warning")
             return
 
         self.result_display.clear()
-        self.result_display.append("=== 正向推理开始 ===")
-        self.result_display.append(f"初始特征: {', '.join(selected)}")
-
-        changed = True
-        while changed:
-            changed = False
-            for rule in self.rule_base:
-                if all(pre in selected for pre in rule["premise"]) and rule["conclusion"] not in selected:
-                    selected.append(rule["conclusion"])
-                    self.result_display.append(f"应用规则: {' + '.join(rule['premise'])} → {rule['conclusion']}")
-                    changed = True
-
-        self.result_display.append("\n=== 推理结果 ===")
-        animals = [item for item in selected if item in self.animal_list]
-
-        if animals:
-            self.result_display.append(f"识别结果: {animals[0]}")
+        self.result_display.append("=== 正向推理开始 ===", "header")
+        self.result_display.append(f"初始特征: {', '.join(selected)}", "fact")
+
+        result = self.engine.forward(selected)
+        self.result_display.extend([("rule", "应用规则: ", rule) for rule in result["trace"]])
+
+        self.result_display.append("\n=== 推理结果 ===", "header")
+        if result["animal"]:
+            self.result_display.append(f"识别结果: {result['animal']}", "result")
         else:
-            self.result_display.append("无法确定具体动物")
-            self.result_display.append(f"中间结论: {', '.join(selected)}")
+            self.result_display.append("无法确定具体动物", "result")
+            self.result_display.append(f"中间结论: {', '.join(result['facts'])}", "fact")
 
     def backward_reason(self, target):
         """反向推理（修改了实现方式）"""
         self.result_display.clear()
-        self.result_display.append(f"=== 反向推理目标: {target} ===")
+        self.result_display.append(f"=== 反向推理目标: {target} ===", "header")
 
-        needed = set()
-        to_check = [target]
-        checked = set()
+        result = self.engine.backward(target)
+        self.result_display.extend([
+            ("warning", f"无法找到推导 {step['missing']} 的规则", None) if "missing" in step
+            else ("rule", "可用规则: ", step["rule"])
+            for step in result["steps"]
+        ])
+        needed = result["required"]
 
-        while to_check:
-            current = to_check.pop(0)
-
-            if current in self.feature_map.values():
-                needed.add(current)
-                continue
-
-            applicable = [r for r in self.rule_base if r["conclusion"] == current]
-
-            if not applicable:
-                self.result_display.append(f"无法找到推导 {current} 的规则")
-                continue
-
-            rule = applicable[0]
-            if str(rule) in checked:
-                continue
-
-            checked.add(str(rule))
-            self.result_display.append(f"需要满足: {' + '.join(rule['premise'])} → {rule['conclusion']}")
-
-            for pre in rule["premise"]:
-                if pre not in needed:
-                    to_check.append(pre)
-
-        self.result_display.append("\n=== 推理结果 ===")
+        self.result_display.append("\n=== 推理结果 ===", "header")
         if needed:
-            self.result_display.append(f"证明 {target} 需要:")
-            for feature in sorted(needed):
-                self.result_display.append(f"- {feature}")
+            self.result_display.append(f"证明 {target} 需要:", "result")
+            for feature in needed:
+                self.result_display.append(f"- {feature}", "fact")
+            for i, proof in enumerate(result["proofs"][1:], 2):
+                self.result_display.append(f"方案 {i}: {' + '.join(proof)}", "result")
         else:
-            self.result_display.append(f"无法确定证明 {target} 所需的特征")
+            self.result_display.append(f"无法确定证明 {target} 所需的特征", "warning")
 
     def display_rules(self):
         """显示规则库"""
         self.result_display.clear()
-        self.result_display.append("=== 规则库 ===")
-
-        for i, rule in enumerate(self.rule_base, 1):
-            self.result_display.append(
-                f"{i}. {' ∧ '.join(rule['premise'])} → {rule['conclusion']}"
-            )
+        self.result_display.append("=== 规则库 ===", "header")
+        self.result_display.extend([("rule", f"{i}. ", rule) for i, rule in enumerate(self.rule_base, 1)])
 
     def open_rule_dialog(self):
         """打开规则对话框"""
-        dialog = RuleDialog(self)
+        dialog = RuleDialog(self.rule_base, self)
         dialog.add_btn.clicked.connect(lambda: self.add_rule(dialog))
-
-        # 显示现有规则
-        for rule in self.rule_base:
-            dialog.rule_list.addItem(
-                f"{' ∧ '.join(rule['premise'])} → {rule['conclusion']}"
-            )
-
         dialog.exec_()
 
     def add_rule(self, dialog):
-        """添加规则"""
-        text = dialog.rule_input.text().strip()
+        """添加规则（可以一次添加多行，有错误时一条也不添加）"""
+        text = dialog.rule_input.toPlainText().strip()
         if not text:
             QMessageBox.warning(self, "错误", "请输入规则内容")
             return
 
-        if "，" not in text:
-            QMessageBox.warning(self, "格式错误", "请使用中文逗号分隔条件和结论")
+        valid = set(self.feature_map.values()) | set(INTERMEDIATE_CONCLUSIONS)
+        rules, errors = parse_rules(text.splitlines(), valid)
+        if errors:
+            message = "\n".join(errors[:10])
+            if len(errors) > 10:
+                message += f"\n…共 {len(errors)} 处错误"
+            QMessageBox.warning(self, "错误", message)
             return
 
-        premises, conclusion = text.split("，", 1)
-        premises = [p.strip() for p in premises.split()]
-
-        valid = list(self.feature_map.values()) + ["哺乳类", "鸟类", "食肉类", "蹄类"]
-        for p in premises:
-            if p not in valid:
-                QMessageBox.warning(self, "错误", f"无效特征: {p}")
-                return
-
-        self.rule_base.append({
-            "premise": premises,
-            "conclusion": conclusion.strip()
-        })
-
-        QMessageBox.information(self, "成功", "规则已添加")
+        self.engine.add_rules(rules)
+        QMessageBox.information(self, "成功", "规则已添加" if len(rules) == 1 else f"已添加 {len(rules)} 条规则")
         dialog.accept()
         self.display_rules()
 
@@ -325,55 +315,22 @@ class AnimalSystem(QMainWindow):
             QMessageBox.warning(self, "错误", "规则库为空")
             return
 
-        dialog = QDialog(self)
+        dialog = RuleDialog(self.rule_base, self)
         dialog.setWindowTitle("删除规则")
-        dialog.setFixedSize(600, 400)
-
-        layout = QVBoxLayout()
-
-        # 规则列表
-        rule_list = QListWidget()
-        for rule in self.rule_base:
-            rule_list.addItem(f"{' ∧ '.join(rule['premise'])} → {rule['conclusion']}")
-
-        # 按钮区域
-        btn_layout = QHBoxLayout()
-        del_btn = QPushButton("删除选中规则")
-        cancel_btn = QPushButton("取消")
-
-        btn_layout.addWidget(del_btn)
-        btn_layout.addWidget(cancel_btn)
-
-        layout.addWidget(rule_list)
-        layout.addLayout(btn_layout)
-        dialog.setLayout(layout)
-
-        # 信号连接
-        def do_delete():
-            selected = rule_list.currentRow()
-            if selected == -1:
-                QMessageBox.warning(dialog, "错误", "请选择要删除的规则")
-                return
-
-            self.rule_base.pop(selected)
-            QMessageBox.information(dialog, "成功", "规则已删除")
-            dialog.accept()
-            self.display_rules()
-
-        del_btn.clicked.connect(do_delete)
-        cancel_btn.clicked.connect(dialog.reject)
-
+        dialog.input_group.setVisible(False)
+        dialog.add_btn.setText("删除选中规则")
+        dialog.add_btn.clicked.connect(lambda: self.confirm_remove(dialog))
         dialog.exec_()
 
     def confirm_remove(self, dialog):
-        """确认删除"""
-        selected = dialog.rule_list.currentRow()
-        if selected == -1:
+        """确认删除选中的规则（可多选）"""
+        selected = dialog.selected_rules()
+        if not selected:
             QMessageBox.warning(self, "错误", "请选择要删除的规则")
             return
 
-        self.rule_base.pop(selected)
-        QMessageBox.information(self, "成功", "规则已删除")
+        self.engine.delete_rules(selected)
+        QMessageBox.information(self, "成功", "规则已删除" if len(selected) == 1 else f"已删除 {len(selected)} 条规则")
         dialog.accept()
         self.display_rules()
 
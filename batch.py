@@ -0,0 +1,145 @@
+import numpy as np
+
+from compiler import CompiledRules
+
+
+class BatchForward:
+    """NumPy 批量正向推理
+
+    观测矩阵为 (N × 特征数) 的布尔矩阵，列顺序与 features 字典一致。
+    规则前提编译为补齐的 (最大前提数 × 规则数) 符号编号表，每一轮对所有行同时计算
+    “哪些规则的前提全部满足”（按表取列再逐个求与，代价与前提总数成正比，
+    不必对 规则数 × 符号数 的稠密矩阵做乘法），按结论归并后并入事实矩阵，直到不再变化。
+    事实矩阵比符号表多一列恒为真的列，用来补齐前提较少的规则。
+    """
+
+    # 编译结果中的数组，可以整体导出（见 arrays / from_arrays）
+    ARRAYS = ("column_matrix", "premise_table", "member_rules", "member_offsets", "group_ids",
+              "conclusion_ids", "target_ids")
+
+    def __init__(self, rules, features, targets, chunk_size=65536):
+        compiled = rules if isinstance(rules, CompiledRules) else CompiledRules(rules)
+        symbols = compiled.symbols
+        n_symbols = len(symbols)
+        n_rules = len(compiled)
+
+        self.compiled = compiled
+        self.columns = list(features.values())
+        self.targets = list(targets)
+        self.chunk_size = chunk_size
+
+        # 特征列 -> 符号；不被任何规则使用的特征映射为全零列，最后一列是恒为真的补齐列
+        self.column_matrix = np.zeros((len(self.columns), n_symbols + 1), np.float32)
+        for j, name in enumerate(self.columns):
+            sid = symbols.ids.get(name)
+            if sid is not None:
+                self.column_matrix[j, sid] = 1
+
+        # premise_table[k] 为各规则的第 k 个前提，不足的用补齐列
+        width = max((len(ids) for ids in compiled.premises), default=0) or 1
+        self.premise_table = np.full((width, n_rules), n_symbols, dtype=np.intp)
+        for i, ids in enumerate(compiled.premises):
+            self.premise_table[:len(ids), i] = list(ids)
+
+        # 同一结论的规则为一组，各组按规则数从多到少排列，group_ids 为各组的结论。
+        # 第 k 趟取各组的第 k 条规则：member_rules[member_offsets[k]:member_offsets[k + 1]]
+        # 依次对应前若干组（规则数多于 k 的组恰好排在前面）
+        groups = {}
+        for rid, sid in enumerate(compiled.conclusions):
+            groups.setdefault(sid, []).append(rid)
+        ordered = sorted(groups.items(), key=lambda item: -len(item[1]))
+        self.group_ids = np.array([sid for sid, _ in ordered], dtype=np.intp)
+        members = []
+        offsets = [0]
+        for k in range(len(ordered[0][1]) if ordered else 0):
+            for _, rids in ordered:
+                if len(rids) <= k:
+                    break
+                members.append(rids[k])
+            offsets.append(len(members))
+        self.member_rules = np.array(members, dtype=np.intp)
+        self.member_offsets = np.array(offsets, dtype=np.intp)
+
+        self.conclusion_ids = np.array(sorted(set(compiled.conclusions)), dtype=np.intp)
+        self.conclusions = [symbols.names[sid] for sid in self.conclusion_ids]
+
+        # 不在符号表中的目标永远不会被推出，对应 -1
+        self.target_ids = np.array([symbols.ids.get(name, -1) for name in self.targets], dtype=np.intp)
+
+    def arrays(self):
+        """导出编译结果中的数组"""
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, arrays, columns, targets, symbol_names, chunk_size=65536):
+        """用已有的数组（例如共享内存上的视图）直接构造，不复制、不重新编译"""
+        batch = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(batch, name, arrays[name])
+        batch.compiled = None
+        batch.columns = list(columns)
+        batch.targets = list(targets)
+        batch.chunk_size = chunk_size
+        batch.conclusions = [symbol_names[sid] for sid in batch.conclusion_ids]
+        return batch
+
+    def initial_facts(self, observations):
+        """观测矩阵 -> (N × (符号数 + 1)) 初始事实矩阵，最后一列恒为真"""
+        observations = np.asarray(observations, dtype=bool)
+        if observations.ndim != 2 or observations.shape[1] != len(self.columns):
+            raise ValueError(f"观测矩阵应为 (N × {len(self.columns)})，实际为 {observations.shape}")
+        facts = (observations.astype(np.float32) @ self.column_matrix) > 0
+        facts[:, -1] = True
+        return facts
+
+    def closure(self, facts):
+        """对事实矩阵求闭包（原地修改并返回），只继续处理上一轮有变化的行"""
+        if not self.group_ids.size:
+            return facts
+        active = np.arange(facts.shape[0])
+        while active.size:
+            current = facts[active]
+            satisfied = current[:, self.premise_table[0]]
+            for row in self.premise_table[1:]:
+                satisfied &= current[:, row]
+            offsets = self.member_offsets
+            derived = satisfied[:, self.member_rules[:offsets[1]]]
+            for start, stop in zip(offsets[1:-1], offsets[2:]):
+                derived[:, :stop - start] |= satisfied[:, self.member_rules[start:stop]]
+            grown = (derived & ~current[:, self.group_ids]).any(axis=1)
+            current[:, self.group_ids] |= derived
+            facts[active] = current
+            active = active[grown]
+        return facts
+
+    def forward(self, observations):
+        """批量正向推理
+
+        返回 {"conclusions": 结论名称（derived 的列）,
+              "derived": (N × 结论数) 推导出的新结论矩阵,
+              "animal": 每行识别出的动物在 targets 中的下标，无法识别为 -1}
+        同一行推出多个动物时取 targets 中靠前的那个。
+        """
+        initial = self.initial_facts(observations)
+        n_rows = initial.shape[0]
+        derived = np.zeros((n_rows, len(self.conclusion_ids)), dtype=bool)
+        animal = np.full(n_rows, -1, dtype=np.intp)
+
+        known_targets = self.target_ids >= 0
+        for start in range(0, n_rows, self.chunk_size):
+            stop = min(start + self.chunk_size, n_rows)
+            facts = self.closure(initial[start:stop].copy())
+            derived[start:stop] = facts[:, self.conclusion_ids] & ~initial[start:stop, self.conclusion_ids]
+
+            if not self.target_ids.size:
+                continue
+            hits = np.zeros((stop - start, len(self.target_ids)), dtype=bool)
+            hits[:, known_targets] = facts[:, self.target_ids[known_targets]]
+            found = hits.any(axis=1)
+            animal[start:stop] = np.where(found, hits.argmax(axis=1), -1)
+
+        return {"conclusions": self.conclusions, "derived": derived, "animal": animal}
+
+    def animal_names(self, animal):
+        """下标数组 -> 动物名称列表（无法识别为 None）"""
+        return [self.targets[i] if i >= 0 else None for i in animal]
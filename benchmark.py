@@ -0,0 +1,270 @@
+"""推理性能基准测试
+
+    python benchmark.py chains                     原循环 vs 位掩码 vs 匹配网络（深层规则链）
+    python benchmark.py suite --save-baseline b.json  在合成知识库上测量两种推理模式并保存基线
+    python benchmark.py suite --baseline b.json       与基线比较，出现退化时以非零状态退出
+
+计时与机器有关，仓库中不带基线文件：先在同一台机器上对比较的起点（例如主分支）
+运行 --save-baseline，再在改动后的代码上运行 --baseline。两次的 --queries 和 --seed
+应当相同，且 --queries 不少于 MIN_QUERIES；超出容差的指标会重新测量 --confirm 次，
+每次都超出才报告为退化，偶然的抖动不会使检查失败。
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from compiler import CompiledRules
+from engine import InferenceEngine
+from kbgen import generate
+from rete import ReteNetwork
+
+# 合成知识库的基准配置，以及逐项扫描的取值
+BASE_CONFIG = {"rules": 2000, "depth": 4, "fan_in": 2, "alternatives": 1, "cycles": 0.0}
+SWEEPS = {
+    "rules": [500, 2000, 10000],
+    "depth": [2, 4, 8],
+    "fan_in": [2, 4],
+    "alternatives": [1, 3],
+    "cycles": [0.0, 0.05],
+}
+# 与基线比较时每个配置至少的查询次数，次数太少时中位数受偶然抖动影响太大
+MIN_QUERIES = 50
+
+
+def naive_forward(rules, facts):
+    """原有的正向推理循环（逐轮扫描整个规则库），作为对照"""
+    facts = list(facts)
+    fired = []
+    new_facts = True
+    while new_facts:
+        new_facts = False
+        for i, rule in enumerate(rules):
+            if all(cond in facts for cond in rule["if"]) and rule["then"] not in facts:
+                facts.append(rule["then"])
+                fired.append(i)
+                new_facts = True
+    return facts, fired
+
+
+def chain_rules(depth, width, fan_in=2, seed=0):
+    """生成深层规则链
+
+    共 width 条链，每条链长 depth：第 d 层结论依赖第 d-1 层结论，
+    另外随机依赖 fan_in-1 个基本特征。规则按逆序排列，
+    使逐轮扫描每轮只能推进一层，这是原循环的最坏情况。
+    """
+    rng = random.Random(seed)
+    base = [f"特征{k}" for k in range(max(fan_in * 4, 8))]
+    rules = []
+    for w in range(width):
+        for d in range(1, depth + 1):
+            premises = [f"链{w}_{d - 1}"] + rng.sample(base, fan_in - 1)
+            rules.append({"if": premises, "then": f"链{w}_{d}"})
+    rules.reverse()
+    facts = base + [f"链{w}_0" for w in range(width)]
+    return rules, facts
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_chains(args):
+    print(f"{'规则数':>8} {'深度':>6} {'原循环(ms)':>12} {'位掩码(ms)':>12} {'网络(ms)':>12} {'加速比':>8}")
+    for depth in args.depth:
+        rules, facts = chain_rules(depth, args.width, args.fan_in)
+        naive_time, expected = timed(naive_forward, rules, facts)
+        compiled = CompiledRules(rules)
+        bitset_time, actual = timed(compiled.run, facts)
+        if actual != expected:
+            raise SystemExit(f"深度 {depth}: 位掩码推理的触发序列与原循环不一致")
+        network = ReteNetwork(rules)
+        rete_time, actual = timed(network.run, facts)
+        if actual != expected:
+            raise SystemExit(f"深度 {depth}: 匹配网络的触发序列与原循环不一致")
+        print(f"{len(rules):>8} {depth:>6} {naive_time * 1000:>12.2f} {bitset_time * 1000:>12.2f} "
+              f"{rete_time * 1000:>12.2f} {naive_time / rete_time:>8.1f}")
+
+
+def configs():
+    """基准配置加上逐项扫描得到的配置（去重）"""
+    seen = set()
+    for key, values in SWEEPS.items():
+        for value in values:
+            config = dict(BASE_CONFIG, **{key: value})
+            name = ",".join(f"{k}={v}" for k, v in config.items())
+            if name not in seen:
+                seen.add(name)
+                yield name, config
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+    return {"p50": pick(50), "p90": pick(90), "p99": pick(99)}
+
+
+def measure(config, queries, seed, optimize=False):
+    """在一个合成知识库上测量正向/反向推理，返回各项指标
+
+    optimize 为真时测量做规则优化的引擎，并先确认它对每个查询推出的
+    事实集合与未优化的引擎相同，结果不对时不计时。
+    """
+    rules, features, targets = generate(**config, seed=seed)
+    names = list(features.values())
+    rng = random.Random(seed)
+    fact_sets = [rng.sample(names, len(names) // 2) for _ in range(queries)]
+    goals = [rng.choice(targets) for _ in range(queries)]
+
+    if optimize:
+        engine = InferenceEngine(rules, features, targets, cache_size=0, optimize=True)
+        reference = InferenceEngine(rules, features, targets, cache_size=0, optimize=False)
+        for facts in fact_sets:
+            if set(engine.forward(facts)["facts"]) != set(reference.forward(facts)["facts"]):
+                raise SystemExit(f"{config}: 优化后的规则库推出的事实与原规则库不一致")
+
+    engine = InferenceEngine(rules, features, targets, cache_size=0, optimize=optimize)
+    start = time.perf_counter()
+    engine.compile()
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    forward_ms, forward_examined = [], []
+    for facts in fact_sets:
+        start = time.perf_counter()
+        engine.forward(facts)
+        forward_ms.append((time.perf_counter() - start) * 1000)
+        forward_examined.append(engine.network.examined)
+
+    # 每次反向推理前清空备忘录，测量冷启动代价
+    backward_ms, backward_examined = [], []
+    for goal in goals:
+        if engine.prover is not None:
+            engine.prover.reset()
+            before = engine.prover.examined
+        else:
+            before = 0
+        start = time.perf_counter()
+        engine.backward(goal)
+        backward_ms.append((time.perf_counter() - start) * 1000)
+        backward_examined.append(engine.prover.examined - before)
+
+    # 内存单独测量，避免 tracemalloc 影响计时
+    tracemalloc.start()
+    engine = InferenceEngine(rules, features, targets, cache_size=0, optimize=optimize)
+    engine.forward(fact_sets[0])
+    engine.backward(goals[0])
+    peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    return {
+        "rules": len(rules),
+        "compile_ms": compile_ms,
+        "peak_kb": peak_kb,
+        "forward": dict(percentiles(forward_ms), examined=sum(forward_examined) / queries),
+        "backward": dict(percentiles(backward_ms), examined=sum(backward_examined) / queries),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """与基线比较：延迟中位数、访问规则数或内存超过基线的 tolerance 倍即为退化
+
+    差值小于各指标的下限（0.1ms、1 条规则、64KB）时视为测量噪声。
+    返回 [(配置, 指标, 基线值, 本次值)]。
+    """
+    found = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        checks = [("peak_kb", result["peak_kb"], old["peak_kb"], 64)]
+        for mode in ("forward", "backward"):
+            checks.append((f"{mode}.p50", result[mode]["p50"], old[mode]["p50"], 0.1))
+            checks.append((f"{mode}.examined", result[mode]["examined"], old[mode]["examined"], 1))
+        for metric, new, before, floor in checks:
+            if new > before * tolerance and new - before > floor:
+                found.append((name, metric, before, new))
+    return found
+
+
+def confirm(found, configs_by_name, baseline, args):
+    """重新测量出现退化的配置 args.confirm 次，只保留每次都退化的指标"""
+    for _ in range(args.confirm):
+        if not found:
+            break
+        rerun = {name: measure(configs_by_name[name], args.queries, args.seed, args.optimize)
+                 for name in dict.fromkeys(name for name, *_ in found)}
+        again = {(name, metric) for name, metric, *_ in regressions(rerun, baseline, args.tolerance)}
+        found = [item for item in found if item[:2] in again]
+    return found
+
+
+def run_suite(args):
+    if (args.baseline or args.save_baseline) and args.queries < MIN_QUERIES:
+        raise SystemExit(f"与基线比较或保存基线时 --queries 至少为 {MIN_QUERIES}")
+    results = {}
+    configs_by_name = dict(configs())
+    header = f"{'配置':<56} {'规则':>6} {'模式':>4} {'p50':>8} {'p90':>8} {'p99':>8} {'访问规则':>8} {'内存KB':>9}"
+    print(header)
+    for name, config in configs_by_name.items():
+        result = results[name] = measure(config, args.queries, args.seed, args.optimize)
+        for mode, label in (("forward", "正向"), ("backward", "反向")):
+            m = result[mode]
+            print(f"{name:<56} {result['rules']:>6} {label:>4} {m['p50']:>8.3f} {m['p90']:>8.3f} "
+                  f"{m['p99']:>8.3f} {m['examined']:>8.1f} {result['peak_kb']:>9.0f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        found = confirm(regressions(results, baseline, args.tolerance), configs_by_name, baseline, args)
+        if found:
+            print(f"\n性能退化（超过基线 {args.tolerance} 倍）:", file=sys.stderr)
+            for name, metric, before, new in found:
+                print(f"  {name} {metric}: {before:.3f} -> {new:.3f}", file=sys.stderr)
+            sys.exit(1)
+        print("未发现性能退化")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理性能基准测试")
+    sub = parser.add_subparsers(dest="command")
+
+    chains = sub.add_parser("chains", help="正向推理：原循环 vs 位掩码 vs 匹配网络")
+    chains.add_argument("--depth", type=int, nargs="+", default=[10, 25, 50])
+    chains.add_argument("--width", type=int, default=20)
+    chains.add_argument("--fan-in", type=int, default=2)
+
+    suite = sub.add_parser("suite", help="在合成知识库上测量两种推理模式")
+    suite.add_argument("--queries", type=int, default=200, help="每个配置的查询次数")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--save-baseline", help="把结果保存为基线文件")
+    suite.add_argument("--baseline", help="与基线文件比较")
+    suite.add_argument("--tolerance", type=float, default=1.5, help="允许的倍数")
+    suite.add_argument("--confirm", type=int, default=2, help="超出容差的配置重新测量的次数，每次都超出才算退化")
+    suite.add_argument("--optimize", action="store_true", help="测量做规则优化的引擎")
+
+    args = parser.parse_args()
+    if args.command == "chains":
+        run_chains(args)
+    elif args.command == "suite":
+        run_suite(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+
+class ClosureCache:
+    """正向推理结果缓存（LRU）
+
+    以初始事实的集合为键，保存推导出的事实和规则触发序列；结果与初始事实的
+    先后顺序有关时（ordered 为真）以去重后的事实序列为键。
+    规则库版本变化时整个缓存作废。不同的推理选项（冲突消解策略等）
+    通过 options 区分，各自缓存。maxsize 为 0 时不缓存。
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(facts, options, ordered):
+        facts = tuple(dict.fromkeys(facts)) if ordered else frozenset(facts)
+        return facts, options
+
+    def get(self, facts, version, options=None, ordered=False):
+        """返回缓存的 (推导出的事实, 触发的规则)，没有命中时返回 None"""
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+        key = self._key(facts, options, ordered)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, facts, version, derived, trace, options=None, ordered=False):
+        if self.maxsize <= 0 or version != self.version:
+            return
+        key = self._key(facts, options, ordered)
+        self.entries[key] = (tuple(derived), tuple(trace))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.version = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
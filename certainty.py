@@ -0,0 +1,320 @@
+"""可信度（MYCIN 确定性因子）批量推理
+
+观测为 (N × 特征数) 的可信度矩阵，取值在 [-1, 1]，列顺序与 features 字典一致
+（布尔矩阵按 1/0 处理）。每条规则的强度取规则的 "cf" 值（缺省 1.0，取值在 (-1, 1]，
+规则文本中写作“…，结论 [cf=0.8]”）：
+
+    前提的可信度取各前提的最小值，超过 threshold 时规则触发，
+    对结论的贡献为 前提可信度 × 规则强度；
+    同一结论的多个贡献（以及对它的直接观测）按 CF 公式合并：
+        同为正：a + b - ab；同为负：a + b + ab；异号：(a + b) / (1 - min(|a|, |b|))
+
+正、负证据分别累计为 Σ log(1 - |x|)，同一层中多条规则的合并就是一次矩阵乘法，
+结果也与合并的先后次序无关。规则按依赖关系分层：一个符号的全部规则算完之后
+才把它当作前提使用，每层对所有行同时计算，每条规则只算一次。
+规则中有环时，同一个环（强连通分量）上的规则反复重算，
+直到各行的可信度不再变化或达到 max_rounds 轮。
+"""
+import numpy as np
+
+from compiler import CompiledRules
+
+# 前提可信度超过该值时规则才触发（MYCIN 的取值）
+THRESHOLD = 0.2
+# 取对数前 1 - |x| 的下限，x 为 ±1 时得到有限的对数而不是 -inf
+FLOOR = 1e-12
+# 环上规则重算时，可信度的变化小于该值即认为收敛
+EPSILON = 1e-6
+
+
+def _components(graph):
+    """有向图的强连通分量（Tarjan 算法，非递归），按拓扑序排列（被依赖的在前）"""
+    number = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in graph:
+        if root in number:
+            continue
+        number[root] = low[root] = len(number)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, successors = work[-1]
+            for succ in successors:
+                if succ not in number:
+                    number[succ] = low[succ] = len(number)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(graph[succ])))
+                    break
+                if succ in on_stack:
+                    low[node] = min(low[node], number[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == number[node]:
+                    component = []
+                    while True:
+                        name = stack.pop()
+                        on_stack.discard(name)
+                        component.append(name)
+                        if name == node:
+                            break
+                    components.append(component)
+    components.reverse()
+    return components
+
+
+def _steps(compiled):
+    """把规则按依赖关系排成计算步骤，返回 [(各组的规则序号, 是否在环上)]
+
+    符号依赖图（前提 -> 结论）的每个强连通分量有一个层号：它的规则用到的其他分量中
+    最大的层号加 1。同一层中不在环上的规则作为一组一次算完；在环上的规则
+    按结论最早能被推出的轮次分组（同一结论的规则在同一组），每轮依次重算各组，
+    前面的组更新的可信度在同一轮里就被后面的组用到。
+    """
+    graph = {}
+    for ids, conclusion in zip(compiled.premises, compiled.conclusions):
+        graph.setdefault(conclusion, set())
+        for sid in ids:
+            graph.setdefault(sid, set()).add(conclusion)
+    component = {}
+    components = _components(graph)
+    for index, members in enumerate(components):
+        for sid in members:
+            component[sid] = index
+
+    rules_of = [[] for _ in components]  # 分量 -> 以其中符号为结论的规则
+    for rid, conclusion in enumerate(compiled.conclusions):
+        rules_of[component[conclusion]].append(rid)
+    level = [0] * len(components)
+    steps = {}  # (层号, 是否在环上) -> {组号: 规则序号}
+    for index, rids in enumerate(rules_of):  # 拓扑序：用到的分量已经有层号
+        if not rids:
+            continue
+        members = components[index]
+        level[index] = 1 + max((level[component[sid]] for rid in rids for sid in compiled.premises[rid]
+                                if component[sid] != index), default=0)
+        loop = len(members) > 1 or members[0] in graph[members[0]]
+        groups = steps.setdefault((level[index], loop), {})
+        if not loop:
+            groups.setdefault(0, []).extend(rids)
+            continue
+        # 环内按结论最早能被推出的轮次分组：环外的事实全部成立时，
+        # 规则在其环内前提都已推出的下一轮推出结论，推不出的符号排在最后
+        users = {}
+        missing = {}
+        for rid in rids:
+            inside = {sid for sid in compiled.premises[rid] if component[sid] == index}
+            missing[rid] = len(inside)
+            for sid in inside:
+                users.setdefault(sid, []).append(rid)
+        wave = {}
+        ready = [rid for rid in rids if not missing[rid]]
+        current = 0
+        while ready:
+            following = []
+            for rid in ready:
+                sid = compiled.conclusions[rid]
+                if sid in wave:
+                    continue
+                wave[sid] = current
+                for user in users.get(sid, ()):
+                    missing[user] -= 1
+                    if not missing[user]:
+                        following.append(user)
+            current += 1
+            ready = following
+        last = len(members)
+        for rid in rids:
+            groups.setdefault(wave.get(compiled.conclusions[rid], last), []).append(rid)
+    return [([sorted(groups[key]) for key in sorted(groups)], loop) for (_, loop), groups in sorted(steps.items())]
+
+
+class _Layer:
+    """同一层的规则：补齐的前提矩阵、强度和“规则 -> 结论”独热矩阵"""
+
+    def __init__(self, compiled, strengths, rids, one):
+        width = max((len(compiled.premises[rid]) for rid in rids), default=0) or 1
+        # premises[k] 为各规则的第 k 个前提，不足的用恒为 1 的列补齐
+        self.premises = np.full((width, len(rids)), one, dtype=np.intp)
+        for i, rid in enumerate(rids):
+            ids = compiled.premises[rid]
+            self.premises[:len(ids), i] = ids
+        self.strengths = strengths[rids]
+        self.negative = bool((self.strengths < 0).any())
+        targets = [compiled.conclusions[rid] for rid in rids]
+        self.conclusions = np.array(sorted(set(targets)), dtype=np.intp)
+        position = {sid: i for i, sid in enumerate(self.conclusions)}
+        self.onehot = np.zeros((len(rids), len(self.conclusions)), np.float32)
+        self.onehot[np.arange(len(rids)), [position[sid] for sid in targets]] = 1
+
+    def evidence(self, cf, threshold):
+        """各行各结论新增的 (正证据, 负证据)，均为 Σ log(1 - |x|)"""
+        strength = cf[:, self.premises[0]]
+        for row in self.premises[1:]:
+            np.minimum(strength, cf[:, row], out=strength)
+        strength[strength <= threshold] = 0
+        strength *= self.strengths
+        positive = np.log(np.maximum(1 - np.maximum(strength, 0), FLOOR)) @ self.onehot
+        if not self.negative:
+            return positive, None
+        negative = np.log(np.maximum(1 + np.minimum(strength, 0), FLOOR)) @ self.onehot
+        return positive, negative
+
+
+def combine(positive, negative):
+    """由正、负证据的 Σ log(1 - |x|) 得到合并后的可信度"""
+    p = -np.expm1(positive)
+    q = -np.expm1(negative)
+    denominator = 1 - np.minimum(p, q)
+    return np.divide(p - q, denominator, out=np.zeros_like(p), where=denominator > 0)
+
+
+class BatchCertainty:
+    """NumPy 批量可信度推理，用法与 batch.BatchForward 相同"""
+
+    def __init__(self, rules, features, targets, threshold=THRESHOLD, chunk_size=65536, max_rounds=100):
+        rules = list(rules)
+        compiled = CompiledRules(rules)
+        symbols = compiled.symbols
+        n_symbols = len(symbols)
+
+        self.columns = list(features.values())
+        self.targets = list(targets)
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.max_rounds = max_rounds
+        # 事实矩阵最后两列分别恒为 1（补齐前提）和恒为 0（不在符号表中的目标）
+        self.one = n_symbols
+        self.zero = n_symbols + 1
+        self.width = n_symbols + 2
+
+        strengths = np.array([rule.get("cf", 1.0) for rule in rules], np.float64)
+        bad = np.flatnonzero(~((strengths > -1) & (strengths <= 1)))
+        if bad.size:
+            raise ValueError(f"第 {bad[0] + 1} 条规则的强度 cf={strengths[bad[0]]:g} 不在 (-1, 1] 范围内")
+        strengths = strengths.astype(np.float32)
+
+        # 特征列 -> 符号；同名的特征（如 4 和 17）取较强的观测
+        column_ids = [symbols.ids.get(name, -1) for name in self.columns]
+        self.first_columns = []
+        self.first_ids = []
+        self.repeated = []  # (列, 符号)
+        seen = set()
+        for j, sid in enumerate(column_ids):
+            if sid < 0:
+                continue
+            if sid in seen:
+                self.repeated.append((j, sid))
+            else:
+                seen.add(sid)
+                self.first_columns.append(j)
+                self.first_ids.append(sid)
+
+        self.steps = [([_Layer(compiled, strengths, rids, self.one) for rids in groups], loop)
+                      for groups, loop in _steps(compiled)]
+
+        self.conclusion_ids = np.array(sorted(set(compiled.conclusions)), dtype=np.intp)
+        self.conclusions = [symbols.names[sid] for sid in self.conclusion_ids]
+        self.target_ids = np.array([symbols.ids.get(name, self.zero) for name in self.targets], dtype=np.intp)
+
+    def initial_evidence(self, observations):
+        """观测矩阵 -> (正证据, 负证据) 两个 (N × 符号数) 矩阵"""
+        observations = np.asarray(observations, dtype=np.float32)
+        if observations.ndim != 2 or observations.shape[1] != len(self.columns):
+            raise ValueError(f"观测矩阵应为 (N × {len(self.columns)})，实际为 {observations.shape}")
+        if observations.size and np.abs(observations).max() > 1:
+            raise ValueError("观测的可信度应在 -1 到 1 之间")
+        n_rows = observations.shape[0]
+        evidence = []
+        for part in (np.maximum(observations, 0), np.maximum(-observations, 0)):
+            strongest = np.zeros((n_rows, self.width), np.float32)
+            strongest[:, self.first_ids] = part[:, self.first_columns]
+            for j, sid in self.repeated:
+                np.maximum(strongest[:, sid], part[:, j], out=strongest[:, sid])
+            evidence.append(np.log(np.maximum(1 - strongest, FLOOR)))
+        return evidence
+
+    def propagate(self, observations):
+        """(N × 符号数) 各符号最终的可信度矩阵"""
+        positive, negative = self.initial_evidence(observations)
+        cf = combine(positive, negative)
+        cf[:, self.one] = 1
+        cf[:, self.zero] = 0
+        for layers, loop in self.steps:
+            if not loop:
+                layer = layers[0]
+                columns = layer.conclusions
+                gained, lost = layer.evidence(cf, self.threshold)
+                positive[:, columns] += gained
+                if lost is not None:
+                    negative[:, columns] += lost
+                cf[:, columns] = combine(positive[:, columns], negative[:, columns])
+                continue
+            # 环上的规则：每轮以环外的证据为基础重新合并各规则的贡献，不重复累计；
+            # 已经收敛的行不再参与
+            active = np.arange(cf.shape[0])
+            for _ in range(self.max_rounds):
+                if not active.size:
+                    break
+                current = cf[active]
+                changed = np.zeros(active.size, dtype=bool)
+                for layer in layers:
+                    columns = layer.conclusions
+                    gained, lost = layer.evidence(current, self.threshold)
+                    base_negative = negative[np.ix_(active, columns)]
+                    updated = combine(positive[np.ix_(active, columns)] + gained,
+                                      base_negative if lost is None else base_negative + lost)
+                    changed |= (np.abs(updated - current[:, columns]) >= EPSILON).any(axis=1)
+                    current[:, columns] = updated
+                cf[active] = current
+                active = active[changed]
+        return cf
+
+    def forward(self, observations, k=5):
+        """批量可信度推理
+
+        返回 {"conclusions": 结论名称（cf 的列）, "cf": (N × 结论数) 各结论的可信度,
+              "target_cf": (N × 目标数) 各目标动物的可信度,
+              "ranking": (N × k) 按可信度从高到低的目标下标（相同时 targets 中靠前的在前）,
+              "confidence": (N × k) 对应的可信度}
+        """
+        observations = np.asarray(observations)
+        n_rows = observations.shape[0] if observations.ndim == 2 else 0
+        k = min(k, len(self.targets))
+        conclusion_cf = np.zeros((n_rows, len(self.conclusion_ids)), np.float32)
+        target_cf = np.zeros((n_rows, len(self.targets)), np.float32)
+        for start in range(0, max(n_rows, 1), self.chunk_size):
+            stop = min(start + self.chunk_size, n_rows)
+            cf = self.propagate(observations[start:stop])
+            conclusion_cf[start:stop] = cf[:, self.conclusion_ids]
+            target_cf[start:stop] = cf[:, self.target_ids]
+
+        if k < len(self.targets):
+            candidates = np.argpartition(-target_cf, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(len(self.targets)), target_cf.shape)
+        values = np.take_along_axis(target_cf, candidates, axis=1)
+        order = np.lexsort((candidates, -values), axis=1)
+        ranking = np.take_along_axis(candidates, order, axis=1)
+        return {
+            "conclusions": self.conclusions,
+            "cf": conclusion_cf,
+            "target_cf": target_cf,
+            "ranking": ranking,
+            "confidence": np.take_along_axis(values, order, axis=1),
+        }
+
+    def ranked(self, result, row, min_cf=0.0):
+        """第 row 行的排序结果：[{"target": 动物, "cf": 可信度}]，只保留可信度大于 min_cf 的"""
+        return [
+            {"target": self.targets[index], "cf": float(cf)}
+            for index, cf in zip(result["ranking"][row], result["confidence"][row])
+            if cf > min_cf
+        ]
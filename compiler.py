@@ -0,0 +1,112 @@
+def rule_parts(rule):
+    """取出规则的前提和结论，兼容 if/then 与 premise/conclusion 两种写法"""
+    if "if" in rule:
+        return rule["if"], rule["then"]
+    return rule["premise"], rule["conclusion"]
+
+
+class SymbolTable:
+    """符号表：把特征和结论字符串映射为连续的整数编号"""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        sid = self.ids.get(name)
+        if sid is None:
+            sid = len(self.names)
+            self.ids[name] = sid
+            self.names.append(name)
+        return sid
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+
+class CompiledRules:
+    """编译后的规则库
+
+    每条规则的前提去重后表示为位掩码（Python 整数），
+    正向推理只做按位与/或运算，不再比较字符串。
+    """
+
+    def __init__(self, rules, symbols=None):
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.premises = []       # 规则序号 -> 去重后的前提编号
+        self.premise_masks = []  # 规则序号 -> 前提位掩码
+        self.conclusions = []    # 规则序号 -> 结论编号
+
+        for rule in rules:
+            premises, conclusion = rule_parts(rule)
+            ids = tuple(dict.fromkeys(self.symbols.intern(p) for p in premises))
+            mask = 0
+            for sid in ids:
+                mask |= 1 << sid
+            self.premises.append(ids)
+            self.premise_masks.append(mask)
+            self.conclusions.append(self.symbols.intern(conclusion))
+
+    def __len__(self):
+        return len(self.conclusions)
+
+    def ids(self, names):
+        """事实名称 -> 符号编号，规则库中没有出现的名称不参与推理，直接忽略"""
+        table = self.symbols.ids
+        return [table[name] for name in names if name in table]
+
+    def mask(self, names):
+        """事实名称 -> 位掩码"""
+        mask = 0
+        for sid in self.ids(names):
+            mask |= 1 << sid
+        return mask
+
+    def names(self, mask):
+        """位掩码 -> 事实名称（按编号顺序）"""
+        names = []
+        while mask:
+            low = mask & -mask
+            names.append(self.symbols.names[low.bit_length() - 1])
+            mask ^= low
+        return names
+
+    def forward(self, facts):
+        """按位运算的正向推理，返回 (闭包掩码, 依次触发的规则序号)
+
+        逐轮按规则序号扫描，触发顺序与原来的字符串版本一致。
+        """
+        fired = []
+        pending = list(range(len(self.conclusions)))
+        changed = True
+        while changed:
+            changed = False
+            remaining = []
+            for i in pending:
+                bit = 1 << self.conclusions[i]
+                if facts & bit:
+                    continue
+                mask = self.premise_masks[i]
+                if facts & mask == mask:
+                    facts |= bit
+                    fired.append(i)
+                    changed = True
+                else:
+                    remaining.append(i)
+            pending = remaining
+        return facts, fired
+
+    def run(self, facts):
+        """以名称列表为输入输出的正向推理，返回 (全部事实, 依次触发的规则序号)"""
+        facts = list(facts)
+        _, fired = self.forward(self.mask(facts))
+        return facts + self.conclusion_names(fired), fired
+
+    def conclusion_names(self, fired):
+        """规则序号 -> 结论名称"""
+        return [self.symbols.names[self.conclusions[i]] for i in fired]
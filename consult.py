@@ -0,0 +1,236 @@
+"""逐个提问的咨询模式
+
+每个目标动物的每个最小证明方案（见 ranking.CandidateRanker）是一个假设，
+同一动物的各个方案平分该动物的先验。回答模型：
+    方案中的特征回答“是”；方案之外的特征回答“是”的概率为 OTHER。
+回答“否”排除包含该特征的方案（逻辑上不可能再成立），回答“是”使包含该特征的方案
+相对其他方案的权重提高到 1/OTHER 倍。某个方案的特征全部回答“是”时该动物得证，咨询结束。
+方案数超过上限的目标（ranking 中的 capped）另有一个不含特征的“其余方案”假设，
+它不会被任何回答排除，列出的方案全被排除时该目标也仍然相容。
+
+下一个问题取使“仍然相容的目标”的期望熵最小（信息增益最大）的特征。
+对每个特征 g 维护按目标汇总的量，一次回答只更新涉及的方案所属目标的项：
+    a[g][t]  目标 t 中包含 g 的方案权重之和
+    W[t]     目标 t 的权重
+于是每个特征的期望熵可以 O(1) 算出，不必每次重新扫描全部方案。
+开始时的第一个问题在建表时算好，之后走过的状态（已回答的问题集合）及其问题被记下，
+相同的回答序列直接查表。
+"""
+import math
+
+# 方案之外的特征被回答“是”的概率
+OTHER = 0.1
+# 记下的咨询状态数上限
+MEMO_LIMIT = 10000
+
+
+def _xlogx(x):
+    return x * math.log(x) if x > 0 else 0.0
+
+
+class QuestionTables:
+    """从候选排序的倒排表预先算出的咨询用表，规则库不变时可被多次咨询共用"""
+
+    def __init__(self, ranker):
+        self.ranker = ranker
+        self.targets = ranker.targets
+        # 方案编号 -> 目标下标 / 基本特征，在 ranker 的方案之后是各个 capped 目标的“其余方案”
+        self.proof_target = list(ranker.proof_target)
+        self.proof_features = list(ranker.proof_features)
+        self.proofs = []  # 目标下标 -> 方案编号列表
+        pid = 0
+        for count in ranker.proof_count:
+            self.proofs.append(list(range(pid, pid + count)))
+            pid += count
+        for index, capped in enumerate(ranker.capped):
+            if capped:
+                self.proofs[index].append(len(self.proof_target))
+                self.proof_target.append(index)
+                self.proof_features.append(())
+        self.weights = [0.0] * len(self.proof_target)  # 方案编号 -> 初始权重
+        for pids in self.proofs:
+            for pid in pids:
+                self.weights[pid] = 1.0 / len(pids)
+        # 目标 -> {特征: 含该特征的方案的初始权重之和}
+        self.target_features = [{} for _ in self.targets]
+        for pid, names in enumerate(self.proof_features):
+            shares = self.target_features[self.proof_target[pid]]
+            for name in names:
+                shares[name] = shares.get(name, 0.0) + self.weights[pid]
+
+        # 初始状态的汇总量，各次咨询在此基础上写时复制
+        self.mass = [1.0 if pids else 0.0 for pids in self.proofs]  # W[t]
+        self.alive = sum(1 for mass in self.mass if mass)
+        self.share = {}  # 特征 -> {目标: a}
+        self.sums = {}  # 特征 -> [A, Σ W, Σ W log W, Σ y log y, Σ n log n]（对含该特征的目标求和）
+        for index, shares in enumerate(self.target_features):
+            for name, a in shares.items():
+                self.share.setdefault(name, {})[index] = a
+                _add_term(self.sums.setdefault(name, [0.0] * 5), a, self.mass[index], 1)
+
+        self.memo = {}
+        self.memo[frozenset()] = Consultation(self, memo=False).next_question()
+
+    def start(self):
+        return Consultation(self)
+
+
+def _add_term(sums, a, mass, sign):
+    y = a + OTHER * (mass - a)
+    n = (1 - OTHER) * (mass - a)
+    sums[0] += sign * a
+    sums[1] += sign * mass
+    sums[2] += sign * _xlogx(mass)
+    sums[3] += sign * _xlogx(y)
+    sums[4] += sign * _xlogx(n)
+
+
+class Consultation:
+    """一次咨询：next_question() 给出下一个要问的特征，answer() 记录回答
+
+    animal 为已经得证的动物（尚未得证时为 None），finished 为咨询是否结束。
+    """
+
+    def __init__(self, tables, memo=True):
+        self.tables = tables
+        self.use_memo = memo
+        self.weights = list(tables.weights)
+        self.confirmed = [0] * len(self.weights)
+        self.answers = {}  # 特征 -> 是否具备，按提问顺序
+        self.animal = None
+        self.eliminated = []
+        self.mass = list(tables.mass)
+        self.total = float(tables.alive)
+        self.entropy_sum = 0.0  # Σ W[t] log W[t]
+        self.alive = tables.alive
+        self.share = {}  # (特征, 目标) -> 改动过的 a，其余沿用 tables.share
+        self.sums = {}  # 特征 -> 改动过的汇总量，其余沿用 tables.sums
+
+    @property
+    def finished(self):
+        return self.animal is not None or not self.alive or self.next_question() is None
+
+    def candidates(self):
+        """仍然相容的目标及其后验概率，按概率从大到小排列"""
+        total = self.total
+        items = [(self.tables.targets[t], m / total) for t, m in enumerate(self.mass) if m > 0]
+        return sorted(items, key=lambda item: -item[1])
+
+    def _state(self):
+        return frozenset(self.answers.items())
+
+    def next_question(self):
+        """返回下一个要问的特征；已经得证、没有相容的目标或无可再问时返回 None"""
+        if self.animal is not None or not self.alive:
+            return None
+        memo = self.tables.memo
+        if self.use_memo:
+            state = self._state()
+            if state in memo:
+                return memo[state]
+        question = self._choose()
+        if self.use_memo and len(memo) < MEMO_LIMIT:
+            memo[state] = question
+        return question
+
+    def _choose(self):
+        total = self.total
+        if self.alive > 1:
+            rest = self.entropy_sum
+            c = _xlogx(OTHER) + _xlogx(1 - OTHER)
+            best, best_score = None, None
+            changed = self.sums
+            for name, sums in self.tables.sums.items():
+                if name in self.answers:
+                    continue
+                a, w, l, sy, sn = changed.get(name, sums)
+                if a <= 0:
+                    continue
+                zy = OTHER * total + (1 - OTHER) * a
+                zn = (1 - OTHER) * (total - a)
+                # 回答后目标分布的期望熵乘以 total
+                score = (_xlogx(zy) + _xlogx(zn) - sy - sn - (rest - l) - c * (total - w))
+                if best_score is None or score < best_score - 1e-12:
+                    best, best_score = name, score
+            if best is not None and best_score < total * math.log(total) - rest - 1e-9:
+                return best
+        # 只剩一个目标（或再问也分不开）：沿权重最大的方案问它还没有确认的特征
+        proof_features = self.tables.proof_features
+        weights = self.weights
+        best_pid = None
+        for t, mass in enumerate(self.mass):
+            if mass <= 0:
+                continue
+            for pid in self.tables.proofs[t]:
+                if weights[pid] <= 0 or not proof_features[pid]:
+                    continue
+                if best_pid is None or (weights[pid], self.confirmed[pid] - len(proof_features[pid])) > \
+                        (weights[best_pid], self.confirmed[best_pid] - len(proof_features[best_pid])):
+                    best_pid = pid
+        if best_pid is None:
+            return None
+        return next((name for name in proof_features[best_pid] if name not in self.answers), None)
+
+    def _change(self, pid, new_weight):
+        """把方案 pid 的权重改为 new_weight，更新所属目标和相关特征的汇总"""
+        tables = self.tables
+        old = self.weights[pid]
+        if old == new_weight:
+            return
+        self.weights[pid] = new_weight
+        index = tables.proof_target[pid]
+        delta = new_weight - old
+        old_mass = self.mass[index]
+        # 按方案重新求和，避免排除全部方案后留下舍入误差而目标仍算相容
+        new_mass = sum(self.weights[other] for other in tables.proofs[index])
+        in_proof = set(tables.proof_features[pid])
+        for name in tables.target_features[index]:
+            sums = self.sums.get(name)
+            if sums is None:
+                sums = self.sums[name] = list(tables.sums[name])
+            key = (name, index)
+            a = self.share[key] if key in self.share else tables.share[name][index]
+            _add_term(sums, a, old_mass, -1)
+            if not new_mass:
+                a = self.share[key] = 0.0
+            elif name in in_proof:
+                a = self.share[key] = max(a + delta, 0.0)
+            _add_term(sums, a, new_mass, 1)
+        self.mass[index] = new_mass
+        if old_mass > 0 and new_mass == 0:
+            self.alive -= 1
+            self.eliminated.append(self.tables.targets[index])
+            # 排除的目标权重可能比其余目标大得多，此时重算两个总和以免误差累积
+            self.total = sum(self.mass)
+            self.entropy_sum = sum(_xlogx(mass) for mass in self.mass)
+        else:
+            self.total += new_mass - old_mass
+            self.entropy_sum += _xlogx(new_mass) - _xlogx(old_mass)
+
+    def answer(self, feature, present):
+        """记录对 feature 的回答并增量剪枝，返回得证的动物（尚未得证为 None）
+
+        present 为 None 表示“不确定”：只记下已经问过，不影响各个方案。
+        """
+        if feature in self.answers:
+            raise ValueError(f"特征 '{feature}' 已经回答过")
+        self.answers[feature] = None if present is None else bool(present)
+        if present is None:
+            return self.animal
+        tables = self.tables
+        for pid in tables.ranker.postings.get(feature, ()):
+            weight = self.weights[pid]
+            if weight <= 0:
+                continue
+            if not present:
+                self._change(pid, 0.0)
+                continue
+            self.confirmed[pid] += 1
+            self._change(pid, weight / OTHER)
+            if self.confirmed[pid] == len(tables.proof_features[pid]) and self.animal is None:
+                self.animal = tables.targets[tables.proof_target[pid]]
+        return self.animal
+
+    def facts(self):
+        """回答“是”的特征"""
+        return [name for name, present in self.answers.items() if present]
@@ -0,0 +1,741 @@
+"""动物识别推理引擎（不依赖 PyQt5）
+
+图形界面和批处理共用这里的推理代码，结果以字典形式返回。
+命令行用法：每行一个 JSON 观测，从标准输入读入，结果逐行写到标准输出：
+
+    python engine.py < observations.jsonl
+    python engine.py --mode backward < targets.jsonl
+    python engine.py --mode rank < observations.jsonl   # 不完整观测的候选排序
+    python engine.py --mode closure < observations.jsonl  # 只求结论和识别结果（NumPy 批量路径）
+    python engine.py --mode cf < confidences.jsonl      # 带可信度的观测，按可信度排序的候选
+"""
+import argparse
+import json
+import math
+import sys
+
+from cache import ClosureCache
+from compiler import rule_parts
+from consult import QuestionTables
+from lookup import compile_classifier
+from optimizer import optimize, update
+from profiler import Profiler, ProfiledProver, save_stats
+from prover import GoalProver
+from ranking import CandidateRanker
+from rete import ORDERED_STRATEGIES, STRATEGIES, Cancelled, ReteNetwork
+from rulebase import RuleBase
+from tms import TruthMaintenance
+
+DEFAULT_RULES = [
+    {"if": ["有毛发"], "then": "哺乳类"},
+    {"if": ["产奶"], "then": "哺乳类"},
+    {"if": ["有羽毛"], "then": "鸟类"},
+    {"if": ["会下蛋", "不会飞"], "then": "鸟类"},
+    {"if": ["哺乳类", "吃肉"], "then": "食肉类"},
+    {"if": ["有犬齿", "有爪", "眼盯前方"], "then": "食肉类"},
+    {"if": ["哺乳类", "有蹄"], "then": "蹄类"},
+    {"if": ["哺乳类", "反刍"], "then": "蹄类"},
+    # 动物识别规则
+    {"if": ["食肉类", "黄褐色", "哺乳类", "有斑点"], "then": "金钱豹"},
+    {"if": ["食肉类", "黄褐色", "哺乳类", "有黑色条纹"], "then": "虎"},
+    {"if": ["有黑色条纹", "蹄类"], "then": "斑马"},
+    {"if": ["有斑点", "蹄类", "长脖", "长腿"], "then": "长颈鹿"},
+    {"if": ["鸟类", "不会飞", "长脖", "长腿"], "then": "鸵鸟"},
+    {"if": ["鸟类", "不会飞", "会游泳", "黑白二色"], "then": "企鹅"},
+    {"if": ["鸟类", "善飞"], "then": "信天翁"}
+]
+
+DEFAULT_FEATURES = {
+    '1': '有毛发', '2': '产奶', '3': '有羽毛', '4': '不会飞',
+    '5': '会下蛋', '6': '吃肉', '7': '有犬齿', '8': '有爪',
+    '9': '眼盯前方', '10': '有蹄', '11': '反刍', '12': '黄褐色',
+    '13': '有斑点', '14': '有黑色条纹', '15': '长脖', '16': '长腿',
+    '17': '不会飞', '18': '会游泳', '19': '黑白二色', '20': '善飞'
+}
+
+DEFAULT_TARGETS = ["金钱豹", "虎", "斑马", "长颈鹿", "鸵鸟", "企鹅", "信天翁"]
+
+# 可以作为规则前提的中间结论
+INTERMEDIATE_CONCLUSIONS = ["哺乳类", "鸟类", "食肉类", "蹄类"]
+
+# 内存映射的规则库不超过这个规模时也做规则优化（匹配网络改为在内存中建立）
+OPTIMIZE_MAPPED_LIMIT = 10000
+
+
+# 规则的可选属性及其缺省值：cf 为可信度推理中规则的强度，salience 为 salience 策略的优先级
+RULE_ATTRIBUTES = {"cf": 1.0, "salience": 0}
+
+
+def check_attribute(name, value):
+    """检查规则属性的取值，返回规范化的值，不合法时抛出 ValueError"""
+    if name not in RULE_ATTRIBUTES:
+        raise ValueError(f"未知的规则属性 '{name}'")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"规则属性 {name} 应为数值")
+    if name == "cf":
+        if not -1 < value <= 1:
+            raise ValueError(f"规则强度 cf={value:g} 不在 (-1, 1] 范围内")
+        return float(value)
+    return value
+
+
+def rule_attributes(rule):
+    """规则中不取缺省值的可选属性，按 RULE_ATTRIBUTES 的顺序"""
+    return {name: rule[name] for name, default in RULE_ATTRIBUTES.items() if rule.get(name, default) != default}
+
+
+def format_attributes(rule):
+    """可选属性的文本，如“ [cf=0.8 salience=2]”，都取缺省值时为空串"""
+    attributes = rule_attributes(rule)
+    if not attributes:
+        return ""
+    return " [" + " ".join(f"{name}={value}" for name, value in attributes.items()) + "]"
+
+
+def parse_attributes(text):
+    """解析“cf=0.8 salience=2”形式的属性，返回属性字典，格式错误时抛出 ValueError"""
+    attributes = {}
+    for item in text.split():
+        name, eq, value = item.partition("=")
+        if not eq:
+            raise ValueError(f"规则属性应写成“名称=数值”：{item}")
+        try:
+            number = int(value) if name == "salience" and value.lstrip("+-").isdigit() else float(value)
+        except ValueError:
+            raise ValueError(f"规则属性 {name} 应为数值：{value}") from None
+        attributes[name] = check_attribute(name, number)
+    return attributes
+
+
+def format_rule(rule, sep=" ∧ "):
+    premises, conclusion = rule_parts(rule)
+    return f"{sep.join(premises)} → {conclusion}{format_attributes(rule)}"
+
+
+def parse_rule(text):
+    """解析“特征1 特征2 …，结论”格式的一条规则，格式错误时抛出 ValueError
+
+    结论后面可以用方括号给出可选属性，如“有毛发，哺乳类 [cf=0.9]”（见 RULE_ATTRIBUTES）。
+    """
+    if "，" not in text:
+        raise ValueError("请使用中文逗号分隔条件和结论")
+    conditions, conclusion = text.split("，", 1)
+    conclusion = conclusion.strip()
+    attributes = {}
+    if conclusion.endswith("]") and "[" in conclusion:
+        conclusion, _, text = conclusion[:-1].rpartition("[")
+        conclusion = conclusion.strip()
+        attributes = parse_attributes(text)
+    if not conclusion:
+        raise ValueError("缺少结论")
+    return {"if": conditions.split(), "then": conclusion, **attributes}
+
+
+def parse_rules(lines, vocabulary=None):
+    """逐行解析规则，空行和以 # 开头的行被跳过
+
+    vocabulary 为允许作为前提的名称集合（None 为不检查）。
+    一次检查全部行，返回 (规则列表, 错误列表)，错误形如“第 N 行: …”。
+    """
+    rules = []
+    errors = []
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            rule = parse_rule(line)
+        except ValueError as exc:
+            errors.append(f"第 {line_no} 行: {exc}")
+            continue
+        unknown = [cond for cond in rule["if"] if vocabulary is not None and cond not in vocabulary]
+        if unknown:
+            errors.append(f"第 {line_no} 行: 特征 '{unknown[0]}' 不在系统中")
+            continue
+        rules.append(rule)
+    return rules, errors
+
+
+class InferenceEngine:
+    """推理引擎：持有规则库、特征表和目标动物，返回结构化的推理结果
+
+    规则库的索引、匹配网络和反向推理备忘录都随规则的增删增量更新。
+    规则优化默认关闭，推理过程与原规则库逐条一致。optimize 为真时加载时运行
+    optimizer.optimize，匹配网络用精简后的等价规则集建立（较大的内存映射规则库不做优化，
+    见 OPTIMIZE_MAPPED_LIMIT），之后的增删由 optimizer.update 增量维护；优化只保证
+    推出的事实集合不变，规则触发顺序、trace 和识别结果（最先推出的动物）可能与原规则库不同。
+    """
+
+    def __init__(self, rules=None, features=None, targets=None, cache_size=1024, intermediate=None,
+                 optimize=False):
+        """rules 可以是规则列表，也可以是 RuleBase（或 kbfile.MappedRuleBase），后者直接使用"""
+        if rules is None:
+            rules = [dict(rule) for rule in DEFAULT_RULES]
+        self.rules = rules if hasattr(rules, "concluding") else RuleBase(rules)
+        self.features = dict(DEFAULT_FEATURES) if features is None else features
+        self.animal_targets = list(DEFAULT_TARGETS) if targets is None else targets
+        self.intermediate = list(INTERMEDIATE_CONCLUSIONS) if intermediate is None else intermediate
+        self.network = None
+        self.batch = None
+        self.certainty = None
+        self.prover = None
+        self.tms = None
+        self.classifier = None
+        self.ranker = None
+        self.questions = None
+        self.cache = ClosureCache(cache_size)
+        self.profiler = None
+        self._snapshot = None
+        self.optimize = optimize
+        self.optimization = None  # optimizer.optimize 的结果，未优化时为 None
+        self._optimize()
+
+    @classmethod
+    def load(cls, path, cache_size=1024, optimize=False):
+        """从知识库文件（.kb 文本或 .kbc 编译文件）建立引擎，见 kbfile.py"""
+        import kbfile
+        rules, features, targets, intermediate = kbfile.load(path)
+        return cls(rules, features, targets, cache_size, intermediate, optimize)
+
+    def save(self, path):
+        """把当前知识库保存为文本文件，同时写好编译文件"""
+        import kbfile
+        kbfile.save(path, self.rules, self.features, self.animal_targets, self.intermediate)
+
+    def invalidate(self):
+        """规则库被整体替换后调用，下次推理时重新编译"""
+        self.cache.clear()
+        self._snapshot = None
+        self.network = None
+        self.batch = None
+        self.certainty = None
+        self.prover = None
+        self.classifier = None
+        self.ranker = None
+        self.questions = None
+        self._optimize()
+        if self.tms is not None:
+            self.tms.rules = self.rules
+            self.tms.reset()
+
+    def compile(self):
+        if self.network is None:
+            if self.optimization is None and getattr(self.rules, "mapped", False):
+                # 内存映射的规则库直接在文件中的索引上推理，不必逐条建立网络
+                from kbfile import MappedNetwork
+                self.network = MappedNetwork(self.rules.kb)
+            else:
+                self.network = ReteNetwork(self._matching_rules())
+        return self.network
+
+    def enable_optimization(self, enabled=True, report=None):
+        """开启或关闭规则优化；开启时对当前规则库做一遍完整的分析
+
+        report 为已经对当前版本的规则库算好的 optimizer.optimize 结果时直接使用，
+        界面据此在后台线程中分析，不阻塞界面线程。
+        """
+        self.optimize = enabled
+        self.network = None
+        self.cache.clear()
+        self._snapshot = None
+        if enabled and report is not None:
+            self.optimization = report
+        else:
+            self._optimize()
+
+    def _optimize(self):
+        mapped = getattr(self.rules, "mapped", False)
+        if self.optimize and (not mapped or len(self.rules) <= OPTIMIZE_MAPPED_LIMIT):
+            self.optimization = optimize(self.rules, self.features)
+        else:
+            self.optimization = None
+
+    def _matching_rules(self):
+        """匹配网络使用的规则：优化后的等价规则集（规则编号不变）或规则库本身"""
+        return self.rules if self.optimization is None else self.optimization["rules"]
+
+    def find_duplicates(self, rules):
+        """检查待添加的规则：与已有规则（或同一批中前面的规则）重复、或被其包含的
+
+        被包含指已有一条结论相同、前提是其子集的规则，新规则不会带来新的结论。
+        返回说明列表，形如“第 N 条: …”。
+        """
+        messages = []
+        pending = []
+        for number, rule in enumerate(rules, 1):
+            premises, conclusion = rule_parts(rule)
+            premises = set(premises)
+            existing = self.rules.concluding(conclusion)
+            existing += [other for other in pending if rule_parts(other)[1] == conclusion]
+            for other in existing:
+                other_premises = set(rule_parts(other)[0])
+                if other_premises <= premises:
+                    kind = "重复" if other_premises == premises else "被已有规则包含"
+                    messages.append(f"第 {number} 条: {kind}：{format_rule(other)}")
+                    break
+            pending.append(rule)
+        return messages
+
+    def add_rule(self, rule):
+        """添加规则，返回规则编号"""
+        return self.add_rules([rule])[0]
+
+    def add_rules(self, rules):
+        """批量添加规则，返回规则编号列表；依赖规则库的编译结果在最后只作废一次
+
+        匹配网络和优化结果逐条更新。整批修改可以用 undo() 撤销。
+        """
+        rules = list(rules)
+        if rules:
+            self.rules.checkpoint()
+        if self.network is not None and not self.network.editable:
+            self.network = None
+        added = [(self.rules.add(rule), rule) for rule in rules]
+        if added:
+            self._apply_changes([], added)
+        return [rid for rid, _ in added]
+
+    def delete_rule(self, rid):
+        """按规则编号删除规则"""
+        return self.delete_rules([rid])[0]
+
+    def delete_rules(self, rids):
+        """按规则编号批量删除规则，返回被删除的规则；整批修改可以用 undo() 撤销"""
+        rids = list(rids)
+        if rids:
+            self.rules.checkpoint()
+        if self.network is not None and not self.network.editable:
+            self.network = None
+        removed = [(rid, self.rules.remove(rid)) for rid in rids]
+        if removed:
+            self._apply_changes(removed, [])
+        return [rule for _, rule in removed]
+
+    def undo(self):
+        """撤销最近一批增删，返回变化 {"added": [(规则编号, 规则)], "removed": [...]}
+
+        没有可撤销的修改时返回 None。规则库切换回历史版本（共用节点，不复制规则），
+        匹配网络按两个版本的差异逐条更新。
+        """
+        return self._switch_version(False)
+
+    def redo(self):
+        """重做被撤销的一批增删，返回值同 undo"""
+        return self._switch_version(True)
+
+    def _switch_version(self, forward):
+        if getattr(self.rules, "mapped", False):
+            return None  # 内存映射的规则库还没有被修改过
+        newest = self.rules.max_id()
+        changes = self.rules.redo() if forward else self.rules.undo()
+        if changes is None:
+            return None
+        network = self.network
+        # 恢复比现有规则更早的规则时，逐条加入会打乱触发顺序，重新建立网络
+        # （优化后的网络本来就不保证原有触发顺序，仍然逐条更新）
+        if network is not None and (not network.editable or self.optimization is None
+                                    and any(rid < newest for rid, _ in changes["added"])):
+            self.network = None
+        self._apply_changes(changes["removed"], changes["added"])
+        return changes
+
+    def _apply_changes(self, removed, added):
+        """把规则的增删（[(规则编号, 规则)]）同步到优化结果和匹配网络"""
+        if self.optimization is not None:
+            removed, added = update(self.optimization, self.rules, removed, added)
+        if self.network is not None:
+            for rid, rule in removed:
+                self.network.remove(rid, rule)
+            for rid, rule in added:
+                self.network.add(rid, rule)
+        self._rules_changed()
+
+    def _rules_changed(self):
+        # 批量推理的矩阵、识别器和候选索引需要重建；反向推理的备忘录作废
+        self.batch = None
+        self.certainty = None
+        self.classifier = None
+        self.ranker = None
+        self.questions = None
+        self._snapshot = None
+        if self.prover is not None:
+            self.prover.reset()
+        if self.tms is not None:
+            self.tms.reset()
+
+    def enable_profiling(self, enabled=True):
+        """开启或关闭按规则的性能统计（见 profiler.py）
+
+        开启后正向推理不使用缓存，每次都实际匹配；关闭时不产生任何开销。
+        """
+        if enabled and self.profiler is None:
+            self.profiler = Profiler()
+        elif not enabled:
+            self.profiler = None
+        self.prover = None
+        self._snapshot = None
+
+    def snapshot(self):
+        """返回规则库当前版本的只读副本引擎，供后台线程推理
+
+        副本固定在当前版本（RuleBase.copy 是 O(1) 的，与本引擎共用节点），
+        之后对本引擎的增删、撤销不影响副本；规则库不变时重复调用返回同一个副本，
+        其编译结果和备忘录得以复用。副本与本引擎共用性能统计。
+        """
+        if self._snapshot is None:
+            snapshot = InferenceEngine(self.rules.copy(), dict(self.features), list(self.animal_targets),
+                                       self.cache.maxsize, list(self.intermediate), optimize=False)
+            # 规则库相同，优化结果直接使用；本引擎之后的修改会原地更新它，副本要一份自己的规则表
+            snapshot.optimize = self.optimize
+            if self.optimization is not None:
+                snapshot.optimization = dict(self.optimization, rules=dict(self.optimization["rules"]))
+            snapshot.profiler = self.profiler
+            self._snapshot = snapshot
+        return self._snapshot
+
+    def profile_stats(self):
+        """返回性能统计，每条规则附带其文本（规则已删除时为 None）；未开启时返回 None"""
+        if self.profiler is None:
+            return None
+        stats = self.profiler.stats()
+        for row in stats["rules"]:
+            row["rule"] = format_rule(self.rules[row["rid"]]) if row["rid"] in self.rules else None
+        return stats
+
+    def resolve(self, names):
+        """把特征编号（如 '13'）换成特征名称，其他名称保持不变"""
+        return [self.features.get(name, name) for name in names]
+
+    def forward(self, facts, strategy="order", stop_at_target=False, observer=None):
+        """正向推理
+
+        strategy 为冲突消解策略（见 rete.STRATEGIES）；stop_at_target 为真时
+        推出任何一个目标动物后立即停止，识别结果就是最先推出的动物。
+        observer 在每条规则触发后以规则编号调用，抛出 Cancelled 可中止推理
+        （命中缓存时不会调用）。
+        返回 {"facts": 全部事实, "trace": 依次应用的规则,
+              "derived": 推导出的新事实, "animal": 识别结果或 None}
+        相同的初始事实集合直接从缓存取结果（包括规则触发序列）；recency 等与事实顺序
+        有关的策略（见 rete.ORDERED_STRATEGIES）要求初始事实的顺序也相同。
+        """
+        initial = list(facts)
+        version = self.rules.version
+        options = (strategy, stop_at_target)
+        ordered = strategy in ORDERED_STRATEGIES
+        cached = self.cache.get(initial, version, options, ordered) if self.profiler is None else None
+        if cached is None:
+            stop = self.animal_targets if stop_at_target else ()
+            if self.profiler is None:
+                all_facts, fired = self.compile().run(initial, strategy, stop, observer)
+            else:
+                all_facts, fired = self.profiler.run(self.compile(), self._matching_rules(), initial,
+                                                     strategy, stop, observer)
+            derived = all_facts[len(initial):]
+            trace = [self.rules[rid] for rid in fired]
+            self.cache.put(initial, version, derived, trace, options, ordered)
+        else:
+            derived, trace = list(cached[0]), list(cached[1])
+            all_facts = initial + derived
+
+        targets = set(self.animal_targets)
+        animal = next((fact for fact in all_facts if fact in targets), None)
+        return {
+            "facts": all_facts,
+            "trace": trace,
+            "derived": derived,
+            "animal": animal,
+        }
+
+    def toggle_fact(self, fact, present):
+        """增量推理：断言（present 为真）或撤回一个基本事实
+
+        返回 {"added": 新推出的事实, "removed": 失去依据的事实,
+              "facts": 当前全部事实, "trace": 各推导结论的依据规则, "animal": 识别结果或 None}
+        """
+        if self.tms is None:
+            self.tms = TruthMaintenance(self.rules)
+        if present:
+            added, removed = self.tms.assert_fact(fact), []
+        else:
+            added, removed = [], self.tms.retract_fact(fact)
+        return self._incremental_result(added, removed)
+
+    def reset_facts(self, facts):
+        """增量推理：以给定的基本事实重新开始"""
+        if self.tms is None:
+            self.tms = TruthMaintenance(self.rules)
+        self.tms.base = dict.fromkeys(facts)
+        self.tms.reset()
+        return self._incremental_result(list(self.tms.derived), [])
+
+    def _incremental_result(self, added, removed):
+        facts = self.tms.facts()
+        targets = set(self.animal_targets)
+        return {
+            "added": added,
+            "removed": removed,
+            "facts": facts,
+            "trace": self.tms.trace(),
+            "animal": next((fact for fact in facts if fact in targets), None),
+        }
+
+    def classify(self, facts):
+        """用预编译的查找表/决策图直接得到识别结果（只考虑基本特征）
+
+        规则库变化后的第一次调用会重新编译；同时推出多个动物时
+        取 animal_targets 中靠前的那个。
+        """
+        if self.classifier is None:
+            self.classifier = compile_classifier(self.rules, self.features, self.animal_targets)
+        return self.classifier.classify(facts)
+
+    def rank(self, facts, k=5, absent=()):
+        """观测不足以识别时，按接近成立的程度列出至多 k 个候选动物
+
+        absent 为已知不具备的特征。规则库变化后的第一次调用会重建倒排索引；
+        返回值见 CandidateRanker.rank。
+        """
+        return self._ranker().rank(facts, k, absent)
+
+    def _ranker(self):
+        if self.ranker is None:
+            self.ranker = CandidateRanker(self.rules, self.features, self.animal_targets)
+        return self.ranker
+
+    def consult(self):
+        """开始一次逐个提问的咨询，返回 consult.Consultation
+
+        提问用的表在规则库变化后的第一次调用时重建，之后各次咨询共用。
+        """
+        if self.questions is None:
+            self.questions = QuestionTables(self._ranker())
+        return self.questions.start()
+
+    def forward_batch(self, observations):
+        """批量正向推理（需要 NumPy），observations 为 (N × 特征数) 布尔矩阵，
+        列顺序与 features 一致，返回值见 BatchForward.forward"""
+        if self.batch is None:
+            from batch import BatchForward
+            self.batch = BatchForward(list(self.rules), self.features, self.animal_targets)
+        return self.batch.forward(observations)
+
+    def closure_batch(self, fact_lists):
+        """把若干个观测（特征名称或编号的列表）整批交给 forward_batch
+
+        只考虑基本特征，不记录规则触发序列。返回每个观测的
+        {"derived": 推导出的新结论（按 BatchForward.conclusions 的顺序）, "animal": 识别结果或 None}，
+        与 parallel.py 的输出相同；同时推出多个动物时取 animal_targets 中靠前的那个。
+        """
+        import numpy as np
+        columns = {}
+        for j, name in enumerate(self.features.values()):
+            columns.setdefault(name, []).append(j)
+        rows, cols = [], []
+        for row, facts in enumerate(fact_lists):
+            if not isinstance(facts, list):
+                raise TypeError(f"features 应为列表，实际为 {type(facts).__name__}")
+            for name in self.resolve(facts):
+                for j in columns.get(name, ()):
+                    rows.append(row)
+                    cols.append(j)
+        observations = np.zeros((len(fact_lists), len(self.features)), dtype=bool)
+        observations[rows, cols] = True
+        result = self.forward_batch(observations)
+        conclusions = result["conclusions"]
+        return [
+            {"derived": [conclusions[k] for k in np.flatnonzero(derived)],
+             "animal": self.animal_targets[index] if index >= 0 else None}
+            for derived, index in zip(result["derived"], result["animal"].tolist())
+        ]
+
+    def forward_cf_batch(self, observations, k=5):
+        """批量可信度推理（需要 NumPy），observations 为 (N × 特征数) 的可信度矩阵，
+        列顺序与 features 一致，返回值见 BatchCertainty.forward"""
+        return self._certainty().forward(observations, k)
+
+    def forward_cf(self, confidences, k=5):
+        """单个观测的可信度推理，confidences 为 特征 -> 可信度（-1 到 1）
+
+        规则的强度取规则的 "cf" 值（缺省 1.0，见 RULE_ATTRIBUTES）。不是特征的名称被忽略。
+        返回 {"candidates": [{"target": 动物, "cf": 可信度}]（按可信度从高到低，只含大于 0 的）,
+              "conclusions": 可信度不为 0 的结论 -> 可信度}
+        """
+        confidences = {self.features.get(name, name): cf for name, cf in dict(confidences).items()}
+        certainty = self._certainty()
+        row = [[confidences.get(name, 0.0) for name in certainty.columns]]
+        result = certainty.forward(row, k)
+        return {
+            "candidates": certainty.ranked(result, 0),
+            "conclusions": {name: float(cf) for name, cf in zip(result["conclusions"], result["cf"][0]) if cf},
+        }
+
+    def _certainty(self):
+        if self.certainty is None:
+            from certainty import BatchCertainty
+            self.certainty = BatchCertainty(list(self.rules), self.features, self.animal_targets)
+        return self.certainty
+
+    def backward(self, target, limit=20, observer=None):
+        """反向推理
+
+        返回 {"target": 目标, "steps": 相关规则, "proofs": 各个最小方案,
+              "required": 最小的一个方案, "capped": 方案是否多于 limit 个而只列出了一部分}，
+        方案是排好序的基本特征列表，每个步骤是 {"rule": 规则} 或 {"missing": 无法推导的结论}。
+        子目标的结果在规则库不变时跨目标复用。
+        observer 在展开每个子目标前调用，抛出 Cancelled 可中止推理。
+        """
+        if self.prover is None or self.prover.limit != limit:
+            if self.profiler is None:
+                self.prover = GoalProver(self.rules, self.features.values(), limit)
+            else:
+                self.prover = ProfiledProver(self.rules, self.features.values(), limit, self.profiler)
+        proofs = [sorted(proof) for proof in self.prover.proofs(target, observer)]
+        return {
+            "target": target,
+            "steps": self.prover.explain(target),
+            "proofs": proofs,
+            "required": proofs[0] if proofs else [],
+            "capped": target in self.prover.capped,
+        }
+
+
+# handle_record 支持的推理模式
+MODES = ("forward", "closure", "backward", "classify", "rank", "cf")
+
+
+def _count_option(record, name, default):
+    """读取请求中的个数选项（k、limit），不是正整数时抛出 ValueError"""
+    value = record.get(name, default) if isinstance(record, dict) else default
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(f"{name} 应为正整数: {value!r}")
+    return value
+
+
+def record_features(record, name="features"):
+    """读取请求中的特征列表，不是字符串列表时抛出 TypeError（各模式和推理服务共用）"""
+    facts = record.get(name, []) if isinstance(record, dict) else record
+    if not isinstance(facts, list) or not all(isinstance(fact, str) for fact in facts):
+        raise TypeError(f"{name} 应为特征名称或编号的列表")
+    return facts
+
+
+def _record_confidences(record):
+    """cf 模式的特征：{特征: 可信度} 或 [[特征, 可信度], …]（只写特征时可信度为 1）"""
+    facts = record.get("features", []) if isinstance(record, dict) else record
+    if isinstance(facts, list):
+        pairs = [(fact, 1.0) if isinstance(fact, str) else fact for fact in facts]
+        if not all(isinstance(pair, (list, tuple)) and len(pair) == 2 for pair in pairs):
+            raise TypeError("features 应为 {特征: 可信度} 或 [[特征, 可信度], …]")
+        facts = dict(pairs)
+    if not isinstance(facts, dict) or not all(
+            isinstance(name, str) and isinstance(value, (int, float)) and not isinstance(value, bool)
+            for name, value in facts.items()):
+        raise TypeError("features 应为 {特征: 可信度} 或 [[特征, 可信度], …]")
+    return facts
+
+
+def handle_record(engine, record, mode="forward", strategy="order", stop_at_target=False, limit=20):
+    """处理一条 JSON 请求，命令行和推理服务共用
+
+    record 可以是特征列表 / 目标名称，也可以是字典：
+    {"features": [...]} 或 {"target": ...}，字典中的 mode、strategy、
+    stop_at_target、limit 会覆盖默认值，"id" 原样带回。
+    rank 模式还可以给出 "absent"（不具备的特征）和 "k"（候选个数）。
+    closure 模式只求推导出的结论和识别结果（见 closure_batch），推理服务把同一批中的
+    这类请求合并成一次矩阵运算。
+    cf 模式的 features 为 {特征: 可信度} 或 [[特征, 可信度], …]（只写特征时可信度为 1），
+    同样可以给出 "k"。
+    features 的格式不对时抛出 TypeError，k、limit 不是正整数时抛出 ValueError。
+    """
+    if isinstance(record, dict):
+        mode = record.get("mode", mode)
+        strategy = record.get("strategy", strategy)
+        stop_at_target = record.get("stop_at_target", stop_at_target)
+    limit = _count_option(record, "limit", limit)
+
+    if mode == "forward":
+        facts = record_features(record)
+        result = engine.forward(engine.resolve(facts), strategy, stop_at_target)
+    elif mode == "closure":
+        result = engine.closure_batch([record_features(record)])[0]
+    elif mode == "classify":
+        facts = record_features(record)
+        result = {"animal": engine.classify(engine.resolve(facts))}
+    elif mode == "rank":
+        facts = record_features(record)
+        absent = record_features(record, "absent") if isinstance(record, dict) else []
+        k = _count_option(record, "k", 5)
+        result = {"candidates": engine.rank(engine.resolve(facts), k, engine.resolve(absent))}
+    elif mode == "cf":
+        facts = _record_confidences(record)
+        k = _count_option(record, "k", 5)
+        result = engine.forward_cf(facts, k)
+    elif mode == "backward":
+        target = record.get("target") if isinstance(record, dict) else record
+        if not isinstance(target, str):
+            raise TypeError("target 应为目标动物的名称")
+        result = engine.backward(target, limit)
+    else:
+        raise ValueError(f"未知的推理模式: {mode}")
+
+    if isinstance(record, dict) and "id" in record:
+        result = {"id": record["id"], **result}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="动物识别批量推理：标准输入 JSONL → 标准输出 JSONL")
+    parser.add_argument("--limit", type=int, default=20, help="反向推理最多返回的方案数")
+    parser.add_argument("--cache-size", type=int, default=1024, help="正向推理结果缓存的条目数，0 为不缓存")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="order", help="正向推理的冲突消解策略")
+    parser.add_argument("--stop-at-target", action="store_true", help="推出任何一个目标动物后立即停止")
+    parser.add_argument("--mode", choices=MODES, default="forward",
+                        help="forward/closure/classify/rank 每行为特征列表或 {\"features\": [...]}；"
+                             "cf 每行为 [[特征, 可信度], ...] 或 {\"features\": {特征: 可信度}}；"
+                             "backward 每行为目标名称或 {\"target\": ...}")
+    parser.add_argument("--kb", help="知识库文件（.kb 或 .kbc），省略时使用内置的规则")
+    parser.add_argument("--profile", metavar="FILE", help="结束时把按规则的性能统计写入 FILE（.csv 或 .json）")
+    parser.add_argument("--watch", action="store_true", help="监视 --kb 指定的文件，修改后自动换用新版本")
+    parser.add_argument("--optimize", action="store_true",
+                        help="匹配网络使用优化后的等价规则集（推出的事实不变，触发顺序可能不同）")
+    args = parser.parse_args(argv)
+    if args.watch and (not args.kb or args.profile):
+        parser.error("--watch 需要指定 --kb，且不能与 --profile 同时使用")
+
+    watcher = None
+    if args.watch:
+        from hotreload import KnowledgeBaseWatcher
+        watcher = KnowledgeBaseWatcher(args.kb, cache_size=args.cache_size, optimize=args.optimize).start()
+        engine = watcher.engine
+    elif args.kb:
+        engine = InferenceEngine.load(args.kb, cache_size=args.cache_size, optimize=args.optimize)
+    else:
+        engine = InferenceEngine(cache_size=args.cache_size, optimize=args.optimize)
+    if args.profile:
+        engine.enable_profiling()
+    out = sys.stdout
+    for line_no, line in enumerate(sys.stdin, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if watcher is not None:
+            engine = watcher.engine
+        record = None
+        try:
+            record = json.loads(line)
+            result = handle_record(engine, record, args.mode,
+                                   args.strategy, args.stop_at_target, args.limit)
+        except (ValueError, TypeError, AttributeError) as exc:
+            result = {"error": f"第 {line_no} 行: {exc}"}
+            if isinstance(record, dict) and "id" in record:
+                result = {"id": record["id"], **result}
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    if watcher is not None:
+        watcher.stop()
+    if args.profile:
+        save_stats(engine.profile_stats(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
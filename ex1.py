@@ -1,26 +1,158 @@
 import sys
+import threading
+import time
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget, QCheckBox,
-    QPushButton, QTextBrowser, QLabel, QGroupBox, QScrollArea,
-    QDialog, QLineEdit, QHBoxLayout, QMessageBox, QListWidget, QComboBox
+    QPushButton, QLabel, QGroupBox,
+    QDialog, QLineEdit, QHBoxLayout, QMessageBox, QListView, QComboBox, QPlainTextEdit,
+    QTableWidget, QTableWidgetItem, QFileDialog, QHeaderView, QProgressBar, QAbstractItemView, QShortcut
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+
+from engine import Cancelled, InferenceEngine, format_rule, parse_rules
+from hotreload import KnowledgeBaseWatcher
+from optimizer import optimize, summary
+from profiler import save_stats
+from views import FeatureSelector, RuleListModel, TraceView
+
+# 冲突消解策略的显示名称
+STRATEGY_NAMES = {
+    "规则顺序": "order",
+    "优先级": "salience",
+    "具体性优先": "specificity",
+    "最近优先": "recency",
+}
+
+# 规则统计表的列：(标题, 统计字段)
+STATS_COLUMNS = [
+    ("规则", "rule"),
+    ("检查", "checks"),
+    ("失败", "failures"),
+    ("主要失败前提", "failed_on"),
+    ("触发", "fired"),
+    ("耗时(ms)", "time_ms"),
+]
+
+
+class ReasoningSignals(QObject):
+    records = pyqtSignal(list)    # 一批推理过程记录，格式见 views.TraceModel
+    progress = pyqtSignal(int)    # 已触发的规则数（反向推理为已展开的目标数）
+    finished = pyqtSignal(dict)   # 推理结果
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+
+class ReloadSignals(QObject):
+    """把监视线程中的热加载结果送回界面线程"""
+    reloaded = pyqtSignal(object, int, float)  # 新引擎、版本号、编译耗时(ms)
+    failed = pyqtSignal(str)
+
+
+class ReasoningTask(QRunnable):
+    """在线程池中运行的推理任务
+
+    engine 应为 InferenceEngine.snapshot() 得到的副本，推理期间对规则库的修改
+    不会影响它。触发的规则先攒在缓冲区里，每隔 INTERVAL 秒通过信号成批送回界面线程；
+    cancel() 之后在下一次触发规则（或展开目标）时中止。
+    mode 为 "consult" 时只建立咨询用的表，结果为 {"consultation": Consultation}；
+    为 "optimize" 时分析规则库，结果为 {"optimization": optimizer.optimize 的结果, "version": 规则库版本}。
+    """
+
+    INTERVAL = 0.05
+
+    def __init__(self, engine, mode, argument, strategy="order", stop_at_target=False):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.engine = engine
+        self.mode = mode
+        self.argument = argument
+        self.strategy = strategy
+        self.stop_at_target = stop_at_target
+        self.signals = ReasoningSignals()
+        self.stopped = threading.Event()
+        self.buffer = []
+        self.count = 0
+        self.last_flush = 0.0
+
+    def cancel(self):
+        self.stopped.set()
+
+    def observe_rule(self, rid):
+        self.buffer.append(("rule", "应用规则: ", self.engine.rules[rid]))
+        self.tick()
+
+    def observe_goal(self, goal):
+        self.tick()
+
+    def tick(self):
+        if self.stopped.is_set():
+            raise Cancelled()
+        self.count += 1
+        if time.monotonic() - self.last_flush >= self.INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if self.buffer:
+            self.signals.records.emit(self.buffer)
+            self.buffer = []
+        self.signals.progress.emit(self.count)
+
+    def run(self):
+        try:
+            if self.mode == "forward":
+                result = self.engine.forward(self.argument, self.strategy, self.stop_at_target,
+                                             self.observe_rule)
+                if not self.count:
+                    # 命中缓存时没有逐条触发，直接补上推理过程
+                    self.buffer = [("rule", "应用规则: ", rule) for rule in result["trace"]]
+                if result["animal"] is None:
+                    result["candidates"] = self.engine.rank(self.argument)
+            elif self.mode == "consult":
+                result = {"consultation": self.engine.consult()}
+                if self.stopped.is_set():
+                    raise Cancelled()
+            elif self.mode == "optimize":
+                result = {"optimization": optimize(self.engine.rules, self.engine.features),
+                          "version": self.engine.rules.version}
+                if self.stopped.is_set():
+                    raise Cancelled()
+            else:
+                result = self.engine.backward(self.argument, observer=self.observe_goal)
+        except Cancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception as exc:  # 把错误交给界面显示，不让线程池吞掉
+            self.signals.failed.emit(str(exc))
+            return
+        self.flush()
+        self.signals.finished.emit(result)
 
 
 class RuleManagerDialog(QDialog):
-    """规则管理对话框"""
+    """规则管理对话框
+
+    规则列表由 RuleListModel 提供，打开对话框时不再逐条建立列表项；
+    可以按前提或结论过滤、多选，输入框可一次粘贴多行规则。
+    """
 
-    def __init__(self, parent=None):
+    # 过滤字段的显示名称
+    FILTER_FIELDS = {"全部": "all", "前提": "premise", "结论": "conclusion"}
+
+    def __init__(self, rules, parent=None):
         super().__init__(parent)
         self.setWindowTitle("规则管理")
         self.setFixedSize(800, 600)
 
         layout = QVBoxLayout()
 
-        # 规则输入框
-        self.rule_input = QLineEdit()
-        self.rule_input.setPlaceholderText("按“特征1 特征2 …，结论”格式输入规则")
-        layout.addWidget(QLabel("输入规则："))
+        # 规则输入框（每行一条规则）
+        self.rule_input = QPlainTextEdit()
+        self.rule_input.setPlaceholderText("按“特征1 特征2 …，结论”格式输入规则（末尾可加 [cf=0.8 salience=1]），每行一条，可直接粘贴多行")
+        self.rule_input.setMaximumHeight(120)
+        self.input_label = QLabel("输入规则：")
+        layout.addWidget(self.input_label)
         layout.addWidget(self.rule_input)
 
         # 按钮区域
@@ -31,13 +163,44 @@ class RuleManagerDialog(QDialog):
         btn_layout.addWidget(self.btn_cancel)
         layout.addLayout(btn_layout)
 
+        # 过滤条件
+        filter_layout = QHBoxLayout()
+        self.filter_field = QComboBox()
+        self.filter_field.addItems(self.FILTER_FIELDS)
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("按前提或结论过滤…")
+        self.count_label = QLabel()
+        filter_layout.addWidget(QLabel("现有规则："))
+        filter_layout.addWidget(self.filter_field)
+        filter_layout.addWidget(self.filter_input, 1)
+        filter_layout.addWidget(self.count_label)
+        layout.addLayout(filter_layout)
+
         # 规则列表
-        self.rule_list = QListWidget()
-        layout.addWidget(QLabel("现有规则："))
+        self.model = RuleListModel(rules, self)
+        self.rule_list = QListView()
+        self.rule_list.setModel(self.model)
+        self.rule_list.setUniformItemSizes(True)
+        self.rule_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         layout.addWidget(self.rule_list)
 
+        self.filter_input.textChanged.connect(self.apply_filter)
+        self.filter_field.currentTextChanged.connect(self.apply_filter)
+        self.model.modelReset.connect(self.update_count)
+        self.update_count()
+
         self.setLayout(layout)
 
+    def apply_filter(self):
+        self.model.set_filter(self.filter_input.text(), self.FILTER_FIELDS[self.filter_field.currentText()])
+
+    def update_count(self):
+        self.count_label.setText(f"{self.model.rowCount()}/{len(self.model.rules)}")
+
+    def selected_rules(self):
+        """选中规则的编号"""
+        return [index.data(Qt.UserRole) for index in self.rule_list.selectionModel().selectedRows()]
+
 
 class AnimalRecognitionSystem(QMainWindow):
     def __init__(self):
@@ -45,35 +208,17 @@ class AnimalRecognitionSystem(QMainWindow):
         self.setWindowTitle("动物识别系统 - 产生式规则实验")
         self.setGeometry(100, 100, 1000, 800)  # 增大窗口尺寸
 
-        # 初始化知识库
-        self.rules = [
-            {"if": ["有毛发"], "then": "哺乳类"},
-            {"if": ["产奶"], "then": "哺乳类"},
-            {"if": ["有羽毛"], "then": "鸟类"},
-            {"if": ["会下蛋", "不会飞"], "then": "鸟类"},
-            {"if": ["哺乳类", "吃肉"], "then": "食肉类"},
-            {"if": ["有犬齿", "有爪", "眼盯前方"], "then": "食肉类"},
-            {"if": ["哺乳类", "有蹄"], "then": "蹄类"},
-            {"if": ["哺乳类", "反刍"], "then": "蹄类"},
-            # 动物识别规则
-            {"if": ["食肉类", "黄褐色", "哺乳类", "有斑点"], "then": "金钱豹"},
-            {"if": ["食肉类", "黄褐色", "哺乳类", "有黑色条纹"], "then": "虎"},
-            {"if": ["有黑色条纹", "蹄类"], "then": "斑马"},
-            {"if": ["有斑点", "蹄类", "长脖", "长腿"], "then": "长颈鹿"},
-            {"if": ["鸟类", "不会飞", "长脖", "长腿"], "then": "鸵鸟"},
-            {"if": ["鸟类", "不会飞", "会游泳", "黑白二色"], "then": "企鹅"},
-            {"if": ["鸟类", "善飞"], "then": "信天翁"}
-        ]
-
-        self.features = {
-            '1': '有毛发', '2': '产奶', '3': '有羽毛', '4': '不会飞',
-            '5': '会下蛋', '6': '吃肉', '7': '有犬齿', '8': '有爪',
-            '9': '眼盯前方', '10': '有蹄', '11': '反刍', '12': '黄褐色',
-            '13': '有斑点', '14': '有黑色条纹', '15': '长脖', '16': '长腿',
-            '17': '不会飞', '18': '会游泳', '19': '黑白二色', '20': '善飞'
-        }
-
-        self.animal_targets = ["金钱豹", "虎", "斑马", "长颈鹿", "鸵鸟", "企鹅", "信天翁"]
+        # 初始化知识库（推理引擎不依赖界面，见 engine.py）
+        self.engine = InferenceEngine()
+        self.rules = self.engine.rules
+        self.features = self.engine.features
+        self.animal_targets = self.engine.animal_targets
+        self.task = None  # 正在后台运行的推理任务
+        self.consultation = None  # 咨询模式下进行中的咨询（consult.Consultation）
+        self.question = None  # 咨询中等待回答的特征
+        self.kb_path = None  # 当前打开的知识库文件
+        self.watcher = None  # 自动重新加载时的 KnowledgeBaseWatcher
+        self.reload_signals = None
 
         self.init_ui()
 
@@ -95,6 +240,7 @@ class AnimalRecognitionSystem(QMainWindow):
         self.mode_combo = QComboBox()
         self.mode_combo.addItem("正向推理")
         self.mode_combo.addItem("反向推理")
+        self.mode_combo.addItem("咨询模式")
         mode_layout.addWidget(QLabel("选择推理模式:"))
         mode_layout.addWidget(self.mode_combo)
 
@@ -105,6 +251,23 @@ class AnimalRecognitionSystem(QMainWindow):
         mode_layout.addWidget(QLabel("目标动物:"))
         mode_layout.addWidget(self.target_combo)
 
+        # 冲突消解策略与提前终止
+        self.strategy_combo = QComboBox()
+        self.strategy_combo.addItems(STRATEGY_NAMES)
+        mode_layout.addWidget(QLabel("冲突消解:"))
+        mode_layout.addWidget(self.strategy_combo)
+        self.stop_check = QCheckBox("推出动物即停止")
+        mode_layout.addWidget(self.stop_check)
+        self.optimize_check = QCheckBox("规则优化")
+        self.optimize_check.setToolTip("匹配网络使用精简后的等价规则集：推出的事实不变，触发顺序和推理过程可能不同")
+        self.optimize_check.toggled.connect(self.toggle_optimization)
+        mode_layout.addWidget(self.optimize_check)
+
+        # 实时推理：勾选/取消特征时增量更新结论
+        self.live_check = QCheckBox("实时推理")
+        self.live_check.toggled.connect(self.toggle_live_reasoning)
+        mode_layout.addWidget(self.live_check)
+
         mode_group.setLayout(mode_layout)
         layout.addWidget(mode_group)
 
@@ -119,155 +282,501 @@ class AnimalRecognitionSystem(QMainWindow):
         self.btn_add_rule = QPushButton("添加规则")
         self.btn_del_rule = QPushButton("删除规则")
 
+        self.btn_open_kb = QPushButton("打开知识库")
+        self.btn_save_kb = QPushButton("保存知识库")
+
         self.btn_view_rules.clicked.connect(self.show_rules)
         self.btn_add_rule.clicked.connect(self.add_rule_dialog)
         self.btn_del_rule.clicked.connect(self.delete_rule)
+        self.btn_open_kb.clicked.connect(self.open_knowledge_base)
+        self.btn_save_kb.clicked.connect(self.save_knowledge_base)
 
         rule_layout.addWidget(self.btn_view_rules)
         rule_layout.addWidget(self.btn_add_rule)
         rule_layout.addWidget(self.btn_del_rule)
+        # 撤销/重做整批的增删（规则库保存了历史版本）
+        history_layout = QHBoxLayout()
+        self.btn_undo = QPushButton("撤销")
+        self.btn_redo = QPushButton("重做")
+        self.btn_undo.clicked.connect(self.undo_rules)
+        self.btn_redo.clicked.connect(self.redo_rules)
+        QShortcut(QKeySequence.Undo, self, self.undo_rules)
+        QShortcut(QKeySequence.Redo, self, self.redo_rules)
+        history_layout.addWidget(self.btn_undo)
+        history_layout.addWidget(self.btn_redo)
+        rule_layout.addLayout(history_layout)
+        file_layout = QHBoxLayout()
+        file_layout.addWidget(self.btn_open_kb)
+        file_layout.addWidget(self.btn_save_kb)
+        # 知识库文件被修改后在后台重新编译并换上新版本
+        self.reload_check = QCheckBox("自动重新加载")
+        self.reload_check.setEnabled(False)
+        self.reload_check.toggled.connect(self.toggle_auto_reload)
+        file_layout.addWidget(self.reload_check)
+        rule_layout.addLayout(file_layout)
         rule_group.setLayout(rule_layout)
         layout.addWidget(rule_group)
 
-        # 特征选择区域
+        # 特征选择区域：勾选状态保存在模型里，列表只绘制可见的行
         feature_group = QGroupBox("选择动物特征")
         feature_layout = QVBoxLayout()
-
-        self.checkboxes = {}
-        for key, text in self.features.items():
-            cb = QCheckBox(f"{key}: {text}")
-            cb.key = key
-            self.checkboxes[key] = cb
-            feature_layout.addWidget(cb)
-
+        self.feature_selector = FeatureSelector()
+        self.feature_selector.model.toggled.connect(self.feature_toggled)
+        self.feature_selector.set_features(self.features)
+        feature_layout.addWidget(self.feature_selector)
         feature_group.setLayout(feature_layout)
-        scroll = QScrollArea()
-        scroll.setWidget(feature_group)
-        scroll.setWidgetResizable(True)
-        layout.addWidget(scroll)
-
-        # 推理按钮
+        layout.addWidget(feature_group)
+
+        # 咨询模式：系统逐个提问，按信息增益选择下一个特征
+        self.consult_group = QGroupBox("咨询")
+        consult_layout = QHBoxLayout()
+        self.question_label = QLabel()
+        self.question_label.setStyleSheet("font-size: 16px;")
+        consult_layout.addWidget(self.question_label, 1)
+        self.answer_buttons = []
+        for text, present in (("是", True), ("否", False), ("不确定", None)):
+            button = QPushButton(text)
+            button.clicked.connect(lambda checked, present=present: self.answer_question(present))
+            consult_layout.addWidget(button)
+            self.answer_buttons.append(button)
+        self.consult_group.setLayout(consult_layout)
+        self.consult_group.setVisible(False)
+        layout.addWidget(self.consult_group)
+
+        # 推理按钮、进度和取消按钮
+        reason_layout = QHBoxLayout()
         self.btn_reason = QPushButton("开始推理")
         self.btn_reason.setStyleSheet("background-color: #4CAF50; color: white;")
         self.btn_reason.clicked.connect(self.start_reasoning)
-        layout.addWidget(self.btn_reason)
+        reason_layout.addWidget(self.btn_reason, 1)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)  # 不知道总量，显示忙碌状态
+        self.progress_label = QLabel()
+        self.btn_cancel = QPushButton("取消")
+        self.btn_cancel.clicked.connect(self.cancel_reasoning)
+        for widget in (self.progress_bar, self.progress_label, self.btn_cancel):
+            widget.setVisible(False)
+            reason_layout.addWidget(widget)
+        layout.addLayout(reason_layout)
 
         # 结果显示区域
-        self.result_display = QTextBrowser()
-        self.result_display.setStyleSheet("""
+        result_layout = QHBoxLayout()
+        # 推理过程按记录保存在模型中，列表视图只绘制可见的行
+        self.result_display = TraceView()
+        self.result_display.list_view.setStyleSheet("""
             font-family: Consolas; 
             font-size: 32px;
             line-height: 1.5;
         """)
-        layout.addWidget(self.result_display)
+        result_layout.addWidget(self.result_display, 3)
+
+        # 规则统计面板（可按列排序）
+        stats_group = QGroupBox("规则统计")
+        stats_layout = QVBoxLayout()
+        stats_buttons = QHBoxLayout()
+        self.profile_check = QCheckBox("开启统计")
+        self.profile_check.toggled.connect(self.toggle_profiling)
+        self.btn_export_stats = QPushButton("导出")
+        self.btn_export_stats.clicked.connect(self.export_stats)
+        self.btn_clear_stats = QPushButton("清空")
+        self.btn_clear_stats.clicked.connect(self.clear_stats)
+        stats_buttons.addWidget(self.profile_check)
+        stats_buttons.addWidget(self.btn_export_stats)
+        stats_buttons.addWidget(self.btn_clear_stats)
+        stats_layout.addLayout(stats_buttons)
+
+        self.stats_summary = QLabel("统计未开启")
+        stats_layout.addWidget(self.stats_summary)
+        self.stats_table = QTableWidget(0, len(STATS_COLUMNS))
+        self.stats_table.setHorizontalHeaderLabels([title for title, _ in STATS_COLUMNS])
+        self.stats_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.stats_table.setSortingEnabled(True)
+        stats_layout.addWidget(self.stats_table)
+        stats_group.setLayout(stats_layout)
+        result_layout.addWidget(stats_group, 2)
+
+        layout.addLayout(result_layout)
+        self.statusBar().showMessage("内置知识库")
+
+    def set_engine(self, engine):
+        """换用另一个知识库的推理引擎，并按它的特征和目标重建界面"""
+        if engine.profiler is None and self.engine.profiler is not None:
+            engine.enable_profiling()
+        self.engine = engine
+        self.rules = engine.rules
+        self.features = engine.features
+        self.animal_targets = engine.animal_targets
+        self.target_combo.clear()
+        self.target_combo.addItems(self.animal_targets)
+        self.feature_selector.set_features(self.features)
+        if self.live_check.isChecked():
+            self.show_live_result(self.engine.reset_facts(self.checked_features()))
+        self.refresh_stats()
+
+    def open_knowledge_base(self):
+        """打开知识库文件（文本 .kb 或编译好的 .kbc）"""
+        if self.task is not None:
+            QMessageBox.warning(self, "错误", "请等待当前推理结束！")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "打开知识库", "", "知识库 (*.kb *.kbc)")
+        if not path:
+            return
+        start = time.perf_counter()
+        try:
+            engine = InferenceEngine.load(path, optimize=self.optimize_check.isChecked())
+            engine.compile()
+        except (OSError, ValueError) as exc:
+            QMessageBox.warning(self, "错误", f"无法打开知识库：{exc}")
+            return
+        compile_ms = (time.perf_counter() - start) * 1000
+        self.stop_watcher()
+        self.kb_path = path
+        self.set_engine(engine)
+        self.show_rules()
+        self.reload_check.setEnabled(True)
+        if self.reload_check.isChecked():
+            self.start_watcher()
+        self.show_kb_status(1, compile_ms)
+
+    def show_kb_status(self, version, compile_ms):
+        self.statusBar().showMessage(f"知识库 {self.kb_path}  版本 {version}，编译 {compile_ms:.1f} ms")
+
+    def start_watcher(self):
+        # 每个监视线程用自己的信号对象，停止后还在排队的旧通知可以认出来丢掉
+        signals = self.reload_signals = ReloadSignals()
+        signals.reloaded.connect(self.knowledge_base_reloaded)
+        signals.failed.connect(self.reload_failed)
+        self.watcher = KnowledgeBaseWatcher(
+            self.kb_path, self.engine,
+            on_reload=signals.reloaded.emit, on_error=signals.failed.emit,
+            optimize=self.optimize_check.isChecked(),
+        ).start()
+
+    def stop_watcher(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+            self.reload_signals = None
+
+    def toggle_auto_reload(self, enabled):
+        """开启时监视当前知识库文件；界面上对规则的修改会被文件中的内容覆盖"""
+        self.stop_watcher()
+        if enabled and self.kb_path:
+            self.start_watcher()
+
+    def knowledge_base_reloaded(self, engine, version, compile_ms):
+        """换上重新编译好的引擎；正在运行的推理任务持有旧版本的快照，不受影响"""
+        if self.sender() is not self.reload_signals:
+            return  # 已经关闭了自动重新加载或换了知识库
+        self.set_engine(engine)
+        self.show_kb_status(version, compile_ms)
+
+    def reload_failed(self, message):
+        if self.sender() is not self.reload_signals:
+            return
+        self.statusBar().showMessage(f"重新加载失败，继续使用原来的版本：{message}")
 
-    def toggle_reasoning_mode(self, mode):
-        """切换推理模式"""
-        if mode == "反向推理":
-            self.target_combo.setVisible(True)
-            # 禁用特征选择区域
-            for cb in self.checkboxes.values():
-                cb.setEnabled(False)
-        else:
-            self.target_combo.setVisible(False)
-            # 启用特征选择区域
-            for cb in self.checkboxes.values():
-                cb.setEnabled(True)
+    def save_knowledge_base(self):
+        """保存为文本知识库，同时写好编译文件"""
+        path, _ = QFileDialog.getSaveFileName(self, "保存知识库", "animals.kb", "知识库 (*.kb)")
+        if not path:
+            return
+        try:
+            self.engine.save(path)
+        except OSError as exc:
+            QMessageBox.warning(self, "错误", f"无法保存知识库：{exc}")
+            return
+        QMessageBox.information(self, "成功", "知识库已保存！")
+
+    def toggle_optimization(self, enabled):
+        """开启规则优化时在线程池中分析规则库，完成后换上结果；关闭时直接使用原规则库"""
+        if self.watcher is not None:
+            self.watcher.optimize = enabled
+        if not enabled:
+            self.engine.enable_optimization(False)
+            return
+        task = ReasoningTask(self.engine.snapshot(), "optimize", None)
+        task.signals.cancelled.connect(self.optimization_aborted)
+        task.signals.failed.connect(self.optimization_aborted)
+        self.run_task(task, self.optimization_done)
+        self.progress_label.setText("正在分析规则库…")
+
+    def optimization_aborted(self, message=None):
+        self.optimize_check.blockSignals(True)
+        self.optimize_check.setChecked(False)
+        self.optimize_check.blockSignals(False)
+
+    def optimization_done(self, result):
+        if not self.optimize_check.isChecked():
+            return
+        if result["version"] != self.engine.rules.version:
+            # 分析期间规则库又被修改，结果已经不适用
+            self.optimization_aborted()
+            self.statusBar().showMessage("分析期间规则库被修改，请重新开启规则优化")
+            return
+        self.engine.enable_optimization(True, result["optimization"])
+        self.statusBar().showMessage(summary(result["optimization"]))
 
-    def backward_reasoning(self, target):
-        """反向推理"""
-        self.result_display.clear()
-        self.result_display.append(f"=== 反向推理: 证明目标 '{target}' ===")
+    def toggle_profiling(self, enabled):
+        """开启或关闭按规则的性能统计"""
+        self.engine.enable_profiling(enabled)
+        self.refresh_stats()
 
-        required_features = set()
-        visited_rules = set()
-        queue = [target]
+    def clear_stats(self):
+        if self.engine.profiler is not None:
+            self.engine.profiler.reset()
+        self.refresh_stats()
 
-        while queue:
-            current = queue.pop(0)
+    def refresh_stats(self):
+        """用引擎的统计结果重建统计表
 
-            # 如果是基本特征，直接加入所需特征集
-            if current in self.features.values():
-                required_features.add(current)
-                continue
+        后台任务与本引擎共用统计计数器，任务运行期间不读取，等 task_done 时再刷新。
+        """
+        if self.task is not None:
+            return
+        stats = self.engine.profile_stats()
+        self.stats_table.setSortingEnabled(False)
+        self.stats_table.setRowCount(0)
+        if stats is None:
+            self.stats_summary.setText("统计未开启")
+            return
 
-            # 查找能推导出当前结论的规则
-            applicable_rules = [rule for rule in self.rules if rule["then"] == current]
+        forward, backward = stats["forward"], stats["backward"]
+        self.stats_summary.setText(
+            f"正向 {forward['runs']} 次，最多 {forward['max_iterations']} 轮到达不动点；"
+            f"反向 {backward['runs']} 次，目标栈最深 {backward['max_depth']}"
+        )
+        self.stats_table.setRowCount(len(stats["rules"]))
+        for row, entry in enumerate(stats["rules"]):
+            for column, (_, field) in enumerate(STATS_COLUMNS):
+                value = entry[field]
+                item = QTableWidgetItem()
+                if field == "failed_on":
+                    value = next(iter(value), "")
+                elif field == "rule":
+                    value = value or f"（已删除 #{entry['rid']}）"
+                elif field == "time_ms":
+                    value = round(value, 3)
+                # 数值直接存入 DisplayRole，排序按数值而不是字符串
+                item.setData(Qt.DisplayRole, value)
+                self.stats_table.setItem(row, column, item)
+        self.stats_table.setSortingEnabled(True)
+
+    def export_stats(self):
+        """把统计结果导出为 CSV 或 JSON"""
+        stats = self.engine.profile_stats()
+        if stats is None:
+            QMessageBox.warning(self, "错误", "请先开启统计！")
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "导出统计", "rule_stats.csv", "CSV 文件 (*.csv);;JSON 文件 (*.json)"
+        )
+        if path:
+            save_stats(stats, path)
 
-            if not applicable_rules:
-                self.result_display.append(f"⚠️ 错误: 没有规则可以推导出 '{current}'")
-                continue
+    def toggle_reasoning_mode(self, mode):
+        """切换推理模式"""
+        self.target_combo.setVisible(mode == "反向推理")
+        # 反向推理和咨询模式不使用勾选的特征，禁用特征选择区域
+        self.feature_selector.set_enabled(mode == "正向推理")
+        if mode != "咨询模式":
+            self.consultation = None
+            self.consult_group.setVisible(False)
+
+    def checked_features(self):
+        """当前勾选的特征（按特征顺序）"""
+        return self.feature_selector.checked_features()
+
+    def toggle_live_reasoning(self, enabled):
+        """开启实时推理时，以当前勾选的特征重新建立推理状态"""
+        if enabled:
+            self.show_live_result(self.engine.reset_facts(self.checked_features()))
+
+    def feature_toggled(self, fact, present):
+        """实时推理：勾选断言一个事实，取消勾选撤回它"""
+        if not self.live_check.isChecked():
+            return
+        self.show_live_result(self.engine.toggle_fact(fact, present))
 
-            # 使用第一个找到的规则（简化处理）
-            rule = applicable_rules[0]
-            if str(rule) in visited_rules:
-                continue
+    def show_live_result(self, result):
+        """显示增量推理的当前状态"""
+        self.result_display.clear()
+        self.result_display.append("=== 实时推理 ===", "header")
+        if result["added"]:
+            self.result_display.append(f"新推出: {' ∧ '.join(result['added'])}", "fact")
+        if result["removed"]:
+            self.result_display.append(f"已撤回: {' ∧ '.join(result['removed'])}", "fact")
+        self.result_display.extend([("rule", "应用规则: ", rule) for rule in result["trace"]])
+
+        self.result_display.append("\n=== 推理结果 ===", "header")
+        if result["animal"]:
+            self.result_display.append(f"识别结果: {result['animal']}", "result")
+        else:
+            self.result_display.append("无法确定具体动物类型", "result")
+            self.result_display.append(f"当前事实: {' ∧ '.join(result['facts'])}", "fact")
 
-            visited_rules.add(str(rule))
+    def backward_reasoning(self, target):
+        """反向推理（在后台线程中求解）"""
+        self.result_display.clear()
+        self.result_display.append(f"=== 反向推理: 证明目标 '{target}' ===", "header")
 
-            self.result_display.append(f"需要满足: {' ∧ '.join(rule['if'])} → {rule['then']}")
+        task = ReasoningTask(self.engine.snapshot(), "backward", target)
+        self.run_task(task, lambda result: self.show_backward_result(target, result))
 
-            # 将前提条件加入队列
-            for cond in rule["if"]:
-                if cond not in required_features:
-                    queue.append(cond)
+    def show_backward_result(self, target, result):
+        """显示反向推理的结果"""
+        self.result_display.extend([
+            ("warning", f"⚠️ 错误: 没有规则可以推导出 '{step['missing']}'", None) if "missing" in step
+            else ("rule", "可用规则: ", step["rule"])
+            for step in result["steps"]
+        ])
+        required_features = result["required"]
 
         # 显示最终结果
-        self.result_display.append("\n=== 反向推理结果 ===")
+        self.result_display.append("\n=== 反向推理结果 ===", "header")
         if required_features:
-            self.result_display.append(f"要证明 '{target}'，需要以下特征:")
-            for feature in sorted(required_features):
-                self.result_display.append(f" - {feature}")
+            self.result_display.append(f"要证明 '{target}'，需要以下特征:", "result")
+            for feature in required_features:
+                self.result_display.append(f" - {feature}", "fact")
+            # 其他可行的特征组合
+            for i, proof in enumerate(result["proofs"][1:], 2):
+                self.result_display.append(f"方案 {i}: {' ∧ '.join(proof)}", "result")
+            if result["capped"]:
+                self.result_display.append(f"（方案不止这些，只列出了最小的 {len(result['proofs'])} 个）", "info")
         else:
-            self.result_display.append(f"无法确定证明 '{target}' 所需的特征")
+            self.result_display.append(f"无法确定证明 '{target}' 所需的特征", "warning")
+
+    def run_task(self, task, on_finished):
+        """在线程池中运行推理任务；运行期间禁用“开始推理”，显示进度和取消按钮"""
+        self.task = task
+        self.progress_label.setText("推理中…")
+        task.signals.records.connect(self.result_display.extend)
+        task.signals.progress.connect(self.show_progress)
+        task.signals.finished.connect(on_finished)
+        task.signals.finished.connect(self.task_done)
+        task.signals.cancelled.connect(self.task_cancelled)
+        task.signals.failed.connect(self.task_failed)
+
+        self.btn_reason.setEnabled(False)
+        self.optimize_check.setEnabled(False)
+        self.set_stats_controls_enabled(False)
+        for widget in (self.progress_bar, self.progress_label, self.btn_cancel):
+            widget.setVisible(True)
+        self.btn_cancel.setEnabled(True)
+        QThreadPool.globalInstance().start(task)
+
+    def show_progress(self, count):
+        if self.task is None or self.task.mode not in ("forward", "backward"):
+            return
+        unit = "条规则已触发" if self.task.mode == "forward" else "个目标已展开"
+        self.progress_label.setText(f"{count} {unit}")
+
+    def cancel_reasoning(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.btn_cancel.setEnabled(False)
+
+    def task_cancelled(self):
+        self.result_display.append("\n⚠️ 推理已取消", "warning")
+        self.task_done()
+
+    def task_failed(self, message):
+        self.result_display.append(f"\n⚠️ 推理出错: {message}", "warning")
+        self.task_done()
+
+    def task_done(self, result=None):
+        self.task = None
+        self.btn_reason.setEnabled(True)
+        self.optimize_check.setEnabled(True)
+        self.set_stats_controls_enabled(True)
+        for widget in (self.progress_bar, self.progress_label, self.btn_cancel):
+            widget.setVisible(False)
+        if self.engine.profiler is not None:
+            self.refresh_stats()
+
+    def set_stats_controls_enabled(self, enabled):
+        """后台任务运行时禁用统计的开关、导出和清空，避免界面线程读写正在更新的计数器"""
+        for widget in (self.profile_check, self.btn_export_stats, self.btn_clear_stats):
+            widget.setEnabled(enabled)
+
+    def closeEvent(self, event):
+        """关闭窗口时取消正在运行的推理并等待线程结束"""
+        if self.task is not None:
+            self.task.cancel()
+        self.stop_watcher()
+        QThreadPool.globalInstance().waitForDone()
+        super().closeEvent(event)
 
     def show_rules(self):
         """显示所有规则"""
         self.result_display.clear()
-        self.result_display.append("=== 当前规则库 ===")
-        for i, rule in enumerate(self.rules, 1):
-            conditions = " ∧ ".join(rule["if"])
-            self.result_display.append(f"{i}. 如果 {conditions} → {rule['then']}")
+        self.result_display.append("=== 当前规则库 ===", "header")
+        self.result_display.extend([("rule", f"{i}. 如果 ", rule) for i, rule in enumerate(self.rules, 1)])
+        report = self.engine.optimization
+        if report is not None:
+            self.result_display.append("\n=== 规则优化 ===", "header")
+            self.result_display.append(summary(report), "info")
+            self.result_display.extend([("warning", text, None) for text in self.optimization_notes(report)])
+
+    def optimization_notes(self, report):
+        """优化结果中逐条的说明，规则按 show_rules 中的序号称呼"""
+        position = {rid: i for i, rid in enumerate(self.rules.ids(), 1)}
+        notes = []
+        for rid, kept in report["duplicates"].items():
+            notes.append(f"第 {position[rid]} 条与第 {position[kept]} 条重复")
+        for rid, kept in report["subsumed"].items():
+            notes.append(f"第 {position[rid]} 条被第 {position[kept]} 条包含")
+        for rid in report["unreachable"]:
+            notes.append(f"第 {position[rid]} 条的前提无法由基本特征推出")
+        for rid in report["cyclic"]:
+            notes.append(f"第 {position[rid]} 条只有在结论已经成立时前提才能满足（循环）")
+        for rid, names in report["redundant"].items():
+            notes.append(f"第 {position[rid]} 条的前提 {' ∧ '.join(names)} 可由其他前提推出")
+        for key, first in report["aliases"].items():
+            notes.append(f"特征 {key} 与 {first} 同名，已合并")
+        return notes
 
     def add_rule_dialog(self):
         """添加规则对话框"""
-        dialog = RuleManagerDialog(self)
+        dialog = RuleManagerDialog(self.rules, self)
         dialog.btn_ok.clicked.connect(lambda: self.add_rule(dialog))
         dialog.btn_cancel.clicked.connect(dialog.reject)
-
-        # 显示现有规则
-        dialog.rule_list.clear()
-        for rule in self.rules:
-            conditions = " ∧ ".join(rule["if"])
-            dialog.rule_list.addItem(f"{conditions} → {rule['then']}")
-
         dialog.exec_()
 
     def add_rule(self, dialog):
-        """添加新规则"""
-        text = dialog.rule_input.text().strip()
+        """添加新规则（可以一次添加多行）"""
+        text = dialog.rule_input.toPlainText().strip()
         if not text:
             QMessageBox.warning(self, "错误", "请输入规则！")
             return
 
-        if "，" not in text:
-            QMessageBox.warning(self, "格式错误", "请使用中文逗号分隔条件和结论！")
+        # 一次检查所有行，有错误时一条也不添加
+        valid_features = set(self.features.values()) | set(self.engine.intermediate)
+        rules, errors = parse_rules(text.splitlines(), valid_features)
+        if errors:
+            message = "\n".join(errors[:10])
+            if len(errors) > 10:
+                message += f"\n…共 {len(errors)} 处错误"
+            QMessageBox.warning(self, "错误", message)
             return
 
-        conditions, conclusion = text.split("，", 1)
-        conditions = [c.strip() for c in conditions.split()]
-
-        # 检查特征是否存在
-        valid_features = list(self.features.values()) + ["哺乳类", "鸟类", "食肉类", "蹄类"]
-        for cond in conditions:
-            if cond not in valid_features:
-                QMessageBox.warning(self, "错误", f"特征 '{cond}' 不在系统中！")
+        duplicates = self.engine.find_duplicates(rules)
+        if duplicates:
+            message = "\n".join(duplicates[:10])
+            if len(duplicates) > 10:
+                message += f"\n…共 {len(duplicates)} 条"
+            answer = QMessageBox.question(self, "重复的规则", f"{message}\n\n这些规则不会带来新的结论，仍然添加吗？")
+            if answer != QMessageBox.Yes:
                 return
 
-        self.rules.append({"if": conditions, "then": conclusion.strip()})
-        QMessageBox.information(self, "成功", "规则已添加！")
+        # 后台推理使用规则库的副本，这里的修改从下一次推理开始生效
+        self.engine.add_rules(rules)
+        QMessageBox.information(self, "成功", "规则已添加！" if len(rules) == 1 else f"已添加 {len(rules)} 条规则！")
         dialog.accept()
-        self.show_rules()
+        if self.task is None:
+            self.show_rules()
 
     def delete_rule(self):
         """删除规则"""
@@ -275,77 +784,151 @@ class AnimalRecognitionSystem(QMainWindow):
             QMessageBox.warning(self, "错误", "规则库为空！")
             return
 
-        dialog = RuleManagerDialog(self)
+        dialog = RuleManagerDialog(self.rules, self)
         dialog.setWindowTitle("删除规则")
+        dialog.input_label.setVisible(False)
         dialog.rule_input.setVisible(False)
         dialog.btn_ok.setText("删除选中规则")
-
-        # 显示规则列表
-        dialog.rule_list.clear()
-        for rule in self.rules:
-            conditions = " ∧ ".join(rule["if"])
-            dialog.rule_list.addItem(f"{conditions} → {rule['then']}")
-
-        dialog.rule_list.setSelectionMode(QListWidget.SingleSelection)
         dialog.btn_ok.clicked.connect(lambda: self.confirm_delete(dialog))
+        dialog.btn_cancel.clicked.connect(dialog.reject)
         dialog.exec_()
 
     def confirm_delete(self, dialog):
-        """确认删除规则"""
-        selected = dialog.rule_list.currentRow()
-        if selected == -1:
+        """确认删除选中的规则（可多选）"""
+        selected = dialog.selected_rules()
+        if not selected:
             QMessageBox.warning(self, "错误", "请选择要删除的规则！")
             return
 
-        del self.rules[selected]
-        QMessageBox.information(self, "成功", "规则已删除！")
+        self.engine.delete_rules(selected)
+        QMessageBox.information(self, "成功", "规则已删除！" if len(selected) == 1 else f"已删除 {len(selected)} 条规则！")
         dialog.accept()
-        self.show_rules()
+        if self.task is None:
+            self.show_rules()
+
+    def undo_rules(self):
+        self.switch_rule_version(False)
+
+    def redo_rules(self):
+        self.switch_rule_version(True)
+
+    def switch_rule_version(self, forward):
+        """撤销或重做一批规则的增删，显示两个版本之间的差异"""
+        changes = self.engine.redo() if forward else self.engine.undo()
+        action = "重做" if forward else "撤销"
+        if changes is None:
+            self.statusBar().showMessage(f"没有可{action}的修改")
+            return
+        added, removed = changes["added"], changes["removed"]
+        self.statusBar().showMessage(f"已{action}：恢复 {len(added)} 条规则，去掉 {len(removed)} 条规则")
+        if self.live_check.isChecked():
+            self.show_live_result(self.engine.reset_facts(self.checked_features()))
+        elif self.task is None:
+            self.result_display.clear()
+            self.result_display.append(f"=== {action} ===", "header")
+            self.result_display.extend([("rule", "恢复: 如果 ", rule) for _, rule in added])
+            self.result_display.extend([("rule", "去掉: 如果 ", rule) for _, rule in removed])
 
     def start_reasoning(self):
         """开始推理"""
+        if self.task is not None:
+            return
         mode = self.mode_combo.currentText()
 
         if mode == "正向推理":
             self.forward_reasoning()
+        elif mode == "咨询模式":
+            self.start_consultation()
         else:
             target = self.target_combo.currentText()
             self.backward_reasoning(target)
 
     def forward_reasoning(self):
         """正向推理"""
-        selected_features = [
-            self.features[cb.key] for cb in self.checkboxes.values() if cb.isChecked()
-        ]
+        selected_features = self.checked_features()
 
         if not selected_features:
-            self.result_display.append("⚠️ 请至少选择一个特征！")
+            self.result_display.append("⚠️ 请至少选择一个特征！", "warning")
             return
 
         self.result_display.clear()
-        self.result_display.append("=== 正向推理过程 ===")
-        self.result_display.append(f"初始事实: {' ∧ '.join(selected_features)}")
-
-        # 正向推理
-        new_facts = True
-        while new_facts:
-            new_facts = False
-            for rule in self.rules:
-                if all(cond in selected_features for cond in rule["if"]) and rule["then"] not in selected_features:
-                    selected_features.append(rule["then"])
-                    self.result_display.append(f"应用规则: {' ∧ '.join(rule['if'])} → {rule['then']}")
-                    new_facts = True
+        self.result_display.append("=== 正向推理过程 ===", "header")
+        self.result_display.append(f"初始事实: {' ∧ '.join(selected_features)}", "fact")
 
-        # 显示最终结果
-        self.result_display.append("\n=== 推理结果 ===")
-        possible_animals = [fact for fact in selected_features if
-                            fact in ["金钱豹", "虎", "斑马", "长颈鹿", "鸵鸟", "企鹅", "信天翁"]]
+        # 正向推理在后台线程中进行，触发的规则成批送回
+        strategy = STRATEGY_NAMES[self.strategy_combo.currentText()]
+        task = ReasoningTask(self.engine.snapshot(), "forward", selected_features,
+                             strategy, self.stop_check.isChecked())
+        self.run_task(task, self.show_forward_result)
+
+    def start_consultation(self):
+        """开始咨询：在当前规则库的快照上逐个提问，直到某个动物得证
 
-        if possible_animals:
-            self.result_display.append(f"识别结果: {possible_animals[0]}")
+        提问用的表在线程池中建立，规则库较大时不卡住界面。
+        """
+        self.result_display.clear()
+        self.result_display.append("=== 咨询 ===", "header")
+        task = ReasoningTask(self.engine.snapshot(), "consult", None)
+        self.run_task(task, self.show_consultation)
+        self.progress_label.setText("正在建立提问表…")
+
+    def show_consultation(self, result):
+        self.consultation = result["consultation"]
+        self.consult_group.setVisible(True)
+        self.ask_next()
+
+    def ask_next(self):
+        self.question = self.consultation.next_question()
+        if self.question is None:
+            self.finish_consultation()
+            return
+        self.question_label.setText(f"第 {len(self.consultation.answers) + 1} 问：是否{self.question}？")
+        for button in self.answer_buttons:
+            button.setEnabled(True)
+
+    def answer_question(self, present):
+        """记录回答，剪去不再相容的候选后提出下一个问题"""
+        if self.consultation is None or self.question is None:
+            return
+        eliminated = len(self.consultation.eliminated)
+        self.consultation.answer(self.question, present)
+        reply = {True: "是", False: "否", None: "不确定"}[present]
+        self.result_display.append(f"{self.question}？ {reply}", "fact")
+        ruled_out = self.consultation.eliminated[eliminated:]
+        if ruled_out:
+            self.result_display.append(f"排除: {'、'.join(ruled_out)}", "info")
+        self.ask_next()
+
+    def finish_consultation(self):
+        consultation = self.consultation
+        for button in self.answer_buttons:
+            button.setEnabled(False)
+        self.question_label.setText("咨询结束")
+        self.result_display.append("\n=== 推理结果 ===", "header")
+        self.result_display.append(f"共提问 {len(consultation.answers)} 个特征", "info")
+        if consultation.animal:
+            self.result_display.append(f"识别结果: {consultation.animal}", "result")
+            self.result_display.append(f"确认的特征: {' ∧ '.join(consultation.facts())}", "fact")
+        else:
+            self.result_display.append("无法确定具体动物类型", "result")
+            for target, probability in consultation.candidates()[:5]:
+                self.result_display.append(f"{target}：可能性 {probability:.0%}", "result")
+
+    def show_forward_result(self, result):
+        """显示正向推理的结果"""
+        self.result_display.append("\n=== 推理结果 ===", "header")
+        if result["animal"]:
+            self.result_display.append(f"识别结果: {result['animal']}", "result")
         else:
-            self.result_display.append("无法确定具体动物类型")
-            self.result_display.append(f"推导出的中间结论: {' ∧ '.join(selected_features)}")
+            self.result_display.append("无法确定具体动物类型", "result")
+            self.result_display.append(f"推导出的中间结论: {' ∧ '.join(result['facts'])}", "fact")
+            if result.get("candidates"):
+                self.result_display.append("最接近的候选:", "header")
+                for i, item in enumerate(result["candidates"], 1):
+                    proofs = f"至少 {item['proofs']}" if item["capped"] else item["proofs"]
+                    self.result_display.append(
+                        f"{i}. {item['target']}：还缺 {' ∧ '.join(item['missing'])}"
+                        f"（已符合 {item['matched']} 项，可能的方案 {proofs} 个）", "result")
 
 
 if __name__ == "__main__":
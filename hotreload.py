@@ -0,0 +1,98 @@
+"""知识库文件的热加载
+
+KnowledgeBaseWatcher 定期检查知识库文件的修改时间和大小，文件变化并稳定下来后
+在后台线程中重新编译（InferenceEngine.load），成功后用一次属性赋值换上新引擎。
+正在进行的推理拿着旧引擎的引用，会在旧版本上完成；之后读取 watcher.engine
+的请求都使用新版本。文件有错误时保留旧引擎，通过 on_error 报告。
+
+只用标准库轮询，不依赖文件系统通知。
+"""
+import os
+import threading
+import time
+
+from engine import InferenceEngine
+
+
+class KnowledgeBaseWatcher:
+    def __init__(self, path, engine=None, interval=1.0, on_reload=None, on_error=None, cache_size=1024,
+                 optimize=False):
+        """engine 为已经加载好的引擎，省略时立即加载一次
+
+        重新加载的引擎使用 cache_size 和 optimize（见 InferenceEngine.load）。
+        on_reload(engine, version, compile_ms) 和 on_error(message) 在监视线程中调用。
+        """
+        self.path = path
+        self.interval = interval
+        self.on_reload = on_reload
+        self.on_error = on_error
+        self.cache_size = cache_size
+        self.optimize = optimize
+        self.version = 1
+        self.compile_ms = 0.0
+        self._stamp = self._stat()
+        self._pending = False
+        self._stopped = threading.Event()
+        self._thread = None
+        if engine is None:
+            start = time.perf_counter()
+            engine = self._load()
+            self.compile_ms = (time.perf_counter() - start) * 1000
+        self.engine = engine
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        engine = InferenceEngine.load(self.path, self.cache_size, self.optimize)
+        engine.compile()  # 匹配网络也在后台建好，第一个请求不必等待
+        return engine
+
+    def check(self):
+        """检查一次文件；变化后要再等一个周期确认文件不再变化才重新加载。返回是否换了引擎"""
+        stamp = self._stat()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._pending = stamp is not None
+            return False
+        if not self._pending:
+            return False
+        self._pending = False
+        return self.reload()
+
+    def reload(self):
+        """立即重新加载；失败时保留原来的引擎"""
+        start = time.perf_counter()
+        try:
+            engine = self._load()
+        except (OSError, ValueError) as exc:
+            if self.on_error is not None:
+                self.on_error(f"{self.path}: {exc}")
+            return False
+        self.compile_ms = (time.perf_counter() - start) * 1000
+        self.version += 1
+        self.engine = engine
+        if self.on_reload is not None:
+            self.on_reload(engine, self.version, self.compile_ms)
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,492 @@
+"""知识库文件
+
+文本格式（.kb）沿用规则输入框的“特征1 特征2，结论”写法，便于阅读和修改：
+
+    # 注释
+    [features]
+    1 有毛发
+    2 产奶
+    [targets]
+    金钱豹
+    [intermediate]
+    哺乳类
+    [rules]
+    有毛发，哺乳类
+    哺乳类 吃肉，食肉类 [cf=0.9 salience=2]
+
+规则末尾方括号中是可选属性（见 engine.RULE_ATTRIBUTES），取缺省值时不写。
+
+编译格式（.kbc，与文本文件同名加 c）保存符号表、各规则的前提和结论，
+以及“前提 -> 规则”“结论 -> 规则”两个索引（CSR 形式的 int32 数组）；
+规则的可选属性很少，只给带属性的规则记在 meta 中。
+打开时用 mmap 映射整个文件，不解析、不建立字典，规则在用到时才读出。
+文件头记录文本内容的 SHA-256，文本改动后下一次打开会自动重新编译。
+符号按 UTF-8 字节序排列，名称到编号用二分查找。
+
+    python kbfile.py compile animals.kb
+    python kbfile.py export animals.kb      # 导出内置的知识库
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from compiler import rule_parts
+from engine import format_attributes, parse_rule, rule_attributes
+from rete import ReteNetwork
+from rulebase import RuleBase
+
+MAGIC = b"AKB1"
+SECTIONS = [
+    # (名称, 类型码)
+    ("meta", "B"),                 # features/targets/intermediate/attributes 的 JSON
+    ("symbol_offsets", "q"),       # 符号 -> 名称在 symbols 中的起止位置
+    ("symbols", "B"),              # 排好序的符号名称（UTF-8）
+    ("rule_offsets", "i"),         # 规则 -> 前提在 premises 中的起止位置
+    ("premises", "i"),             # 各规则的前提（保持书写顺序）
+    ("premise_counts", "i"),       # 规则 -> 去重后的前提数
+    ("conclusions", "i"),          # 规则 -> 结论
+    ("unconditional", "i"),        # 没有前提的规则
+    ("alpha_offsets", "i"),        # 符号 -> 以它为前提的规则（升序）
+    ("alpha", "i"),
+    ("concluding_offsets", "i"),   # 符号 -> 推出它的规则（升序）
+    ("concluding", "i"),
+]
+HEADER = struct.Struct("<4sI32s" + "QQ" * len(SECTIONS))
+ALIGN = 8
+
+
+def compiled_path(path):
+    """文本知识库对应的编译文件路径"""
+    return path + "c"
+
+
+def save_text(path, rules, features, targets, intermediate=()):
+    """保存为文本格式；规则保存前提、结论和不取缺省值的可选属性"""
+    lines = ["# 动物识别知识库", "[features]"]
+    lines += [f"{key} {name}" for key, name in features.items()]
+    lines.append("[targets]")
+    lines += list(targets)
+    lines.append("[intermediate]")
+    lines += list(intermediate)
+    lines.append("[rules]")
+    for rule in rules:
+        premises, conclusion = rule_parts(rule)
+        lines.append(f"{' '.join(premises)}，{conclusion}{format_attributes(rule)}")
+    with open(path, "w", encoding="utf-8", newline="\n") as fp:
+        fp.write("\n".join(lines) + "\n")
+
+
+def parse_text(text):
+    """解析文本格式，返回 (规则列表, 特征字典, 目标列表, 中间结论列表)
+
+    格式错误时抛出 ValueError，信息中带行号。
+    """
+    rules, features, targets, intermediate = [], {}, [], []
+    section = None
+    for line_no, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1].strip()
+            if section not in ("features", "targets", "intermediate", "rules"):
+                raise ValueError(f"第 {line_no} 行: 未知的段落 [{section}]")
+            continue
+        if section == "features":
+            key, _, name = line.partition(" ")
+            if not name.strip():
+                raise ValueError(f"第 {line_no} 行: 特征应写成“编号 名称”")
+            features[key] = name.strip()
+        elif section == "targets":
+            targets.append(line)
+        elif section == "intermediate":
+            intermediate.append(line)
+        elif section == "rules":
+            try:
+                rules.append(parse_rule(line))
+            except ValueError as exc:
+                raise ValueError(f"第 {line_no} 行: {exc}") from None
+        else:
+            raise ValueError(f"第 {line_no} 行: 内容不在任何段落中")
+    return rules, features, targets, intermediate
+
+
+def _csr(buckets, size):
+    offsets = array("i", [0])
+    values = array("i")
+    for key in range(size):
+        values.extend(buckets.get(key, ()))
+        offsets.append(len(values))
+    return offsets, values
+
+
+def write_compiled(path, digest, rules, features, targets, intermediate=()):
+    """把规则编译成二进制文件；先写临时文件再替换，读者不会看到写了一半的文件"""
+    names = set(features.values()) | set(targets) | set(intermediate)
+    for rule in rules:
+        premises, conclusion = rule_parts(rule)
+        names.update(premises)
+        names.add(conclusion)
+    encoded = sorted(name.encode("utf-8") for name in names)
+    ids = {name.decode("utf-8"): sid for sid, name in enumerate(encoded)}
+
+    symbol_offsets = array("q", [0])
+    for name in encoded:
+        symbol_offsets.append(symbol_offsets[-1] + len(name))
+
+    rule_offsets = array("i", [0])
+    premises_out = array("i")
+    premise_counts = array("i")
+    conclusions = array("i")
+    unconditional = array("i")
+    alpha = {}
+    concluding = {}
+    attributes = {}
+    for rid, rule in enumerate(rules):
+        premises, conclusion = rule_parts(rule)
+        if rule_attributes(rule):
+            attributes[str(rid)] = rule_attributes(rule)
+        premises_out.extend(ids[p] for p in premises)
+        rule_offsets.append(len(premises_out))
+        unique = dict.fromkeys(ids[p] for p in premises)
+        premise_counts.append(len(unique))
+        if not unique:
+            unconditional.append(rid)
+        for sid in unique:
+            alpha.setdefault(sid, []).append(rid)
+        conclusions.append(ids[conclusion])
+        concluding.setdefault(ids[conclusion], []).append(rid)
+    alpha_offsets, alpha_values = _csr(alpha, len(encoded))
+    concluding_offsets, concluding_values = _csr(concluding, len(encoded))
+
+    meta = {"features": features, "targets": list(targets), "intermediate": list(intermediate),
+            "attributes": attributes}
+    blobs = {
+        "meta": json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+        "symbol_offsets": symbol_offsets.tobytes(),
+        "symbols": b"".join(encoded),
+        "rule_offsets": rule_offsets.tobytes(),
+        "premises": premises_out.tobytes(),
+        "premise_counts": premise_counts.tobytes(),
+        "conclusions": conclusions.tobytes(),
+        "unconditional": unconditional.tobytes(),
+        "alpha_offsets": alpha_offsets.tobytes(),
+        "alpha": alpha_values.tobytes(),
+        "concluding_offsets": concluding_offsets.tobytes(),
+        "concluding": concluding_values.tobytes(),
+    }
+
+    layout = []
+    position = HEADER.size
+    for name, _ in SECTIONS:
+        position = -(-position // ALIGN) * ALIGN
+        layout += [position, len(blobs[name])]
+        position += len(blobs[name])
+
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as fp:
+        fp.write(HEADER.pack(MAGIC, sys.byteorder == "little", digest, *layout))
+        for (name, _), offset in zip(SECTIONS, layout[::2]):
+            fp.write(b"\0" * (offset - fp.tell()))
+            fp.write(blobs[name])
+    os.replace(temp, path)
+
+
+def read_digest(path):
+    """读出编译文件记录的文本摘要；文件不存在或格式不对时返回 None"""
+    try:
+        with open(path, "rb") as fp:
+            header = fp.read(HEADER.size)
+    except OSError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    magic, little, digest = HEADER.unpack(header)[:3]
+    if magic != MAGIC or little != (sys.byteorder == "little"):
+        return None
+    return digest
+
+
+class CompiledKB:
+    """内存映射的编译知识库，各段是 memoryview（不复制数据）"""
+
+    def __init__(self, path):
+        with open(path, "rb") as fp:
+            self.mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = HEADER.unpack_from(self.mmap)
+        if fields[0] != MAGIC or fields[1] != (sys.byteorder == "little"):
+            raise ValueError(f"{path} 不是本机可用的编译知识库")
+        self.path = path
+        self.digest = fields[2]
+        self.decoded = {}
+        view = memoryview(self.mmap)
+        for index, (name, code) in enumerate(SECTIONS):
+            offset, size = fields[3 + 2 * index], fields[4 + 2 * index]
+            section = view[offset:offset + size]
+            setattr(self, name, section.cast(code) if code != "B" else section)
+
+        meta = json.loads(bytes(self.meta).decode("utf-8"))
+        self.features = meta["features"]
+        self.targets = meta["targets"]
+        self.intermediate = meta["intermediate"]
+        # 规则编号 -> 可选属性（只有带属性的规则）
+        self.attributes = {int(rid): values for rid, values in meta.get("attributes", {}).items()}
+        self.symbol_names = SymbolNames(self)
+        self.symbol_ids = SymbolIds(self)
+
+    def __len__(self):
+        return len(self.conclusions)
+
+    def name(self, sid):
+        """符号编号 -> 名称；解码过的名称留在 decoded 中，推理过程中反复出现的名称只解码一次"""
+        name = self.decoded.get(sid)
+        if name is None:
+            offsets = self.symbol_offsets
+            name = self.decoded[sid] = bytes(self.symbols[offsets[sid]:offsets[sid + 1]]).decode("utf-8")
+        return name
+
+    def find(self, name):
+        """名称 -> 符号编号（二分查找），不存在时返回 -1"""
+        key = name.encode("utf-8")
+        symbols, offsets = self.symbols, self.symbol_offsets
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            current = bytes(symbols[offsets[middle]:offsets[middle + 1]])
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return middle
+        return -1
+
+    def rule(self, rid):
+        """读出一条规则（字典）"""
+        if not 0 <= rid < len(self.conclusions):
+            raise KeyError(rid)
+        start, end = self.rule_offsets[rid], self.rule_offsets[rid + 1]
+        return {
+            "if": [self.name(sid) for sid in self.premises[start:end]],
+            "then": self.name(self.conclusions[rid]),
+            **self.attributes.get(rid, {}),
+        }
+
+    def _bucket(self, offsets, values, name):
+        sid = self.find(name)
+        if sid < 0:
+            return ()
+        return values[offsets[sid]:offsets[sid + 1]]
+
+    def rules_concluding(self, name):
+        return self._bucket(self.concluding_offsets, self.concluding, name)
+
+    def rules_using(self, name):
+        return self._bucket(self.alpha_offsets, self.alpha, name)
+
+
+class SymbolNames:
+    """符号编号 -> 名称，接口与 SymbolTable.names 相同"""
+
+    def __init__(self, kb):
+        self.kb = kb
+
+    def __getitem__(self, sid):
+        return self.kb.name(sid)
+
+    def __len__(self):
+        return len(self.kb.symbol_offsets) - 1
+
+
+class SymbolIds:
+    """名称 -> 符号编号，接口与 SymbolTable.ids 相同"""
+
+    def __init__(self, kb):
+        self.kb = kb
+
+    def __contains__(self, name):
+        return self.kb.find(name) >= 0
+
+    def __getitem__(self, name):
+        sid = self.kb.find(name)
+        if sid < 0:
+            raise KeyError(name)
+        return sid
+
+    def get(self, name, default=None):
+        sid = self.kb.find(name)
+        return default if sid < 0 else sid
+
+
+class MappedSymbols:
+    def __init__(self, kb):
+        self.names = kb.symbol_names
+        self.ids = kb.symbol_ids
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+
+class MappedNetwork(ReteNetwork):
+    """直接建立在编译文件各数组上的匹配网络
+
+    alpha 存储就是“前提 -> 规则”索引的切片，计数器初值就是 premise_counts，
+    不需要逐条加入规则，打开后即可推理。只读：规则库修改后由引擎改用 ReteNetwork。
+    """
+
+    editable = False
+
+    def __init__(self, kb):
+        self.kb = kb
+        self.symbols = MappedSymbols(kb)
+        self.alpha = AlphaView(kb)
+        self.premise_count = kb.premise_counts
+        self.conclusions = kb.conclusions
+        self.unconditional = kb.unconditional
+        self.salience = {rid: values["salience"] for rid, values in kb.attributes.items() if values.get("salience")}
+        self.examined = 0
+
+    def add(self, rid, rule):
+        raise TypeError("内存映射的匹配网络是只读的")
+
+    remove = add
+
+
+class AlphaView:
+    def __init__(self, kb):
+        self.offsets = kb.alpha_offsets
+        self.values = kb.alpha
+
+    def __getitem__(self, sid):
+        return self.values[self.offsets[sid]:self.offsets[sid + 1]]
+
+
+class MappedRuleBase:
+    """内存映射的规则库，读取接口与 RuleBase 相同
+
+    规则编号就是文件中的顺序。只读操作直接查编译文件；第一次修改
+    （或访问 by_premise 等索引、撤销历史）时展开成普通的 RuleBase，
+    之后全部转交给它。copy() 在展开前后都是 O(1) 的。
+    """
+
+    def __init__(self, kb):
+        self.kb = kb
+        self.base = None
+
+    @property
+    def mapped(self):
+        return self.base is None
+
+    def materialize(self):
+        if self.base is None:
+            self.base = RuleBase(self.kb.rule(rid) for rid in range(len(self.kb)))
+        return self.base
+
+    def __getattr__(self, name):
+        # by_conclusion、by_premise、next_id、checkpoint、undo 等
+        if name.startswith("__") or name in ("kb", "base"):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    @property
+    def version(self):
+        return len(self.kb) if self.base is None else self.base.version
+
+    def add(self, rule):
+        return self.materialize().add(rule)
+
+    def remove(self, rid):
+        return self.materialize().remove(rid)
+
+    def copy(self):
+        return MappedRuleBase(self.kb) if self.base is None else self.base.copy()
+
+    def ids(self):
+        return range(len(self.kb)) if self.base is None else self.base.ids()
+
+    def concluding(self, conclusion):
+        if self.base is not None:
+            return self.base.concluding(conclusion)
+        return [self.kb.rule(rid) for rid in self.kb.rules_concluding(conclusion)]
+
+    def using(self, premise):
+        if self.base is not None:
+            return self.base.using(premise)
+        return [self.kb.rule(rid) for rid in self.kb.rules_using(premise)]
+
+    def items(self):
+        if self.base is not None:
+            return self.base.items()
+        return ((rid, self.kb.rule(rid)) for rid in range(len(self.kb)))
+
+    def __getitem__(self, rid):
+        return self.kb.rule(rid) if self.base is None else self.base[rid]
+
+    def __contains__(self, rid):
+        return 0 <= rid < len(self.kb) if self.base is None else rid in self.base
+
+    def __iter__(self):
+        return (rule for _, rule in self.items())
+
+    def __len__(self):
+        return len(self.kb) if self.base is None else len(self.base)
+
+
+def load(path):
+    """打开知识库，返回 (规则库, 特征字典, 目标列表, 中间结论列表)
+
+    path 为文本文件时检查同名的编译文件：摘要一致就直接映射，
+    否则重新编译；编译文件写不进去时退回到普通的 RuleBase。
+    path 也可以直接是编译文件。
+    """
+    if path.endswith(".kbc"):
+        kb = CompiledKB(path)
+        return MappedRuleBase(kb), kb.features, kb.targets, kb.intermediate
+
+    with open(path, "rb") as fp:
+        data = fp.read()
+    digest = hashlib.sha256(data).digest()
+    target = compiled_path(path)
+    if read_digest(target) != digest:
+        rules, features, targets, intermediate = parse_text(data.decode("utf-8"))
+        try:
+            write_compiled(target, digest, rules, features, targets, intermediate)
+        except OSError:
+            return RuleBase(rules), features, targets, intermediate
+    kb = CompiledKB(target)
+    return MappedRuleBase(kb), kb.features, kb.targets, kb.intermediate
+
+
+def save(path, rules, features, targets, intermediate=()):
+    """保存文本文件并同时写好编译文件"""
+    rules = list(rules)
+    save_text(path, rules, features, targets, intermediate)
+    with open(path, "rb") as fp:
+        digest = hashlib.sha256(fp.read()).digest()
+    write_compiled(compiled_path(path), digest, rules, features, targets, intermediate)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="知识库文件工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("compile", help="检查并（必要时）重新编译文本知识库").add_argument("path")
+    sub.add_parser("export", help="把内置的知识库保存为文本和编译文件").add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        from engine import InferenceEngine
+        InferenceEngine().save(args.path)
+    rules, features, targets, _ = load(args.path)
+    print(f"{args.path}: {len(rules)} 条规则，{len(features)} 个特征，{len(targets)} 个目标")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import random
+
+
+def generate(rules=1000, depth=4, fan_in=2, alternatives=1, cycles=0.0, base=50, seed=0):
+    """生成合成知识库，返回 (规则列表, 特征字典, 目标列表)
+
+    rules        规则总数（近似）
+    depth        推理链深度：结论分为 depth 层，第 L 层的每条规则至少依赖一个第 L-1 层的符号
+    fan_in       每条规则的前提数
+    alternatives 每个结论的候选规则数（反向推理的“或”分支）
+    cycles       回边规则占总规则数的比例：由高层结论推出低层结论，形成循环
+    base         基本特征数
+    最高一层的结论作为目标动物。
+    """
+    rng = random.Random(seed)
+    features = {str(i + 1): f"特征{i + 1}" for i in range(base)}
+    levels = [list(features.values())]
+
+    back_edges = int(rules * cycles)
+    conclusions = max(depth, (rules - back_edges) // max(alternatives, 1))
+    per_level = max(1, conclusions // depth)
+
+    generated = []
+    for level in range(1, depth + 1):
+        names = [f"结论{level}_{k}" for k in range(per_level)]
+        lower = [name for names_below in levels for name in names_below]
+        for name in names:
+            for _ in range(alternatives):
+                premises = {rng.choice(levels[-1])}
+                while len(premises) < min(fan_in, len(lower)):
+                    premises.add(rng.choice(lower))
+                generated.append({"if": sorted(premises), "then": name})
+        levels.append(names)
+
+    # 回边：高层结论 -> 低层结论
+    for _ in range(back_edges if depth > 1 else 0):
+        high = rng.randrange(2, depth + 1)
+        low = rng.randrange(1, high)
+        generated.append({"if": [rng.choice(levels[high])], "then": rng.choice(levels[low])})
+
+    rng.shuffle(generated)
+    return generated, features, list(levels[-1])
@@ -0,0 +1,175 @@
+from prover import GoalProver
+from rete import ReteNetwork
+
+# 基本特征不超过这个数目时编译为完整查找表（2^n 项），否则编译为决策图
+TABLE_LIMIT = 22
+
+
+class LookupTable:
+    """完整查找表：以基本特征的位掩码为下标，直接得到识别结果
+
+    表中每一项是目标动物在 targets 中的下标（-1 为无法识别），
+    同时推出多个动物时取 targets 中靠前的那个。需要 NumPy。
+    """
+
+    def __init__(self, rules, features, targets, chunk_size=1 << 16):
+        import numpy as np
+        from batch import BatchForward
+
+        self.names = list(dict.fromkeys(features.values()))
+        self.bits = {name: 1 << i for i, name in enumerate(self.names)}
+        self.targets = list(targets)
+
+        n = len(self.names)
+        dtype = np.int8 if len(self.targets) < 127 else np.int32
+        self.table = np.empty(1 << n, dtype=dtype)
+
+        batch = BatchForward(rules, dict(enumerate(self.names)), self.targets, chunk_size)
+        shifts = np.arange(n)
+        for start in range(0, 1 << n, chunk_size):
+            masks = np.arange(start, min(start + chunk_size, 1 << n))
+            observations = ((masks[:, None] >> shifts) & 1).astype(bool)
+            self.table[start:start + len(masks)] = batch.forward(observations)["animal"]
+
+    def classify(self, facts):
+        """返回识别出的动物名称，无法识别时为 None；只考虑基本特征"""
+        mask = 0
+        for fact in facts:
+            mask |= self.bits.get(fact, 0)
+        index = self.table[mask]
+        return self.targets[index] if index >= 0 else None
+
+
+class DecisionDiagram:
+    """约简有序决策图（多终端）
+
+    每个目标动物成立当且仅当它的某个最小证明方案（见 GoalProver）全部出现在事实中。
+    按特征的固定顺序逐个做 Shannon 展开（跳过剩余方案中不出现的特征）：
+    特征为真时从各方案中删去它，为假时删去包含它的方案；
+    某个目标的方案变为空集即可确定结果。
+    相同的剩余状态共用同一个节点，两个分支相同的节点被约去。
+    """
+
+    def __init__(self, rules, features, targets, limit=100000):
+        """rules 为 RuleBase
+
+        某个目标的方案超过 limit 个时方案列表不完整，决策图会漏掉结果，抛出 ValueError。
+        """
+        self.names = list(dict.fromkeys(features.values()))
+        self.targets = list(targets)
+        prover = GoalProver(rules, self.names, limit)
+
+        # 叶节点：-1 为无法识别，其他为目标下标
+        self.var = []   # 节点 -> 特征下标（叶节点为 None）
+        self.low = []   # 节点 -> 特征为假时的子节点（叶节点为结果）
+        self.high = []  # 节点 -> 特征为真时的子节点
+        self.unique = {}
+        self.leaves = {}
+
+        position = {name: i for i, name in enumerate(self.names)}
+        state = tuple(
+            (index, frozenset(frozenset(position[f] for f in proof) for proof in prover.proofs(target)))
+            for index, target in enumerate(self.targets)
+        )
+        capped = [target for target in self.targets if target in prover.capped]
+        if capped:
+            raise ValueError(f"目标 '{capped[0]}' 的证明方案超过 {limit} 个，无法编译为决策图")
+        self.memo = {}
+        self.root = self._build(self._prune(state))
+        del self.memo
+
+    def _leaf(self, value):
+        node = self.leaves.get(value)
+        if node is None:
+            node = self.leaves[value] = len(self.var)
+            self.var.append(None)
+            self.low.append(value)
+            self.high.append(None)
+        return node
+
+    def _node(self, var, low, high):
+        if low == high:
+            return low
+        key = (var, low, high)
+        node = self.unique.get(key)
+        if node is None:
+            node = self.unique[key] = len(self.var)
+            self.var.append(var)
+            self.low.append(low)
+            self.high.append(high)
+        return node
+
+    @staticmethod
+    def _prune(state):
+        """去掉已无方案的目标；第一个已经成立的目标之后的目标都无关"""
+        pruned = []
+        for index, proofs in state:
+            if not proofs:
+                continue
+            pruned.append((index, proofs))
+            if frozenset() in proofs:
+                break
+        return tuple(pruned)
+
+    def _build(self, state):
+        if not state:
+            return self._leaf(-1)
+        if frozenset() in state[0][1]:
+            return self._leaf(state[0][0])
+        node = self.memo.get(state)
+        if node is None:
+            var = min(min(proof) for _, proofs in state for proof in proofs if proof)
+            high = self._prune(tuple(
+                (index, frozenset(proof - {var} for proof in proofs)) for index, proofs in state
+            ))
+            low = self._prune(tuple(
+                (index, frozenset(proof for proof in proofs if var not in proof)) for index, proofs in state
+            ))
+            node = self.memo[state] = self._node(var, self._build(low), self._build(high))
+        return node
+
+    def __len__(self):
+        return len(self.var)
+
+    def classify(self, facts):
+        """返回识别出的动物名称，无法识别时为 None；只考虑基本特征"""
+        facts = set(facts)
+        node = self.root
+        while self.var[node] is not None:
+            node = self.high[node] if self.names[self.var[node]] in facts else self.low[node]
+        index = self.low[node]
+        return self.targets[index] if index >= 0 else None
+
+
+class ForwardClassifier:
+    """不预先编译的识别器：每次识别做一次正向推理
+
+    目标的证明方案太多、无法编译为决策图时使用，结果与决策图的约定相同。
+    """
+
+    def __init__(self, rules, features, targets):
+        self.names = set(features.values())
+        self.targets = list(targets)
+        self.network = ReteNetwork(rules)
+
+    def classify(self, facts):
+        """返回识别出的动物名称，无法识别时为 None；只考虑基本特征"""
+        facts, _ = self.network.run(fact for fact in dict.fromkeys(facts) if fact in self.names)
+        facts = set(facts)
+        return next((target for target in self.targets if target in facts), None)
+
+
+def compile_classifier(rules, features, targets, limit=100000):
+    """编译识别器：特征数不多且有 NumPy 时用查找表，否则用决策图
+
+    决策图的证明方案超过 limit 个时退回正向推理（ForwardClassifier）。
+    """
+    if len(set(features.values())) <= TABLE_LIMIT:
+        try:
+            return LookupTable(rules, features, targets)
+        except ImportError:
+            pass
+    try:
+        return DecisionDiagram(rules, features, targets, limit)
+    except ValueError:
+        return ForwardClassifier(rules, features, targets)
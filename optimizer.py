@@ -0,0 +1,450 @@
+"""规则库优化
+
+对规则库做一遍分析，得到与之等价的精简规则集，供匹配网络使用：
+
+    cyclic        结论出现在自己的前提里，或前提只能经由该结论本身推出的规则
+    unreachable   从基本特征出发永远无法满足前提的规则
+    redundant     可以由同一规则的其他前提推出的前提（从规则中去掉）
+    duplicates    去掉冗余前提后与前面某条规则完全相同的规则
+    subsumed      同一结论下，前提是另一条规则前提的真超集的规则
+
+“等价”指对任何基本特征组合推出的事实集合相同；规则编号保持不变，
+推理过程中显示的仍是原来的规则。同名的特征编号（如 4 和 17 都是“不会飞”）
+被合并为 aliases。
+
+规则增删之后不必重新分析整个规则库：update 只检查与改动的规则有关的部分，
+并给出匹配网络需要逐条增删的规则（见 update 的说明）。
+
+规则的触发顺序不在保证之内：去掉前提的规则可能提前触发，去掉的规则不再出现在
+推理过程中，因此 trace、最先推出的目标动物（识别结果）和 stop_at_target 的结果
+可能与原规则库不同。需要与原规则库逐条一致的推理过程时不要使用优化。
+
+    python optimizer.py [--kb animals.kb]
+"""
+import argparse
+import json
+from collections import deque
+
+from compiler import rule_parts
+
+# 求单个事实的蕴涵集合时最多处理的事实数，超出时只用已经推出的部分（仍然可靠）
+IMPLIED_BUDGET = 256
+# 最多逐个检查的环上结论数，超出部分的规则保守地保留
+CYCLE_CHECKS = 32
+
+
+def _with_premises(rule, premises):
+    """换掉前提后的规则副本（兼容 if/then 与 premise/conclusion 两种写法）"""
+    rule = dict(rule)
+    rule["if" if "if" in rule else "premise"] = list(premises)
+    return rule
+
+
+def _closure(facts, parts, index, goals=(), skip=(), budget=None, reasons=None):
+    """从 facts 出发正向推理到不动点，返回推出的全部事实
+
+    parts 为 规则编号 -> (前提, 结论)，index 为 前提 -> 规则编号列表（None 键为没有前提的规则）；
+    goals 全部推出时提前返回，skip 中的规则不参与。
+    budget 为最多处理的事实数，用完时返回已经推出的部分。
+    reasons 为字典时记下每个推出的事实所用的规则编号。
+    返回 事实 -> 推出的先后序号 的字典（初始事实为 0）。
+    """
+    known = dict.fromkeys(facts, 0)
+    goals = set(goals)
+    missing = {}
+    queue = deque(known)
+    for rid in index.get(None, ()):
+        conclusion = parts[rid][1]
+        if conclusion not in known and rid not in skip:
+            known[conclusion] = len(known)
+            queue.append(conclusion)
+            if reasons is not None:
+                reasons[conclusion] = rid
+    left_goals = len(goals - known.keys())
+    while queue:
+        if goals and not left_goals:
+            break
+        if budget is not None:
+            budget -= 1
+            if budget < 0:
+                break
+        fact = queue.popleft()
+        for rid in index.get(fact, ()):
+            if rid in skip:
+                continue
+            premises, conclusion = parts[rid]
+            left = missing.get(rid, len(premises)) - 1
+            missing[rid] = left
+            if left == 0 and conclusion not in known:
+                known[conclusion] = len(known)
+                queue.append(conclusion)
+                if reasons is not None:
+                    reasons[conclusion] = rid
+                if conclusion in goals:
+                    left_goals -= 1
+    return known
+
+
+def _support(fact, reasons, parts):
+    """沿 reasons 回溯，返回推出 fact 用到的全部规则编号"""
+    used = set()
+    stack = [fact]
+    while stack:
+        rid = reasons.get(stack.pop())
+        if rid is not None and rid not in used:
+            used.add(rid)
+            stack.extend(parts[rid][0])
+    return used
+
+
+def _index(parts):
+    index = {}
+    for rid, (premises, _) in parts.items():
+        for name in premises:
+            index.setdefault(name, []).append(rid)
+        if not premises:
+            index.setdefault(None, []).append(rid)
+    return index
+
+
+def _components(parts):
+    """符号依赖图（前提 -> 结论）中含环的强连通分量，Tarjan 算法（非递归）"""
+    graph = {}
+    for premises, conclusion in parts.values():
+        for name in premises:
+            graph.setdefault(name, set()).add(conclusion)
+    number = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    counter = 0
+    for root in graph:
+        if root in number:
+            continue
+        work = [(root, iter(graph.get(root, ())))]
+        number[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            for succ in successors:
+                if succ not in number:
+                    number[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(graph.get(succ, ()))))
+                    break
+                if succ in on_stack:
+                    low[node] = min(low[node], number[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == number[node]:
+                    component = []
+                    while True:
+                        name = stack.pop()
+                        on_stack.discard(name)
+                        component.append(name)
+                        if name == node:
+                            break
+                    if len(component) > 1 or node in graph.get(node, ()):
+                        components.append(component)
+    return components
+
+
+def optimize(rules, features):
+    """分析规则库（RuleBase 或 规则编号 -> 规则 的字典），返回优化结果（字典）
+
+    {"rules": 规则编号 -> 精简后的规则, "cyclic"/"unreachable": [规则编号],
+     "redundant": {规则编号: [去掉的前提]}, "duplicates"/"subsumed": {规则编号: 保留的规则编号},
+     "cycles": [[符号]], "aliases": {特征编号: 同名的第一个特征编号},
+     "before"/"after": {"rules": 规则数, "premises": 前提总数},
+     "reachable": 可由基本特征推出的符号集合, "support": {规则编号: 依靠它去掉了冗余前提的规则编号集合}}
+    后两项供 update 增量更新使用。
+    """
+    base = set(features.values())
+    parts = {}
+    cyclic = []
+    for rid, rule in rules.items():
+        premises, conclusion = rule_parts(rule)
+        premises = tuple(dict.fromkeys(premises))
+        if conclusion in premises:
+            cyclic.append(rid)
+        else:
+            parts[rid] = (premises, conclusion)
+    before = {"rules": len(rules), "premises": sum(len(set(rule_parts(r)[0])) for _, r in rules.items())}
+
+    # 从全部基本特征出发仍不能触发的规则，对任何观测都不会触发
+    index = _index(parts)
+    reachable = _closure(base, parts, index)
+    unreachable = [rid for rid, (premises, _) in parts.items() if not all(p in reachable for p in premises)]
+    for rid in unreachable:
+        del parts[rid]
+    index = _index(parts)
+
+    # 冗余前提：由同一规则的另一个前提单独就能推出（推理是单调的，去掉后结论不变）。
+    # 蕴涵关系按去掉前提之前的规则求：边去边用精简后的规则会让规则凭被去掉的前提触发，
+    # 推出原规则库推不出的“蕴涵”，进而错误地去掉必需的前提
+    # support 记下每个蕴涵关系用到的规则，删除其中任何一条时 update 恢复相应的前提
+    original = dict(parts)
+    implied = {}
+    redundant = {}
+    support = {}
+    for rid, (premises, conclusion) in list(parts.items()):
+        if len(premises) < 2:
+            continue
+        kept = list(premises)
+        for name in premises:
+            for other in kept:
+                if other == name:
+                    continue
+                if other not in implied:
+                    reasons = {}
+                    implied[other] = _closure((other,), original, index, budget=IMPLIED_BUDGET,
+                                              reasons=reasons), reasons
+                known, reasons = implied[other]
+                if name in known:
+                    kept.remove(name)
+                    redundant.setdefault(rid, []).append(name)
+                    for used in _support(name, reasons, original):
+                        support.setdefault(used, set()).add(rid)
+                    break
+        if rid in redundant:
+            parts[rid] = (tuple(kept), conclusion)
+    if redundant:
+        index = _index(parts)
+
+    # 同一结论下的重复规则和被包含的规则
+    duplicates = {}
+    subsumed = {}
+    groups = {}
+    for rid, (premises, conclusion) in parts.items():
+        groups.setdefault(conclusion, []).append(rid)
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        kept = []
+        for rid in sorted(group, key=lambda r: (len(parts[r][0]), r)):
+            premises = set(parts[rid][0])
+            for other in kept:
+                other_premises = set(parts[other][0])
+                if other_premises <= premises:
+                    (duplicates if other_premises == premises else subsumed)[rid] = other
+                    break
+            else:
+                kept.append(rid)
+    for rid in list(duplicates) + list(subsumed):
+        del parts[rid]
+    index = _index(parts)
+
+    # 环上的规则：不经过其结论本身就无法满足前提的，永远不会先于结论成立。
+    # 从全部基本特征出发时前提都比结论先推出的规则显然有用，其余的逐个结论检查
+    cycles = _components(parts)
+    in_cycle = {name for component in cycles for name in component}
+    checks = {}  # 结论 -> 需要检查的规则
+    for rid, (premises, conclusion) in parts.items():
+        if conclusion in in_cycle and any(p in in_cycle for p in premises):
+            if max(reachable[p] for p in premises) >= reachable[conclusion]:
+                checks.setdefault(conclusion, []).append(rid)
+    by_conclusion = {}
+    for rid, (_, conclusion) in parts.items():
+        by_conclusion.setdefault(conclusion, set()).add(rid)
+    for conclusion, rids in list(checks.items())[:CYCLE_CHECKS]:
+        goals = {p for rid in rids for p in parts[rid][0]}
+        known = _closure(base - {conclusion}, parts, index, goals, by_conclusion[conclusion])
+        for rid in rids:
+            if not all(p in known for p in parts[rid][0]):
+                cyclic.append(rid)
+    # 这些规则对任何基本特征组合都不会触发，检查完再去掉不影响对其他结论的判断
+    for rid in cyclic:
+        parts.pop(rid, None)
+
+    first = {}
+    aliases = {}
+    for key, name in features.items():
+        if name in first:
+            aliases[key] = first[name]
+        else:
+            first[name] = key
+
+    result_rules = {}
+    for rid, rule in rules.items():
+        if rid in parts:
+            result_rules[rid] = _with_premises(rule, parts[rid][0]) if rid in redundant else rule
+    return {
+        "rules": result_rules,
+        "cyclic": cyclic,
+        "unreachable": unreachable,
+        "redundant": redundant,
+        "duplicates": duplicates,
+        "subsumed": subsumed,
+        "cycles": cycles,
+        "aliases": aliases,
+        "before": before,
+        "after": {"rules": len(parts), "premises": sum(len(premises) for premises, _ in parts.values())},
+        "reachable": set(reachable),
+        "support": support,
+    }
+
+
+def update(report, rules, removed=(), added=()):
+    """规则库增删之后原地更新优化结果 report，不重新分析整个规则库
+
+    rules 为修改后的规则库，removed / added 为删除和加入的 [(规则编号, 规则)]。
+    只检查与改动的规则有关的部分：
+        删除的规则是别的规则被判为重复、被包含的依据，或参与推出了某个被去掉的冗余前提时，
+        那些规则恢复原样；
+        加入的规则与保留的规则重复或被其包含时不进入匹配网络，前提不可达时记为 unreachable；
+        它使新的符号变为可达时，沿前提索引恢复因此可以触发的 unreachable 规则；
+        有规则进入匹配网络时恢复经过检查去掉的循环规则（新规则可能绕开了环）。
+    新加入的规则不检查冗余前提，结果可能不如重新运行 optimize 精简，但推出的事实集合
+    仍与规则库相同。返回匹配网络需要的变化 (去掉的 [(规则编号, 规则)], 加入的 [(规则编号, 规则)])。
+    """
+    matching = report["rules"]
+    duplicates, subsumed, redundant = report["duplicates"], report["subsumed"], report["redundant"]
+    reachable, support = report["reachable"], report["support"]
+    covers = {}  # 保留的规则 -> 因它而去掉的重复、被包含的规则
+    for table in (duplicates, subsumed):
+        for rid, kept in table.items():
+            covers.setdefault(kept, []).append(rid)
+    previous = {}  # 改动过的规则编号 -> 原来在匹配网络中的规则（不在时为 None）
+    dropped = set()  # 从 unreachable / cyclic 中去掉的规则编号
+
+    def place(rid, rule):
+        if rid not in previous:
+            previous[rid] = matching.get(rid)
+        if rule is None:
+            matching.pop(rid, None)
+        else:
+            matching[rid] = rule
+
+    def release(rid):
+        # rid 不再以原来的前提留在匹配网络中，因它而去掉的规则恢复原样
+        for other in covers.pop(rid, ()):
+            if duplicates.pop(other, None) is not None or subsumed.pop(other, None) is not None:
+                restore(other)
+
+    def restore(rid):
+        place(rid, rules[rid])
+        dropped.add(rid)
+        if redundant.pop(rid, None) is not None:
+            release(rid)
+
+    for rid, rule in removed:
+        premises = set(rule_parts(rule)[0])
+        report["before"]["rules"] -= 1
+        report["before"]["premises"] -= len(premises)
+        dropped.add(rid)
+        duplicates.pop(rid, None)
+        subsumed.pop(rid, None)
+        redundant.pop(rid, None)
+        if rid in matching:
+            place(rid, None)
+            release(rid)
+        for other in support.pop(rid, ()):
+            if other not in redundant or other not in rules:
+                continue
+            if other in matching:
+                restore(other)
+            else:
+                # 已经作为重复、被包含或循环的规则去掉，换回原来的前提后仍然如此
+                del redundant[other]
+
+    grew = False
+    added = list(added)
+    for rid, rule in added:
+        report["before"]["rules"] += 1
+        report["before"]["premises"] += len(set(rule_parts(rule)[0]))
+    for rid, rule in added:
+        premises, conclusion = rule_parts(rule)
+        premises = set(premises)
+        if rid in matching:
+            continue  # 已经随前面的规则恢复
+        if conclusion in premises:
+            report["cyclic"].append(rid)
+            continue
+        if not premises <= reachable:
+            report["unreachable"].append(rid)
+            continue
+        kept = next((other for other in rules.by_conclusion.get(conclusion, ())
+                     if other in matching and set(rule_parts(matching[other])[0]) <= premises), None)
+        if kept is not None:
+            same = set(rule_parts(matching[kept])[0]) == premises
+            (duplicates if same else subsumed)[rid] = kept
+            covers.setdefault(kept, []).append(rid)
+            continue
+        place(rid, rule)
+        grew = True
+        # 结论新变为可达：恢复前提因此全部可达的规则，直到没有新的可达符号
+        queue = [conclusion] if conclusion not in reachable else []
+        reachable.update(queue)
+        while queue:
+            name = queue.pop()
+            for other in rules.by_premise.get(name, ()):
+                if other in matching or other in duplicates or other in subsumed:
+                    continue
+                other_premises, other_conclusion = rule_parts(rules[other])
+                if other_conclusion in other_premises or not set(other_premises) <= reachable:
+                    continue
+                restore(other)
+                if other_conclusion not in reachable:
+                    reachable.add(other_conclusion)
+                    queue.append(other_conclusion)
+    if grew:
+        for rid in report["cyclic"]:
+            premises, conclusion = rule_parts(rules[rid])
+            if rid not in dropped and conclusion not in premises:
+                restore(rid)
+
+    if dropped:
+        report["unreachable"] = [rid for rid in report["unreachable"] if rid not in dropped]
+        report["cyclic"] = [rid for rid in report["cyclic"] if rid not in dropped]
+    after = report["after"]
+    net_removed, net_added = [], []
+    for rid, old in sorted(previous.items()):
+        new = matching.get(rid)
+        if new is old:
+            continue
+        if old is not None:
+            net_removed.append((rid, old))
+            after["rules"] -= 1
+            after["premises"] -= len(set(rule_parts(old)[0]))
+        if new is not None:
+            net_added.append((rid, new))
+            after["rules"] += 1
+            after["premises"] += len(set(rule_parts(new)[0]))
+    return net_removed, net_added
+
+
+def summary(report):
+    """优化结果的一行说明"""
+    before, after = report["before"], report["after"]
+    removed = before["rules"] - after["rules"]
+    saved = before["premises"] - after["premises"]
+    share = saved / before["premises"] if before["premises"] else 0.0
+    return (f"规则优化：去掉 {removed} 条规则（重复 {len(report['duplicates'])}，"
+            f"被包含 {len(report['subsumed'])}，无法触发 {len(report['unreachable'])}，"
+            f"循环 {len(report['cyclic'])}），冗余前提 {sum(map(len, report['redundant'].values()))} 个；"
+            f"匹配的前提数 {before['premises']} → {after['premises']}（减少 {share:.0%}）")
+
+
+def main(argv=None):
+    from engine import InferenceEngine
+
+    parser = argparse.ArgumentParser(description="分析规则库中的重复、被包含、无法触发和循环的规则")
+    parser.add_argument("--kb", help="知识库文件（.kb 或 .kbc），省略时使用内置的规则")
+    args = parser.parse_args(argv)
+    engine = InferenceEngine.load(args.kb, optimize=False) if args.kb else InferenceEngine(optimize=False)
+    report = optimize(engine.rules, engine.features)
+    print(summary(report))
+    report = {key: value for key, value in report.items() if key not in ("rules", "reachable", "support")}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""多进程批量推理
+
+编译好的规则库（各个矩阵和符号表）只发布一次到 multiprocessing.shared_memory，
+工作进程直接在共享内存上建立 NumPy 视图，不需要各自复制规则库。
+观测文件按行分片交给进程池，结果按输入顺序写出：
+
+    python parallel.py observations.jsonl -o results.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from batch import BatchForward
+from engine import InferenceEngine
+
+ALIGN = 64
+
+
+class SharedKnowledgeBase:
+    """放在共享内存中的编译结果
+
+    所有数组和符号名称（UTF-8 编码后拼接）按 64 字节对齐放进同一块共享内存，
+    layout 记录每个数组的位置、类型和形状，体积很小，可以直接传给工作进程。
+    """
+
+    def __init__(self, batch, symbol_names):
+        blob = "\0".join(symbol_names).encode("utf-8")
+        arrays = dict(batch.arrays())
+        arrays["symbol_blob"] = np.frombuffer(blob, dtype=np.uint8)
+
+        self.layout = {}
+        size = 0
+        for name, array in arrays.items():
+            size = -(-size // ALIGN) * ALIGN
+            self.layout[name] = (size, array.dtype.str, array.shape)
+            size += array.nbytes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, array in arrays.items():
+            offset, dtype, shape = self.layout[name]
+            view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            view[...] = array
+        self.name = self.shm.name
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    @staticmethod
+    def attach(name, layout):
+        """在工作进程中连接共享内存，返回 (共享内存对象, 各数组的视图)"""
+        shm = shared_memory.SharedMemory(name=name)
+        views = {
+            key: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for key, (offset, dtype, shape) in layout.items()
+        }
+        return shm, views
+
+
+# 工作进程中的全局状态，由 _init_worker 设置
+_worker = {}
+
+
+def _init_worker(name, layout, features, targets):
+    shm, views = SharedKnowledgeBase.attach(name, layout)
+    symbol_names = bytes(views.pop("symbol_blob")).decode("utf-8").split("\0")
+    _worker["shm"] = shm  # 保持引用，否则视图失效
+    _worker["features"] = features
+    _worker["column"] = {name: j for j, name in enumerate(features.values())}
+    _worker["batch"] = BatchForward.from_arrays(views, features.values(), targets, symbol_names)
+
+
+def _run_shard(lines):
+    """推理一个分片（若干行 JSON），返回输出行"""
+    batch = _worker["batch"]
+    features = _worker["features"]
+    column = _worker["column"]
+
+    observations = np.zeros((len(lines), len(features)), dtype=bool)
+    records = []
+    errors = {}
+    for row, line in enumerate(lines):
+        record = None
+        try:
+            record = json.loads(line)
+            facts = record.get("features", []) if isinstance(record, dict) else record
+            for fact in facts:
+                j = column.get(features.get(fact, fact))
+                if j is not None:
+                    observations[row, j] = True
+        except (ValueError, TypeError, AttributeError) as exc:
+            errors[row] = str(exc)
+        records.append(record)
+
+    result = batch.forward(observations)
+    conclusions = result["conclusions"]
+    output = []
+    for row, record in enumerate(records):
+        if row in errors:
+            item = {"error": errors[row]}
+        else:
+            index = result["animal"][row]
+            item = {
+                "derived": [conclusions[k] for k in np.flatnonzero(result["derived"][row])],
+                "animal": batch.targets[index] if index >= 0 else None,
+            }
+        if isinstance(record, dict) and "id" in record:
+            item = {"id": record["id"], **item}
+        output.append(json.dumps(item, ensure_ascii=False))
+    return output
+
+
+def _shards(lines, shard_size):
+    shard = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            shard.append(line)
+            if len(shard) >= shard_size:
+                yield shard
+                shard = []
+    if shard:
+        yield shard
+
+
+def run_parallel(engine, lines, workers=None, shard_size=10000):
+    """多进程批量正向推理，按输入顺序逐行产生 JSON 结果
+
+    同时在途的分片数限制为进程数的两倍，输入文件很大时内存占用也有界。
+    """
+    workers = workers or os.cpu_count() or 1
+    batch = BatchForward(list(engine.rules), engine.features, engine.animal_targets)
+    shared = SharedKnowledgeBase(batch, batch.compiled.symbols.names)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(shared.name, shared.layout, engine.features, engine.animal_targets),
+        ) as pool:
+            pending = deque()
+            for shard in _shards(lines, shard_size):
+                pending.append(pool.submit(_run_shard, shard))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+    finally:
+        shared.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多进程批量正向推理：JSONL 观测 → JSONL 结果")
+    parser.add_argument("input", nargs="?", help="观测文件，省略时读标准输入")
+    parser.add_argument("-o", "--output", help="结果文件，省略时写标准输出")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认等于 CPU 核数")
+    parser.add_argument("--shard-size", type=int, default=10000, help="每个分片的行数")
+    parser.add_argument("--kb", help="知识库文件（.kb 或 .kbc），省略时使用内置的规则")
+    args = parser.parse_args(argv)
+
+    engine = InferenceEngine.load(args.kb) if args.kb else InferenceEngine()
+
+    source = open(args.input, encoding="utf-8") if args.input else sys.stdin
+    target = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for line in run_parallel(engine, source, args.workers, args.shard_size):
+            target.write(line + "\n")
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            target.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""推理性能统计
+
+Profiler 按规则记录：
+    checks    前提检查次数（每有一个前提事实成立，该规则的计数器被检查一次）
+    failures  部分匹配但最终没有触发的推理次数
+    failed_on 上述情况下，按规则书写顺序第一个不成立的前提及其次数
+    fired     触发次数
+    time      从该规则触发到下一条规则触发（或推理结束）的累计时间，即传播其结论所花的时间
+以及正向推理到达不动点的轮数（order 策略为有规则触发的扫描轮数，其他策略为“识别-行动”循环数）、
+反向推理的目标栈深度和展开的规则数。
+
+正向推理仍由 ReteNetwork.forward 完成，计时借用它的 observer 钩子；检查次数、
+部分匹配等在推理结束后按触发序列重算。只在 InferenceEngine.enable_profiling 之后使用，
+关闭时推理循环里没有任何统计代码。
+"""
+import csv
+import json
+import time
+from collections import Counter, defaultdict
+
+from compiler import rule_parts
+from prover import GoalProver
+
+CSV_FIELDS = ["rid", "rule", "checks", "failures", "failed_on", "fired", "time_ms"]
+
+
+class Profiler:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.checks = Counter()
+        self.failures = Counter()
+        self.failed_on = defaultdict(Counter)
+        self.fired = Counter()
+        self.time = defaultdict(float)
+        self.runs = 0
+        self.iterations = 0
+        self.max_iterations = 0
+        self.forward_time = 0.0
+        self.backward_runs = 0
+        self.goals = 0
+        self.max_depth = 0
+        self.backward_rules = 0
+        self.backward_time = 0.0
+
+    def forward(self, network, rules, fact_ids, strategy="order", stop=None, observer=None):
+        """带统计的 ReteNetwork.forward，返回值与之相同
+
+        rules 为 RuleBase，用来找出第一个不成立的前提。
+        """
+        clock = time.perf_counter
+        spent = self.time
+        last = [None, 0.0]  # 上一条触发的规则及其触发时刻
+
+        def timed(rid):
+            now = clock()
+            if last[0] is not None:
+                spent[last[0]] += now - last[1]
+            if observer is not None:
+                observer(rid)
+            last[0] = rid
+            last[1] = clock()
+
+        fact_ids = list(dict.fromkeys(fact_ids))
+        begin = clock()
+        fired = network.forward(fact_ids, strategy, stop, timed)
+        end = clock()
+        if last[0] is not None:
+            spent[last[0]] += end - last[1]
+
+        # 按触发序列重放激活过程：初始事实和每条规则的结论依次访问以它为前提的规则
+        conclusions = network.conclusions
+        premise_count = network.premise_count
+        alpha = network.alpha
+        activated = fact_ids + [conclusions[rid] for rid in fired]
+        known = set(activated)
+        if stop and fired and conclusions[fired[-1]] in stop:
+            activated.pop()  # 推出停止目标后不再传播
+        touched = Counter()
+        for sid in activated:
+            for rid in alpha[sid]:
+                touched[rid] += 1
+        self.checks.update(touched)
+        for rid in network.unconditional:
+            self.checks[rid] += 1
+        self.fired.update(fired)
+
+        table = network.symbols.ids
+        for rid, count in touched.items():
+            if count < premise_count[rid]:
+                self.failures[rid] += 1
+                premises = rule_parts(rules[rid])[0]
+                first = next(p for p in premises if table[p] not in known)
+                self.failed_on[rid][first] += 1
+
+        if strategy == "order":
+            # 同一轮内规则编号递增，编号回落说明进入了下一轮
+            iterations = sum(1 for before, after in zip(fired, fired[1:]) if after < before) + bool(fired)
+        else:
+            iterations = len(fired)
+        self.runs += 1
+        self.iterations += iterations
+        self.max_iterations = max(self.max_iterations, iterations)
+        self.forward_time += end - begin
+        return fired
+
+    def run(self, network, rules, facts, strategy="order", stop=(), observer=None):
+        """带统计的 ReteNetwork.run"""
+        facts = list(facts)
+        fired = self.forward(network, rules, network.ids(facts), strategy, set(network.ids(stop)), observer)
+        names = network.symbols.names
+        return facts + [names[network.conclusions[rid]] for rid in fired], fired
+
+    def stats(self):
+        """返回统计结果（字典），rules 按规则编号排列"""
+        rids = sorted(set(self.checks) | set(self.fired))
+        return {
+            "forward": {
+                "runs": self.runs,
+                "iterations": self.iterations,
+                "max_iterations": self.max_iterations,
+                "time_ms": self.forward_time * 1000,
+            },
+            "backward": {
+                "runs": self.backward_runs,
+                "goals": self.goals,
+                "rules_examined": self.backward_rules,
+                "max_depth": self.max_depth,
+                "time_ms": self.backward_time * 1000,
+            },
+            "rules": [
+                {
+                    "rid": rid,
+                    "checks": self.checks[rid],
+                    "failures": self.failures[rid],
+                    "failed_on": dict(self.failed_on[rid].most_common()) if rid in self.failed_on else {},
+                    "fired": self.fired[rid],
+                    "time_ms": self.time[rid] * 1000 if rid in self.time else 0.0,
+                }
+                for rid in rids
+            ],
+        }
+
+
+class ProfiledProver(GoalProver):
+    """记录目标栈深度和展开目标数的 GoalProver"""
+
+    def __init__(self, rules, base_features, limit=20, profiler=None):
+        super().__init__(rules, base_features, limit)
+        self.profiler = profiler
+
+    def proofs(self, goal, observer=None):
+        start = time.perf_counter()
+        examined = self.examined
+        try:
+            return super().proofs(goal, observer)
+        finally:
+            self.profiler.backward_runs += 1
+            self.profiler.backward_rules += self.examined - examined
+            self.profiler.backward_time += time.perf_counter() - start
+
+    def _solve(self, goal):
+        profiler = self.profiler
+        profiler.goals += 1
+        if len(self.stack) + 1 > profiler.max_depth:
+            profiler.max_depth = len(self.stack) + 1
+        return super()._solve(goal)
+
+
+def export_json(stats, fp):
+    json.dump(stats, fp, ensure_ascii=False, indent=2)
+
+
+def export_csv(stats, fp):
+    """每条规则一行；failed_on 写成“前提:次数”并以分号分隔"""
+    writer = csv.DictWriter(fp, CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for row in stats["rules"]:
+        row = dict(row)
+        row["failed_on"] = ";".join(f"{name}:{count}" for name, count in row["failed_on"].items())
+        row["time_ms"] = f"{row['time_ms']:.4f}"
+        writer.writerow(row)
+
+
+def save_stats(stats, path):
+    """按扩展名保存为 CSV（.csv）或 JSON（其他）"""
+    with open(path, "w", encoding="utf-8", newline="") as fp:
+        if path.lower().endswith(".csv"):
+            export_csv(stats, fp)
+        else:
+            export_json(stats, fp)
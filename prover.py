@@ -0,0 +1,122 @@
+from collections import deque
+
+from compiler import rule_parts
+
+
+def minimize(proofs, limit):
+    """去掉包含其他方案的超集，按（大小, 内容）排序后最多保留 limit 个"""
+    result = []
+    for proof in sorted(set(proofs), key=lambda p: (len(p), sorted(p))):
+        if not any(kept <= proof for kept in result):
+            result.append(proof)
+            if len(result) >= limit:
+                break
+    return result
+
+
+def truncated(proofs, result, limit):
+    """minimize 是否因为 limit 舍去了不包含任何已保留方案的方案"""
+    return len(result) >= limit and any(not any(kept <= proof for kept in result) for proof in proofs)
+
+
+class GoalProver:
+    """与或树反向推理
+
+    目标的证明方案是若干基本特征的集合：同一结论的多条规则之间是“或”，
+    一条规则的各个前提之间是“与”。每个子目标的结果都会记入备忘录，
+    对不同目标的查询共用同一份备忘录；规则库变化后需要调用 reset。
+    规则通过 RuleBase 的结论索引查找。
+    方案数超过 limit 时只保留最小的 limit 个，这样的目标（以及用到它的目标）
+    记入 capped，其方案列表可能不完整。
+    """
+
+    def __init__(self, rules, base_features, limit=20):
+        self.rules = rules
+        self.base_features = set(base_features)
+        self.limit = limit
+        self.memo = {}
+        self.capped = set()  # 方案因 limit 而可能不完整的目标
+        self.examined = 0  # 累计展开过的规则数
+        self.stack = {}  # 正在求解的目标 -> 栈深度，用于截断循环
+        self.observer = None
+
+    def reset(self):
+        self.memo.clear()
+        self.capped.clear()
+
+    def proofs(self, goal, observer=None):
+        """返回证明 goal 的最小基本特征集合列表（frozenset），无法证明时为空列表
+
+        observer 在展开每个子目标前以该目标调用，可以抛出异常中止求解；
+        中止时备忘录里只留下已经完整求出的子目标。
+        """
+        self.observer = observer
+        try:
+            return self._solve(goal)[0]
+        finally:
+            self.observer = None
+            self.stack.clear()
+
+    def _solve(self, goal):
+        """返回 (方案列表, 遇到的最浅循环深度)；结果不依赖栈上的祖先目标时才记入备忘录"""
+        cached = self.memo.get(goal)
+        if cached is not None:
+            return cached, len(self.stack)
+        depth = self.stack.get(goal)
+        if depth is not None:
+            return [], depth
+
+        if self.observer is not None:
+            self.observer(goal)
+        depth = len(self.stack)
+        self.stack[goal] = depth
+        low = depth + 1
+        capped = False
+        alternatives = []
+        if goal in self.base_features:
+            alternatives.append(frozenset([goal]))
+
+        for rule in self.rules.concluding(goal):
+            self.examined += 1
+            partial = [frozenset()]
+            for cond in dict.fromkeys(rule_parts(rule)[0]):
+                sub, sub_low = self._solve(cond)
+                low = min(low, sub_low)
+                combined = [p | q for p in partial for q in sub]
+                partial = minimize(combined, self.limit)
+                capped = capped or cond in self.capped or truncated(combined, partial, self.limit)
+                if not partial:
+                    break
+            alternatives.extend(partial)
+
+        del self.stack[goal]
+        result = minimize(alternatives, self.limit)
+        if capped or truncated(alternatives, result, self.limit):
+            self.capped.add(goal)
+        if low >= depth:
+            self.memo[goal] = result
+        return result, low
+
+    def explain(self, target):
+        """按广度优先列出与目标相关的全部规则，以及没有规则可以推出的子目标
+
+        返回步骤列表，每个步骤是 {"rule": 规则} 或 {"missing": 子目标}
+        """
+        steps = []
+        seen = {target}
+        queue = deque([target])
+        while queue:
+            current = queue.popleft()
+            if current in self.base_features:
+                continue
+            rules = self.rules.concluding(current)
+            if not rules:
+                steps.append({"missing": current})
+                continue
+            for rule in rules:
+                steps.append({"rule": rule})
+                for cond in rule_parts(rule)[0]:
+                    if cond not in seen:
+                        seen.add(cond)
+                        queue.append(cond)
+        return steps
@@ -0,0 +1,88 @@
+"""观测不完整时的候选动物排序
+
+每个目标动物的最小证明方案（基本特征集合，见 GoalProver）预先求出，
+并建立倒排索引：基本特征 -> 包含它的方案编号。排序时只沿观测到的特征
+（以及已知不具备的特征）的倒排表累计命中数，没有任何特征命中的目标不会被访问，
+所以耗时取决于观测涉及的方案数，而不是目标总数。最后用有界堆取前 k 个：
+
+    缺少的基本特征数（最接近成立的方案）少者在前，
+    其次是仍然可能成立的方案多者在前，再其次是已经命中的特征多者在前。
+
+方案数超过 limit 的目标只列出最小的 limit 个方案（capped），它的方案数只是下限，
+列出的方案全被排除也不说明它不可能成立。
+"""
+import heapq
+from collections import Counter
+
+from prover import GoalProver
+
+
+class CandidateRanker:
+    def __init__(self, rules, features, targets, limit=20):
+        """rules 为 RuleBase；limit 为每个目标最多考虑的方案数"""
+        self.targets = list(targets)
+        prover = GoalProver(rules, features.values(), limit)
+
+        self.proof_target = []  # 方案编号 -> 目标下标
+        self.proof_features = []  # 方案编号 -> 基本特征（有序元组）
+        self.proof_count = []  # 目标下标 -> 方案数
+        self.capped = []  # 目标下标 -> 方案是否因 limit 而不完整
+        self.postings = {}  # 基本特征 -> 方案编号列表
+        for index, target in enumerate(self.targets):
+            proofs = prover.proofs(target)
+            self.proof_count.append(len(proofs))
+            self.capped.append(target in prover.capped)
+            for proof in proofs:
+                pid = len(self.proof_target)
+                self.proof_target.append(index)
+                self.proof_features.append(tuple(sorted(proof)))
+                for name in proof:
+                    self.postings.setdefault(name, []).append(pid)
+
+    def rank(self, facts, k=5, absent=()):
+        """返回最接近成立的至多 k 个目标，顺序见模块说明
+
+        facts 为观测到的事实，absent 为已知不具备的特征（包含它们的方案被排除）；
+        不是基本特征的名称被忽略。每一项为
+        {"target": 目标, "missing": 最接近的方案还缺的基本特征, "matched": 该方案已命中的特征数,
+         "proofs": 仍然可能成立的方案数, "capped": 方案数是否只是下限（见模块说明）,
+         "proven": 是否已经成立}
+        """
+        postings = self.postings
+        hits = Counter()
+        for name in set(facts):
+            hits.update(postings.get(name, ()))
+        excluded = set()
+        for name in set(absent):
+            excluded.update(postings.get(name, ()))
+
+        proof_target = self.proof_target
+        proof_features = self.proof_features
+        eliminated = Counter(proof_target[pid] for pid in excluded)
+        best = {}  # 目标下标 -> (缺少数, 命中数, 方案编号)
+        for pid, matched in hits.items():
+            if pid in excluded:
+                continue
+            index = proof_target[pid]
+            missing = len(proof_features[pid]) - matched
+            current = best.get(index)
+            if current is None or (missing, -matched) < (current[0], -current[1]):
+                best[index] = (missing, matched, pid)
+
+        proof_count = self.proof_count
+        top = heapq.nsmallest(
+            k, best.items(),
+            key=lambda item: (item[1][0], eliminated[item[0]] - proof_count[item[0]], -item[1][1], item[0]),
+        )
+        known = set(facts)
+        return [
+            {
+                "target": self.targets[index],
+                "missing": [name for name in proof_features[pid] if name not in known],
+                "matched": matched,
+                "proofs": proof_count[index] - eliminated[index],
+                "capped": self.capped[index],
+                "proven": missing == 0,
+            }
+            for index, (missing, matched, pid) in top
+        ]
@@ -0,0 +1,194 @@
+import heapq
+import itertools
+
+from compiler import SymbolTable, rule_parts
+
+# 冲突消解策略：
+#   order       按规则顺序逐轮扫描（与原来的循环一致）
+#   salience    规则的 "salience" 值大者优先（默认 0）
+#   specificity 前提多的规则优先
+#   recency     最近被激活的规则优先
+# 同等优先级时按规则编号
+STRATEGIES = ("order", "salience", "specificity", "recency")
+# 结果与初始事实的先后顺序有关的策略（初始事实按输入顺序激活）
+ORDERED_STRATEGIES = ("recency",)
+
+
+class Cancelled(Exception):
+    """推理被观察者（observer）取消"""
+
+
+class ReteNetwork:
+    """由规则库编译得到的匹配网络（TREAT 风格）
+
+    每个事实对应一个 alpha 存储，记录以它为前提的规则；每条规则维护一个
+    “尚未满足的前提数”计数器。新事实加入时只访问提到它的规则，
+    计数器归零的规则进入议程。议程按规则编号排序，并按照原来
+    “逐轮扫描规则库”的方式划分轮次，因此触发顺序与原有循环完全一致。
+    事实使用符号表中的整数编号；规则可以逐条添加和删除，无需重新编译。
+    也可以选用其他冲突消解策略，见 STRATEGIES。
+    """
+
+    editable = True  # 能否用 add/remove 逐条修改
+
+    def __init__(self, rules=()):
+        self.symbols = SymbolTable()
+        self.alpha = []          # 符号编号 -> {以该符号为前提的规则编号: None}
+        self.premise_count = {}  # 规则编号 -> 去重后的前提数
+        self.conclusions = {}    # 规则编号 -> 结论编号
+        self.unconditional = {}  # 没有前提的规则编号
+        self.salience = {}       # 规则编号 -> 优先级（只记录非 0 的）
+        self.examined = 0        # 最近一次推理访问过的规则数
+        items = rules.items() if hasattr(rules, "items") else enumerate(rules)
+        for rid, rule in items:
+            self.add(rid, rule)
+
+    def _intern(self, name):
+        sid = self.symbols.intern(name)
+        if sid == len(self.alpha):
+            self.alpha.append({})
+        return sid
+
+    def add(self, rid, rule):
+        """加入一条规则，编号须大于已有规则的编号才能保持原有触发顺序"""
+        premises, conclusion = rule_parts(rule)
+        ids = dict.fromkeys(self._intern(p) for p in premises)
+        for sid in ids:
+            self.alpha[sid][rid] = None
+        self.premise_count[rid] = len(ids)
+        self.conclusions[rid] = self._intern(conclusion)
+        if not ids:
+            self.unconditional[rid] = None
+        if rule.get("salience"):
+            self.salience[rid] = rule["salience"]
+
+    def remove(self, rid, rule):
+        """删除一条规则"""
+        premises, _ = rule_parts(rule)
+        for name in dict.fromkeys(premises):
+            del self.alpha[self.symbols.ids[name]][rid]
+        del self.premise_count[rid]
+        del self.conclusions[rid]
+        self.unconditional.pop(rid, None)
+        self.salience.pop(rid, None)
+
+    def ids(self, names):
+        """事实名称 -> 符号编号，规则库中没有出现的名称不参与推理，直接忽略"""
+        table = self.symbols.ids
+        return [table[name] for name in names if name in table]
+
+    def forward(self, fact_ids, strategy="order", stop=None, observer=None):
+        """对初始事实编号做正向推理，返回依次触发的规则编号
+
+        只有被事实访问到的规则才会建立计数器，代价与相关规则数成正比。
+        stop 为符号编号集合，推出其中任何一个后立即停止。
+        observer 在每条规则触发后以规则编号调用，可以抛出 Cancelled 中止推理。
+        """
+        if strategy != "order":
+            return self._forward_agenda(fact_ids, strategy, stop, observer)
+
+        conclusions = self.conclusions
+        premise_count = self.premise_count
+        known = set(fact_ids)
+        missing = {}
+        fired = []
+
+        # 本轮与下一轮的议程（小顶堆，按规则编号）
+        current = [rid for rid in self.unconditional if conclusions[rid] not in known]
+        following = []
+        heapq.heapify(current)
+
+        def activate(sid, cursor):
+            for j in self.alpha[sid]:
+                left = missing.get(j, premise_count[j]) - 1
+                missing[j] = left
+                if left == 0 and conclusions[j] not in known:
+                    heapq.heappush(current if j > cursor else following, j)
+
+        for sid in dict.fromkeys(fact_ids):
+            activate(sid, -1)
+
+        while current:
+            while current:
+                rid = heapq.heappop(current)
+                conclusion = conclusions[rid]
+                if conclusion in known:
+                    continue
+                known.add(conclusion)
+                fired.append(rid)
+                if observer is not None:
+                    observer(rid)
+                if stop and conclusion in stop:
+                    self.examined = len(missing) + len(self.unconditional)
+                    return fired
+                activate(conclusion, rid)
+            current, following = following, []
+
+        self.examined = len(missing) + len(self.unconditional)
+        return fired
+
+    def priority(self, strategy):
+        """返回该策略下规则的优先级函数（值越小越先触发）
+
+        order 策略按轮次扫描，不使用优先级，这里返回同一个值（只按规则编号排序）。
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的冲突消解策略: {strategy}")
+        if strategy == "salience":
+            return lambda rid: -self.salience.get(rid, 0)
+        if strategy == "specificity":
+            return lambda rid: -self.premise_count[rid]
+        if strategy == "order":
+            return lambda rid: 0
+        clock = itertools.count()
+        return lambda rid: -next(clock)
+
+    def _forward_agenda(self, fact_ids, strategy, stop, observer=None):
+        """按优先级议程推理：每次从全部已激活的规则中取优先级最高的一条触发"""
+        conclusions = self.conclusions
+        premise_count = self.premise_count
+        priority = self.priority(strategy)
+
+        known = set(fact_ids)
+        missing = {}
+        fired = []
+        agenda = []
+
+        def activate(sid):
+            for j in self.alpha[sid]:
+                left = missing.get(j, premise_count[j]) - 1
+                missing[j] = left
+                if left == 0 and conclusions[j] not in known:
+                    heapq.heappush(agenda, (priority(j), j))
+
+        for rid in self.unconditional:
+            if conclusions[rid] not in known:
+                heapq.heappush(agenda, (priority(rid), rid))
+        for sid in dict.fromkeys(fact_ids):
+            activate(sid)
+
+        while agenda:
+            _, rid = heapq.heappop(agenda)
+            conclusion = conclusions[rid]
+            if conclusion in known:
+                continue
+            known.add(conclusion)
+            fired.append(rid)
+            if observer is not None:
+                observer(rid)
+            if stop and conclusion in stop:
+                break
+            activate(conclusion)
+
+        self.examined = len(missing) + len(self.unconditional)
+        return fired
+
+    def run(self, facts, strategy="order", stop=(), observer=None):
+        """以名称列表为输入输出的正向推理，返回 (全部事实, 依次触发的规则编号)
+
+        stop 为事实名称，推出其中任何一个后立即停止。
+        """
+        facts = list(facts)
+        fired = self.forward(self.ids(facts), strategy, set(self.ids(stop)), observer)
+        names = self.symbols.names
+        return facts + [names[self.conclusions[rid]] for rid in fired], fired
@@ -0,0 +1,396 @@
+import operator
+from collections import deque
+
+from compiler import rule_parts
+
+# 持久化基数树每层的位数，节点是至多 2**BITS 项的字典
+BITS = 6
+MASK = (1 << BITS) - 1
+# 索引按符号的散列值分 HASH_LEVELS 层，散列值相同的符号放在同一个叶子字典里
+HASH_LEVELS = 4
+HASH_SHIFT = BITS * (HASH_LEVELS - 1)
+HASH_MASK = (1 << BITS * HASH_LEVELS) - 1
+# 撤销历史最多保留的版本数
+HISTORY_LIMIT = 10000
+
+
+def _get(node, key, shift):
+    while shift:
+        node = node.get((key >> shift) & MASK)
+        if node is None:
+            return None
+        shift -= BITS
+    return node.get(key & MASK)
+
+
+def _insert(root, key, shift):
+    """在新建的树中取 key 所在的叶子节点（沿途建立节点），返回 (叶子, 槽位)"""
+    node = root
+    while shift:
+        node = node.setdefault((key >> shift) & MASK, {})
+        shift -= BITS
+    return node, key & MASK
+
+
+def _walk(node, shift, base=0):
+    """按键的升序列出子树中的 (键, 值)"""
+    if not shift:
+        for slot, value in node.items():
+            yield base | slot, value
+        return
+    for slot, child in node.items():
+        yield from _walk(child, shift - BITS, base | (slot << shift))
+
+
+def _diff(old, new, shift, base, removed, added):
+    """比较两棵树，共用的子树（同一个对象）直接跳过"""
+    if old is new:
+        return
+    for slot, child in old.items():
+        other = new.get(slot)
+        if other is child:
+            continue
+        key = base | (slot << shift)
+        if not shift:
+            removed.append((key, child))
+        elif other is None:
+            removed.extend(_walk(child, shift - BITS, key))
+        else:
+            _diff(child, other, shift - BITS, key, removed, added)
+    for slot, child in new.items():
+        if old.get(slot) is child:
+            continue
+        key = base | (slot << shift)
+        if not shift:
+            added.append((key, child))
+        elif slot not in old:
+            added.extend(_walk(child, shift - BITS, key))
+
+
+class _Index:
+    """索引（符号 -> {规则编号: None}）的只读视图"""
+
+    __slots__ = ("root",)
+
+    def __init__(self, root):
+        self.root = root
+
+    def get(self, symbol, default=None):
+        leaf = _get(self.root, hash(symbol) & HASH_MASK, HASH_SHIFT)
+        return default if leaf is None else leaf.get(symbol, default)
+
+    def __getitem__(self, symbol):
+        bucket = self.get(symbol)
+        if bucket is None:
+            raise KeyError(symbol)
+        return bucket
+
+    def __contains__(self, symbol):
+        return self.get(symbol) is not None
+
+    def items(self):
+        for _, leaf in _walk(self.root, HASH_SHIFT):
+            yield from leaf.items()
+
+
+class RuleBase:
+    """带索引的规则库
+
+    每条规则有一个稳定的编号（按添加顺序递增，删除后不复用），
+    并维护“结论 -> 规则”和“前提 -> 规则”两个索引。
+    添加和删除只更新该规则涉及的索引项，代价与前提数成正比。
+    索引的值是以规则编号为键的字典，既保持添加顺序又能 O(1) 删除。
+    每次添加或删除都会递增 version，缓存据此判断是否过期。
+
+    规则和索引保存在持久化的基数树里（节点是字典，按规则编号或符号散列值的
+    每 BITS 位分层），修改时只复制从根到被改叶子的路径，其余节点与旧版本共用。
+    因此 copy() 是 O(1) 的，得到的副本固定在当前版本；checkpoint() 把当前版本
+    记入历史，undo()/redo() 在历史中切换，diff() 只比较两个版本不共用的节点。
+    本版本新建、尚未被任何副本或历史引用的节点直接原地修改，逐条建立大规则库时
+    不必每次复制路径。
+    """
+
+    def __init__(self, rules=()):
+        self._rules = {}        # 规则编号 -> 规则（基数树，顶层移位为 _shift）
+        self._shift = 0
+        self._conclusions = {}  # 结论 -> {规则编号: None}（按散列值分层）
+        self._premises = {}     # 前提 -> {规则编号: None}
+        self._size = 0
+        self._counter = [0, 0]  # 下一个规则编号、已经用过的最大版本号；同一规则库的各个版本共用
+        self._owned = {}        # 本版本新建、可以原地修改的节点：id -> 节点
+        self._undo = deque(maxlen=HISTORY_LIMIT)
+        self._redo = []
+        self.version = 0
+        self._build(rules)
+
+    def _build(self, rules):
+        """一次建立初始的规则和索引，不必逐条复制路径"""
+        rules = list(rules)
+        count = len(rules)
+        while (count - 1) >> (self._shift + BITS) > 0:
+            self._shift += BITS
+        conclusions = {}
+        premises = {}
+        for rid, rule in enumerate(rules):
+            leaf, slot = _insert(self._rules, rid, self._shift)
+            leaf[slot] = rule
+            premise_list, conclusion = rule_parts(rule)
+            conclusions.setdefault(conclusion, {})[rid] = None
+            for cond in dict.fromkeys(premise_list):
+                premises.setdefault(cond, {})[rid] = None
+        for root, index in ((self._conclusions, conclusions), (self._premises, premises)):
+            for symbol, bucket in index.items():
+                node, slot = _insert(root, hash(symbol) & HASH_MASK, HASH_SHIFT)
+                node.setdefault(slot, {})[symbol] = bucket
+        self._size = count
+        self._counter = [count, count]
+        self.version = count
+
+    @property
+    def next_id(self):
+        return self._counter[0]
+
+    @property
+    def by_conclusion(self):
+        return _Index(self._conclusions)
+
+    @property
+    def by_premise(self):
+        return _Index(self._premises)
+
+    # ---- 写时复制的节点操作 ----
+
+    def _new(self):
+        node = {}
+        self._owned[id(node)] = node
+        return node
+
+    def _own(self, node):
+        if id(node) in self._owned:
+            return node
+        node = dict(node)
+        self._owned[id(node)] = node
+        return node
+
+    def _set(self, root, key, shift, value):
+        """返回把 key 设为 value 后的根"""
+        root = node = self._own(root)
+        while shift:
+            slot = (key >> shift) & MASK
+            child = node.get(slot)
+            child = self._new() if child is None else self._own(child)
+            node[slot] = child
+            node = child
+            shift -= BITS
+        node[key & MASK] = value
+        return root
+
+    def _delete(self, root, key, shift):
+        """返回删除 key 后的根，变空的节点一并去掉"""
+        root = node = self._own(root)
+        path = []
+        while shift:
+            slot = (key >> shift) & MASK
+            child = self._own(node[slot])
+            node[slot] = child
+            path.append((node, slot))
+            node = child
+            shift -= BITS
+        del node[key & MASK]
+        while not node and path:
+            node, slot = path.pop()
+            del node[slot]
+        return root
+
+    def _index_add(self, root, symbol, rid):
+        key = hash(symbol) & HASH_MASK
+        leaf = _get(root, key, HASH_SHIFT)
+        leaf = self._new() if leaf is None else self._own(leaf)
+        bucket = leaf.get(symbol)
+        bucket = self._new() if bucket is None else self._own(bucket)
+        bucket[rid] = None
+        leaf[symbol] = bucket
+        return self._set(root, key, HASH_SHIFT, leaf)
+
+    def _index_remove(self, root, symbol, rid):
+        key = hash(symbol) & HASH_MASK
+        leaf = self._own(_get(root, key, HASH_SHIFT))
+        bucket = self._own(leaf[symbol])
+        del bucket[rid]
+        if bucket:
+            leaf[symbol] = bucket
+        else:
+            del leaf[symbol]
+        if not leaf:
+            return self._delete(root, key, HASH_SHIFT)
+        return self._set(root, key, HASH_SHIFT, leaf)
+
+    def _freeze(self):
+        # 当前版本被副本或历史引用之后，再修改就要复制路径
+        self._owned = {}
+
+    def _bump(self):
+        # 直接修改之后，被撤销的版本不能再重做
+        self._redo.clear()
+        self._counter[1] += 1
+        self.version = self._counter[1]
+
+    # ---- 修改 ----
+
+    def add(self, rule):
+        """添加规则，返回其编号"""
+        rid = self._counter[0]
+        self._counter[0] += 1
+        self._bump()
+        while rid >> (self._shift + BITS):
+            # 树不够高：原来的根成为新根的第 0 个子节点
+            if self._rules:
+                root = self._new()
+                root[0] = self._rules
+                self._rules = root
+            self._shift += BITS
+        self._rules = self._set(self._rules, rid, self._shift, rule)
+        self._size += 1
+        premises, conclusion = rule_parts(rule)
+        self._conclusions = self._index_add(self._conclusions, conclusion, rid)
+        for cond in dict.fromkeys(premises):
+            self._premises = self._index_add(self._premises, cond, rid)
+        return rid
+
+    def remove(self, rid):
+        """按编号删除规则并返回它"""
+        rule = self[rid]
+        self._bump()
+        self._rules = self._delete(self._rules, rid, self._shift)
+        self._size -= 1
+        premises, conclusion = rule_parts(rule)
+        self._conclusions = self._index_remove(self._conclusions, conclusion, rid)
+        for cond in dict.fromkeys(premises):
+            self._premises = self._index_remove(self._premises, cond, rid)
+        return rule
+
+    # ---- 版本 ----
+
+    def _state(self):
+        return self._rules, self._shift, self._conclusions, self._premises, self._size, self.version
+
+    def _restore(self, state):
+        self._rules, self._shift, self._conclusions, self._premises, self._size, self.version = state
+
+    def copy(self):
+        """固定在当前版本的副本（O(1)，与本规则库共用节点），编号和版本号保持不变
+
+        之后双方的修改互不影响；副本没有撤销历史。
+        """
+        self._freeze()
+        other = RuleBase()
+        other._restore(self._state())
+        other._counter = self._counter
+        return other
+
+    def checkpoint(self):
+        """把当前版本记入撤销历史并清空重做历史，在一批修改之前调用"""
+        self._freeze()
+        self._undo.append(self._state())
+        self._redo.clear()
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self):
+        """回到上一个记入历史的版本，返回变化（见 diff）；没有可撤销的版本时返回 None"""
+        return self._switch(self._undo, self._redo)
+
+    def redo(self):
+        """重做被撤销的版本，返回变化（见 diff）；没有可重做的版本时返回 None"""
+        return self._switch(self._redo, self._undo)
+
+    def _switch(self, source, target):
+        if not source:
+            return None
+        self._freeze()
+        before = self.copy()
+        target.append(self._state())
+        self._restore(source.pop())
+        return before.diff(self)
+
+    def diff(self, other):
+        """从本版本到 other 的变化：{"added": [(规则编号, 规则)], "removed": [(规则编号, 规则)]}
+
+        两者须来自同一个规则库（copy、撤销历史），共用的子树直接跳过，
+        代价与变化的规则数成正比，而不是与规则总数成正比。
+        """
+        old, old_shift = self._rules, self._shift
+        new, new_shift = other._rules, other._shift
+        # 树高不同时把矮的一棵垫高，子树对象不变
+        while old_shift < new_shift:
+            old = {0: old} if old else {}
+            old_shift += BITS
+        while new_shift < old_shift:
+            new = {0: new} if new else {}
+            new_shift += BITS
+        removed, added = [], []
+        _diff(old, new, old_shift, 0, removed, added)
+        removed.sort(key=lambda item: item[0])
+        added.sort(key=lambda item: item[0])
+        return {"added": added, "removed": removed}
+
+    def max_id(self):
+        """现有规则中最大的编号，规则库为空时为 -1"""
+        node, shift, key = self._rules, self._shift, 0
+        if not node:
+            return -1
+        while True:
+            slot = next(reversed(node))
+            key |= slot << shift
+            if not shift:
+                return key
+            node = node[slot]
+            shift -= BITS
+
+    # ---- 读取 ----
+
+    def concluding(self, conclusion):
+        """能推出该结论的规则"""
+        return [self[rid] for rid in self.by_conclusion.get(conclusion, ())]
+
+    def using(self, premise):
+        """以该事实为前提的规则"""
+        return [self[rid] for rid in self.by_premise.get(premise, ())]
+
+    def items(self):
+        """(规则编号, 规则)，按添加顺序"""
+        return _walk(self._rules, self._shift)
+
+    def ids(self):
+        """全部规则编号（按添加顺序）"""
+        return (rid for rid, _ in self.items())
+
+    def _lookup(self, rid):
+        try:
+            rid = operator.index(rid)
+        except TypeError:
+            return None
+        if rid < 0 or rid >> (self._shift + BITS):
+            return None
+        return _get(self._rules, rid, self._shift)
+
+    def __contains__(self, rid):
+        return self._lookup(rid) is not None
+
+    def __getitem__(self, rid):
+        rule = self._lookup(rid)
+        if rule is None:
+            raise KeyError(rid)
+        return rule
+
+    def __iter__(self):
+        return (rule for _, rule in self.items())
+
+    def __len__(self):
+        return self._size
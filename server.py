@@ -0,0 +1,235 @@
+"""动物识别推理服务（asyncio）
+
+在 TCP 或 Unix 套接字上接收按行分隔的 JSON 请求，格式与 engine.py 命令行相同：
+
+    {"id": 1, "features": ["有毛发", "吃肉"]}
+    {"id": 2, "mode": "backward", "target": "企鹅"}
+
+并发的请求先进入有界队列，再按批（最多 max_batch 条、最多等待 max_wait 秒）
+交给推理引擎；队列满时读取请求的协程会等待，压力传回客户端。
+同一批中 closure 模式的请求合并成一个观测矩阵，一次交给 NumPy 批量推理
+（forward 模式要给出规则触发序列，仍然逐条推理，结果可以直接命中缓存）。
+推理使用与图形界面 start_reasoning 相同的 InferenceEngine，结果不会不一致。
+
+    python server.py --port 8765
+    python server.py --unix /tmp/animal.sock
+    python server.py --kb animals.kb --watch   # 知识库文件修改后自动热加载
+    python server.py --mode closure            # 没有写 mode 的请求按 closure 处理
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from engine import MODES, InferenceEngine, handle_record, record_features
+from hotreload import KnowledgeBaseWatcher
+
+
+class MicroBatcher:
+    """把并发请求合并成小批次，在线程池中依次执行
+
+    mode 为请求中没有写 mode 时的推理模式。
+    """
+
+    def __init__(self, engine, max_batch=64, max_wait=0.002, queue_size=1024, mode="forward"):
+        self.engine = engine
+        self.mode = mode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(queue_size)
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, record):
+        """提交一条请求，返回可等待其结果的 future；队列满时在这里等待"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((record, future))
+        return future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # 同一时刻只有一个批次在执行，引擎不需要加锁
+            records = [record for record, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self._process, records)
+            except Exception as exc:  # 不让一个坏批次拖垮整个服务
+                results = [_error(record, exc) for record in records]
+            for (_, future), result in zip(batch, results):
+                if not future.cancelled():
+                    future.set_result(result)
+            self.batches += 1
+            self.requests += len(batch)
+
+    def _process(self, records):
+        # 整批使用同一个引擎；热加载换上的新引擎从下一批开始生效
+        engine = self.engine
+        results = [None] * len(records)
+        closure = []  # closure 模式的请求在批中的位置
+        for index, record in enumerate(records):
+            mode = record.get("mode", self.mode) if isinstance(record, dict) else self.mode
+            if mode == "closure":
+                closure.append(index)
+                continue
+            try:
+                results[index] = handle_record(engine, record, self.mode)
+            except (ValueError, TypeError, AttributeError) as exc:
+                results[index] = _error(record, exc)
+        if closure:
+            self._process_closure(engine, records, closure, results)
+        return results
+
+    def _process_closure(self, engine, records, indexes, results):
+        """closure 模式的请求整批求闭包；有错的请求单独报错，不影响同批的其他请求"""
+        valid = []
+        fact_lists = []
+        for index in indexes:
+            record = records[index]
+            try:
+                fact_lists.append(record_features(record))
+            except TypeError as exc:
+                results[index] = _error(record, exc)
+                continue
+            valid.append(index)
+        if not valid:
+            return
+        try:
+            batch_results = engine.closure_batch(fact_lists)
+        except (ImportError, ValueError, TypeError) as exc:
+            for index in valid:
+                results[index] = _error(records[index], exc)
+            return
+        for index, result in zip(valid, batch_results):
+            record = records[index]
+            if isinstance(record, dict) and "id" in record:
+                result = {"id": record["id"], **result}
+            results[index] = result
+
+
+def _error(record, exc):
+    """出错请求的结果，带回请求的 id"""
+    result = {"error": str(exc)}
+    if isinstance(record, dict) and "id" in record:
+        result = {"id": record["id"], **result}
+    return result
+
+
+async def handle_connection(batcher, reader, writer):
+    """一个连接：逐行读取请求，按请求顺序写回结果"""
+    pending = asyncio.Queue()
+
+    async def write_results():
+        while True:
+            future = await pending.get()
+            if future is None:
+                break
+            result = await future
+            writer.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+            await writer.drain()
+
+    writer_task = asyncio.create_task(write_results())
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                future = asyncio.get_running_loop().create_future()
+                future.set_result({"error": str(exc)})
+            else:
+                future = await batcher.submit(record)
+            await pending.put(future)
+    finally:
+        await pending.put(None)
+        await writer_task
+        writer.close()
+        await writer.wait_closed()
+
+
+async def serve(engine, host="127.0.0.1", port=8765, unix=None,
+                max_batch=64, max_wait=0.002, queue_size=1024, watcher=None, mode="forward"):
+    """watcher 为 KnowledgeBaseWatcher 时，知识库文件变化后换用新引擎"""
+    batcher = MicroBatcher(engine, max_batch, max_wait, queue_size, mode)
+    batch_task = asyncio.create_task(batcher.run())
+    if watcher is not None:
+        loop = asyncio.get_running_loop()
+
+        def reloaded(new_engine, version, compile_ms):
+            loop.call_soon_threadsafe(setattr, batcher, "engine", new_engine)
+            print(f"知识库已更新：版本 {version}，编译 {compile_ms:.1f} ms", file=sys.stderr)
+
+        def failed(message):
+            print(f"知识库加载失败，继续使用原来的版本：{message}", file=sys.stderr)
+
+        watcher.on_reload = reloaded
+        watcher.on_error = failed
+        watcher.start()
+
+    def client(reader, writer):
+        return handle_connection(batcher, reader, writer)
+
+    if unix:
+        server = await asyncio.start_unix_server(client, path=unix)
+    else:
+        server = await asyncio.start_server(client, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+        if watcher is not None:
+            watcher.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="动物识别推理服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix 套接字路径（指定后忽略 host/port）")
+    parser.add_argument("--max-batch", type=int, default=64, help="每批最多的请求数")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="凑批最多等待的毫秒数")
+    parser.add_argument("--queue-size", type=int, default=1024, help="等待队列长度，满了之后读取请求会暂停")
+    parser.add_argument("--mode", choices=MODES, default="forward",
+                        help="请求中没有写 mode 时的推理模式；closure 模式的请求按批用 NumPy 推理")
+    parser.add_argument("--kb", help="知识库文件（.kb 或 .kbc），省略时使用内置的规则")
+    parser.add_argument("--watch", action="store_true", help="监视 --kb 指定的文件，修改后自动重新编译并换用")
+    parser.add_argument("--watch-interval", type=float, default=1.0, help="检查文件的间隔秒数")
+    parser.add_argument("--optimize", action="store_true",
+                        help="匹配网络使用优化后的等价规则集（推出的事实不变，触发顺序可能不同）")
+    args = parser.parse_args(argv)
+    if args.watch and not args.kb:
+        parser.error("--watch 需要同时指定 --kb")
+
+    watcher = None
+    if args.watch:
+        watcher = KnowledgeBaseWatcher(args.kb, interval=args.watch_interval, optimize=args.optimize)
+        engine = watcher.engine
+    elif args.kb:
+        engine = InferenceEngine.load(args.kb, optimize=args.optimize)
+    else:
+        engine = InferenceEngine(optimize=args.optimize)
+    try:
+        asyncio.run(serve(engine, args.host, args.port, args.unix,
+                          args.max_batch, args.max_wait_ms / 1000, args.queue_size, watcher, args.mode))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import random
+import unittest
+
+import numpy as np
+
+from batch import BatchForward
+from engine import InferenceEngine
+from kbgen import generate
+
+
+class BatchForwardTest(unittest.TestCase):
+    def test_matches_forward(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            rules, features, targets = generate(
+                rules=rng.randint(5, 200), depth=rng.randint(1, 5), fan_in=rng.randint(1, 4),
+                alternatives=rng.randint(1, 3), cycles=rng.choice([0.0, 0.1, 0.3]),
+                base=rng.randint(3, 15), seed=seed)
+            # 没有前提的规则和规则数很多的结论
+            rules.append({"if": [], "then": targets[-1]})
+            rules += [{"if": [name], "then": "结论1_0"} for name in list(features.values())[::2]]
+            engine = InferenceEngine(rules, features, targets, optimize=False)
+            names = list(features.values())
+            observations = [rng.sample(names, rng.randint(0, len(names))) for _ in range(30)]
+            for facts, result in zip(observations, engine.closure_batch(observations)):
+                expected = engine.forward(facts)
+                self.assertEqual(set(result["derived"]), set(expected["derived"]))
+                found = [target for target in targets if target in expected["facts"]]
+                self.assertEqual(result["animal"], found[0] if found else None)
+
+    def test_empty_rule_base(self):
+        batch = BatchForward([], {"1": "a"}, [])
+        result = batch.forward(np.ones((3, 1), dtype=bool))
+        self.assertEqual(result["derived"].shape, (3, 0))
+        self.assertEqual(result["animal"].tolist(), [-1, -1, -1])
+
+    def test_arrays_round_trip(self):
+        engine = InferenceEngine()
+        batch = BatchForward(list(engine.rules), engine.features, engine.animal_targets)
+        copy = BatchForward.from_arrays(batch.arrays(), batch.columns, batch.targets, batch.compiled.symbols.names)
+        observations = np.random.default_rng(0).random((50, len(batch.columns))) < 0.4
+        expected, result = batch.forward(observations), copy.forward(observations)
+        self.assertTrue(np.array_equal(expected["derived"], result["derived"]))
+        self.assertTrue(np.array_equal(expected["animal"], result["animal"]))
+
+
+class BatchEdgeCaseTest(unittest.TestCase):
+    RULES = [
+        {"if": ["a"], "then": "m"},
+        {"if": ["m", "b"], "then": "t1"},
+        {"if": ["m"], "then": "t2"},
+        {"if": ["c"], "then": "m"},
+    ]
+
+    def setUp(self):
+        # c 有两个编号；d 不出现在任何规则中；“幽灵”不是任何规则的结论
+        self.batch = BatchForward(self.RULES, {"1": "a", "2": "b", "3": "c", "4": "c", "5": "d"},
+                                  ["幽灵", "t1", "t2"])
+
+    def test_shape_errors(self):
+        for observations in (np.zeros(5, dtype=bool), np.zeros((2, 4), dtype=bool), np.zeros((1, 2, 5))):
+            with self.assertRaisesRegex(ValueError, "5"):
+                self.batch.forward(observations)
+
+    def test_no_rows(self):
+        result = self.batch.forward(np.zeros((0, 5), dtype=bool))
+        self.assertEqual(result["derived"].shape, (0, len(result["conclusions"])))
+        self.assertEqual(result["animal"].shape, (0,))
+
+    def test_columns_and_target_order(self):
+        observations = [
+            [1, 1, 0, 0, 0],  # 同时推出 t1 和 t2，取 targets 中靠前的 t1
+            [0, 0, 0, 1, 0],  # c 的第二个编号
+            [0, 0, 0, 0, 1],  # 无关的特征
+        ]
+        result = self.batch.forward(observations)
+        self.assertEqual(self.batch.animal_names(result["animal"]), ["t1", "t2", None])
+        column = {name: j for j, name in enumerate(result["conclusions"])}
+        self.assertTrue(result["derived"][1, column["m"]])
+        self.assertFalse(result["derived"][2].any())
+
+    def test_initial_conclusions_are_not_derived(self):
+        batch = BatchForward(self.RULES, {"1": "a", "2": "m"}, ["t2"])
+        result = batch.forward([[1, 1], [0, 1]])
+        column = {name: j for j, name in enumerate(result["conclusions"])}
+        self.assertEqual(result["derived"][:, column["m"]].tolist(), [False, False])
+        self.assertEqual(result["animal"].tolist(), [0, 0])
+
+    def test_chunks(self):
+        observations = np.random.default_rng(1).random((23, 5)) < 0.5
+        expected = self.batch.forward(observations)
+        for chunk_size in (1, 4, 23):
+            batch = BatchForward(self.RULES, dict(zip("12345", self.batch.columns)), self.batch.targets, chunk_size)
+            result = batch.forward(observations)
+            self.assertTrue(np.array_equal(result["derived"], expected["derived"]), chunk_size)
+            self.assertTrue(np.array_equal(result["animal"], expected["animal"]), chunk_size)
+
+    def test_engine_rebuilds_after_edit(self):
+        engine = InferenceEngine()
+        row = np.zeros((1, len(engine.features)), dtype=bool)
+        row[0, list(engine.features).index("3")] = True
+        self.assertEqual(engine.forward_batch(row)["animal"].tolist(), [-1])
+        engine.add_rule({"if": ["有羽毛"], "then": "信天翁"})
+        self.assertIsNone(engine.batch)
+        result = engine.forward_batch(row)
+        self.assertEqual(engine.batch.animal_names(result["animal"]), ["信天翁"])
+        engine.undo()
+        self.assertEqual(engine.forward_batch(row)["animal"].tolist(), [-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import random
+import unittest
+
+from cache import ClosureCache
+from engine import InferenceEngine
+from kbgen import generate
+from rete import STRATEGIES
+
+
+class ClosureCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = ClosureCache(2)
+        for facts in (["a"], ["b"], ["c"]):
+            self.assertIsNone(cache.get(facts, 1))
+            cache.put(facts, 1, [facts[0] + "!"], [])
+        self.assertIsNone(cache.get(["a"], 1))
+        self.assertEqual(cache.get(["c"], 1), (("c!",), ()))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_version_change_clears(self):
+        cache = ClosureCache()
+        cache.get(["a"], 1)
+        cache.put(["a"], 1, ["b"], [])
+        self.assertIsNone(cache.get(["a"], 2))
+
+    def test_ordered_key(self):
+        cache = ClosureCache()
+        cache.get(["a", "b"], 1, ordered=True)
+        cache.put(["a", "b"], 1, ["x"], [], ordered=True)
+        self.assertIsNone(cache.get(["b", "a"], 1, ordered=True))
+        self.assertIsNotNone(cache.get(["a", "b", "a"], 1, ordered=True))
+        self.assertIsNone(cache.get(["b", "a"], 1))
+
+    def test_cached_forward_matches_uncached(self):
+        rules, features, targets = generate(rules=300, depth=4, fan_in=2, alternatives=2, cycles=0.05,
+                                            base=20, seed=1)
+        for rule in rules[::7]:
+            rule["salience"] = 1
+        cached = InferenceEngine(rules, features, targets)
+        plain = InferenceEngine(rules, features, targets, cache_size=0)
+        rng = random.Random(0)
+        names = list(features.values())
+        for _ in range(100):
+            facts = rng.sample(names, rng.randint(1, 10))
+            for strategy in STRATEGIES:
+                for order in (facts, facts[::-1]):
+                    self.assertEqual(cached.forward(order, strategy), plain.forward(order, strategy),
+                                     (strategy, order))
+
+
+if __name__ == "__main__":
+    unittest.main()
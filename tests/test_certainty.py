@@ -0,0 +1,100 @@
+import random
+import unittest
+from graphlib import TopologicalSorter
+
+import numpy as np
+
+from batch import BatchForward
+from certainty import THRESHOLD, BatchCertainty, combine
+from engine import InferenceEngine, handle_record, parse_rule
+from kbgen import generate
+
+
+def _combine(a, b):
+    if a >= 0 and b >= 0:
+        return a + b - a * b
+    if a <= 0 and b <= 0:
+        return a + b + a * b
+    return (a + b) / (1 - min(abs(a), abs(b)))
+
+
+def _reference(rules, observations):
+    """逐条规则的标量 MYCIN 推理（规则无环），按结论的拓扑序"""
+    cf = dict(observations)
+    graph = {}
+    for rule in rules:
+        graph.setdefault(rule["then"], set()).update(rule["if"])
+    for symbol in TopologicalSorter(graph).static_order():
+        for rule in rules:
+            if rule["then"] != symbol:
+                continue
+            strength = min([cf.get(p, 0.0) for p in rule["if"]] or [1.0])
+            if strength > THRESHOLD:
+                cf[symbol] = _combine(cf.get(symbol, 0.0), strength * rule.get("cf", 1.0))
+    return cf
+
+
+class CombineTest(unittest.TestCase):
+    def test_formula(self):
+        def evidence(values):
+            positive = sum(np.log1p(-v) for v in values if v > 0)
+            negative = sum(np.log1p(v) for v in values if v < 0)
+            return np.array([positive]), np.array([negative])
+
+        for values in ([0.6, 0.5], [-0.6, -0.5], [0.6, -0.5], [0.9, 0.3, -0.7]):
+            expected = 0.0
+            for value in values:
+                expected = _combine(expected, value)
+            self.assertAlmostEqual(float(combine(*evidence(values))[0]), expected, places=6)
+
+
+class BatchCertaintyTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = InferenceEngine()
+
+    def test_matches_scalar_reference(self):
+        rng = random.Random(3)
+        rules = [dict(rule, cf=round(rng.uniform(0.3, 1.0), 2)) for rule in self.engine.rules]
+        rules.append({"if": ["会游泳"], "then": "信天翁", "cf": -0.8})
+        rules.append({"if": ["有毛发"], "then": "鸟类", "cf": -0.5})
+        features = {key: name for key, name in self.engine.features.items() if key != "17"}
+        certainty = BatchCertainty(rules, features, self.engine.animal_targets)
+        for _ in range(200):
+            row = {name: rng.choice([0.0, 0.0, 1.0, round(rng.uniform(-1, 1), 3)])
+                   for name in certainty.columns}
+            result = certainty.forward([[row[name] for name in certainty.columns]], k=3)
+            expected = _reference(rules, {name: value for name, value in row.items() if value})
+            for name, value in zip(result["conclusions"], result["cf"][0]):
+                self.assertAlmostEqual(float(value), expected.get(name, 0.0), places=5, msg=(row, name))
+
+    def test_boolean_inputs_match_batch_forward(self):
+        for cycles in (0.0, 0.05):
+            rules, features, targets = generate(rules=300, depth=5, fan_in=2, alternatives=2, cycles=cycles,
+                                                base=20, seed=4)
+            rng = np.random.default_rng(0)
+            observations = rng.random((200, len(features))) < 0.3
+            boolean = BatchForward(rules, features, targets).forward(observations)
+            result = BatchCertainty(rules, features, targets).forward(observations.astype(np.float32))
+            columns = [result["conclusions"].index(name) for name in boolean["conclusions"]]
+            self.assertTrue(np.array_equal(result["cf"][:, columns] > 0, boolean["derived"]))
+
+    def test_strength_range(self):
+        for strength in (-1.0, 1.5, float("nan")):
+            with self.assertRaises(ValueError):
+                BatchCertainty([{"if": ["有毛发"], "then": "哺乳类", "cf": strength}], self.engine.features, [])
+
+    def test_rule_strength_from_text(self):
+        engine = InferenceEngine([parse_rule("有毛发 黄褐色，金钱豹 [cf=0.5]")], self.engine.features, ["金钱豹"])
+        result = engine.forward_cf({"有毛发": 0.8, "12": 0.9})
+        self.assertEqual(result["candidates"][0]["target"], "金钱豹")
+        self.assertAlmostEqual(result["candidates"][0]["cf"], 0.4, places=6)
+
+    def test_handle_record(self):
+        result = handle_record(self.engine, {"id": 1, "mode": "cf", "k": 1,
+                                             "features": [["有毛发", 0.9], "吃肉", "黄褐色", ["13", 0.7]]})
+        self.assertEqual(result["id"], 1)
+        self.assertEqual([item["target"] for item in result["candidates"]], ["金钱豹"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import random
+import unittest
+
+from engine import InferenceEngine
+from kbgen import generate
+
+
+def _capped_kb():
+    # 目标 T 的方案是 {a_i, b_j} 的全部 25 种组合，超过默认上限 20
+    rules = [{"if": [f"a{i}"], "then": "A"} for i in range(5)]
+    rules += [{"if": [f"b{i}"], "then": "B"} for i in range(5)]
+    rules += [{"if": ["A", "B"], "then": "T"}, {"if": ["a0"], "then": "U"}]
+    features = {str(k): name for k, name in enumerate([f"a{i}" for i in range(5)] + [f"b{i}" for i in range(5)])}
+    return InferenceEngine(rules, features, ["T", "U"])
+
+
+class ConsultationTest(unittest.TestCase):
+    def test_truthful_answers(self):
+        rng = random.Random(0)
+        for seed in range(10):
+            rules, features, targets = generate(rules=40, depth=3, fan_in=2, alternatives=2, cycles=0.1,
+                                                base=12, seed=seed)
+            engine = InferenceEngine(rules, features, targets)
+            names = list(features.values())
+            for _ in range(5):
+                truth = {name for name in names if rng.random() < 0.4}
+                consultation = engine.consult()
+                while True:
+                    question = consultation.next_question()
+                    if question is None:
+                        break
+                    consultation.answer(question, question in truth)
+                if consultation.animal is not None:
+                    self.assertIn(consultation.animal, engine.forward(consultation.facts())["facts"])
+                # 被排除的目标在去掉回答“否”的特征之后也推不出来
+                denied = {name for name, present in consultation.answers.items() if present is False}
+                possible = engine.forward(sorted(set(names) - denied))["facts"]
+                for target in consultation.eliminated:
+                    self.assertNotIn(target, possible)
+
+    def test_capped_target_is_not_eliminated(self):
+        engine = _capped_kb()
+        consultation = engine.consult()
+        # 列出的 20 个方案都含 a0..a3 之一，但 {a4, b_j} 仍能推出 T
+        for name in ("a0", "a1", "a2", "a3"):
+            consultation.answer(name, False)
+        self.assertEqual(consultation.eliminated, ["U"])
+        self.assertEqual([target for target, _ in consultation.candidates()], ["T"])
+        self.assertIsNone(consultation.animal)
+
+    def test_capped_target_is_still_confirmed(self):
+        consultation = _capped_kb().consult()
+        consultation.answer("a0", True)
+        consultation.answer("b0", True)
+        self.assertIn(consultation.animal, ("T", "U"))
+
+
+if __name__ == "__main__":
+    unittest.main()
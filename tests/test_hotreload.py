@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from engine import InferenceEngine
+from hotreload import KnowledgeBaseWatcher
+
+
+class KnowledgeBaseWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "animals.kb")
+        InferenceEngine().save(self.path)
+        self.reloads = []
+        self.errors = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def watcher(self, **options):
+        return KnowledgeBaseWatcher(self.path, on_reload=lambda *args: self.reloads.append(args),
+                                    on_error=self.errors.append, **options)
+
+    def append(self, line):
+        with open(self.path, "a", encoding="utf-8") as fp:
+            fp.write(line + "\n")
+
+    def test_reload_after_file_settles(self):
+        watcher = self.watcher()
+        old = watcher.engine
+        self.assertFalse(watcher.check())
+        self.append("有毛发 善飞，蝙蝠")
+        self.assertFalse(watcher.check())  # 刚发现变化，等文件稳定
+        self.assertIs(watcher.engine, old)
+        self.assertTrue(watcher.check())
+        self.assertFalse(watcher.check())
+        self.assertIsNot(watcher.engine, old)
+        self.assertEqual(watcher.version, 2)
+        self.assertEqual([(engine, version) for engine, version, _ in self.reloads], [(watcher.engine, 2)])
+        self.assertIn("蝙蝠", watcher.engine.forward(["有毛发", "善飞"])["derived"])
+        self.assertNotIn("蝙蝠", old.forward(["有毛发", "善飞"])["derived"])
+
+    def test_error_keeps_old_engine(self):
+        watcher = self.watcher()
+        old = watcher.engine
+        self.append("这一行没有结论")
+        self.assertFalse(watcher.reload())
+        self.assertIs(watcher.engine, old)
+        self.assertEqual(watcher.version, 1)
+        self.assertEqual(self.reloads, [])
+        self.assertEqual(len(self.errors), 1)
+        self.assertTrue(self.errors[0].startswith(self.path))
+
+    def test_deleted_file_is_not_reloaded(self):
+        watcher = self.watcher()
+        os.remove(self.path)
+        self.assertFalse(watcher.check())
+        self.assertFalse(watcher.check())
+        self.assertEqual((self.reloads, self.errors), ([], []))
+
+    def test_reloaded_engine_keeps_options(self):
+        for optimize in (False, True):
+            watcher = self.watcher(optimize=optimize, cache_size=7)
+            self.assertTrue(watcher.reload())
+            for engine in (watcher.engine, self.reloads[-1][0]):
+                self.assertEqual(engine.optimize, optimize)
+                self.assertEqual(engine.optimization is not None, optimize)
+                self.assertEqual(engine.cache.maxsize, 7)
+
+    def test_given_engine_is_not_reloaded(self):
+        engine = InferenceEngine()
+        watcher = KnowledgeBaseWatcher(self.path, engine)
+        self.assertIs(watcher.engine, engine)
+        self.assertEqual((watcher.version, watcher.compile_ms), (1, 0.0))
+
+    def test_start_and_stop(self):
+        watcher = self.watcher(interval=0.01).start()
+        self.assertIs(watcher.start(), watcher)
+        self.append("有毛发 善飞，蝙蝠")
+        for _ in range(500):
+            if self.reloads:
+                break
+            watcher._stopped.wait(0.01)
+        watcher.stop()
+        self.assertIsNone(watcher._thread)
+        self.assertEqual(watcher.version, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import kbfile
+from engine import InferenceEngine, parse_rule, parse_rules
+from kbgen import generate
+
+
+class ParseRuleTest(unittest.TestCase):
+    def test_attributes(self):
+        rule = parse_rule("有毛发 吃肉，食肉类 [cf=0.8 salience=2]")
+        self.assertEqual(rule, {"if": ["有毛发", "吃肉"], "then": "食肉类", "cf": 0.8, "salience": 2})
+        self.assertEqual(parse_rule("有毛发，哺乳类"), {"if": ["有毛发"], "then": "哺乳类"})
+
+    def test_invalid_attributes(self):
+        for text in ("a，b [cf=1.5]", "a，b [cf=-1]", "a，b [cf=x]", "a，b [cf]", "a，b [weight=1]", "a， [cf=1]"):
+            with self.assertRaises(ValueError, msg=text):
+                parse_rule(text)
+        _, errors = parse_rules(["a，b [cf=2]"])
+        self.assertTrue(errors[0].startswith("第 1 行"))
+
+
+class KnowledgeBaseFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "animals.kb")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        rules, features, targets = generate(rules=200, depth=4, base=20, seed=2)
+        rules[3]["cf"] = 0.35
+        rules[5]["salience"] = 4
+        rules[5]["cf"] = -0.5
+        kbfile.save(self.path, rules, features, targets, ["结论1_0"])
+        for path in (self.path, kbfile.compiled_path(self.path)):
+            loaded, loaded_features, loaded_targets, intermediate = kbfile.load(path)
+            self.assertEqual(list(loaded), rules)
+            self.assertEqual((loaded_features, loaded_targets, intermediate), (features, targets, ["结论1_0"]))
+        with open(self.path, encoding="utf-8") as fp:
+            parsed = kbfile.parse_text(fp.read())
+        self.assertEqual(parsed[0], rules)
+
+    def test_recompile_after_edit(self):
+        engine = InferenceEngine()
+        engine.save(self.path)
+        with open(self.path, "a", encoding="utf-8") as fp:
+            fp.write("有毛发 善飞，蝙蝠 [salience=1]\n")
+        rules, *_ = kbfile.load(self.path)
+        self.assertEqual(rules[len(rules) - 1], {"if": ["有毛发", "善飞"], "then": "蝙蝠", "salience": 1})
+
+    def test_mapped_engine_matches_rulebase(self):
+        rules, features, targets = generate(rules=300, depth=4, fan_in=2, alternatives=2, cycles=0.05,
+                                            base=20, seed=3)
+        for rule in rules[::5]:
+            rule["salience"] = 2
+        kbfile.save(self.path, rules, features, targets)
+        mapped = InferenceEngine.load(self.path, optimize=False)
+        plain = InferenceEngine(rules, features, targets, optimize=False)
+        self.assertTrue(mapped.rules.mapped)
+        names = list(features.values())
+        for start in range(0, 20, 3):
+            facts = names[start:start + 6]
+            for strategy in ("order", "salience"):
+                self.assertEqual(mapped.forward(facts, strategy), plain.forward(facts, strategy))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+from kbgen import generate
+from lookup import DecisionDiagram, ForwardClassifier, LookupTable, compile_classifier
+from rulebase import RuleBase
+
+
+def observations(names):
+    for mask in range(1 << len(names)):
+        yield [name for i, name in enumerate(names) if mask >> i & 1]
+
+
+def branching(width):
+    """每个中间结论有两条规则，目标有 2^width 个证明方案"""
+    rules = []
+    for i in range(width):
+        rules.append({"if": [f"a{i}"], "then": f"x{i}"})
+        rules.append({"if": [f"b{i}"], "then": f"x{i}"})
+    rules.append({"if": [f"x{i}" for i in range(width)], "then": "目标"})
+    rules.append({"if": ["a0", "b0"], "then": "次要目标"})
+    names = [f"{kind}{i}" for i in range(width) for kind in "ab"]
+    return RuleBase(rules), {str(i + 1): name for i, name in enumerate(names)}, ["目标", "次要目标"]
+
+
+class ClassifierTest(unittest.TestCase):
+    def test_diagram_matches_table(self):
+        for seed in range(3):
+            rules, features, targets = generate(rules=80, depth=3, fan_in=2, alternatives=2, cycles=0.05,
+                                                base=10, seed=seed)
+            rules = RuleBase(rules)
+            table = LookupTable(rules, features, targets)
+            diagram = DecisionDiagram(rules, features, targets)
+            forward = ForwardClassifier(rules, features, targets)
+            for facts in observations(list(features.values())):
+                expected = forward.classify(facts)
+                self.assertEqual(table.classify(facts), expected, facts)
+                self.assertEqual(diagram.classify(facts), expected, facts)
+
+    def test_only_base_features_count(self):
+        rules, features, targets = branching(2)
+        for classifier in (LookupTable(rules, features, targets), DecisionDiagram(rules, features, targets),
+                           ForwardClassifier(rules, features, targets)):
+            self.assertIsNone(classifier.classify(["x0", "x1"]))
+            self.assertEqual(classifier.classify(["a0", "b1", "未知"]), "目标")
+            self.assertEqual(classifier.classify(["a0", "b0"]), "次要目标")
+
+    def test_capped_proofs_are_rejected(self):
+        rules, features, targets = branching(5)
+        diagram = DecisionDiagram(rules, features, targets, limit=32)  # 恰好 32 个方案，没有截断
+        self.assertEqual(diagram.classify(["b0", "a1", "a2", "b3", "a4"]), "目标")
+        with self.assertRaisesRegex(ValueError, "目标"):
+            DecisionDiagram(rules, features, targets, limit=31)
+
+    def test_capped_falls_back_to_forward(self):
+        rules, features, targets = branching(5)
+        with mock.patch("lookup.TABLE_LIMIT", 0):
+            self.assertIsInstance(compile_classifier(rules, features, targets), DecisionDiagram)
+            classifier = compile_classifier(rules, features, targets, limit=8)
+        self.assertIsInstance(classifier, ForwardClassifier)
+        table = LookupTable(rules, features, targets)
+        for facts in observations(list(features.values())):
+            self.assertEqual(classifier.classify(facts), table.classify(facts), facts)
+
+
+if __name__ == "__main__":
+    unittest.main()
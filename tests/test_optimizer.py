@@ -0,0 +1,160 @@
+import random
+import unittest
+from unittest import mock
+
+from engine import InferenceEngine
+from kbgen import generate
+from optimizer import optimize
+
+
+def _closure(engine, facts):
+    return set(engine.forward(facts)["facts"])
+
+
+class OptimizerTest(unittest.TestCase):
+    def test_redundant_premise_uses_original_rules(self):
+        # C 不能单独推出 X：规则 0 去掉 C 之后不能再用来判断规则 2 的前提 X 冗余
+        rules = [{"if": ["C", "A"], "then": "X"}, {"if": ["A"], "then": "C"}, {"if": ["C", "X"], "then": "T"}]
+        report = optimize(dict(enumerate(rules)), {"1": "A", "2": "C"})
+        self.assertEqual(report["redundant"], {0: ["C"]})
+        engine = InferenceEngine(rules, {"1": "A", "2": "C"}, ["T"], optimize=True)
+        self.assertEqual(engine.forward(["C"])["facts"], ["C"])
+        self.assertIn("T", engine.forward(["A"])["facts"])
+
+    def test_same_closure_as_unoptimized(self):
+        for seed in range(60):
+            rng = random.Random(seed)
+            rules, features, targets = generate(
+                rules=rng.randint(10, 80), depth=rng.randint(2, 5), fan_in=rng.randint(1, 4),
+                alternatives=rng.randint(1, 3), cycles=rng.choice([0.0, 0.15, 0.3]),
+                base=rng.randint(4, 10), seed=seed)
+            optimized = InferenceEngine(rules, features, targets, optimize=True)
+            plain = InferenceEngine(rules, features, targets)
+            names = list(features.values())
+            for _ in range(30):
+                facts = rng.sample(names, rng.randint(0, len(names)))
+                self.assertEqual(_closure(optimized, facts), _closure(plain, facts), (seed, facts))
+
+    def test_closure_after_edits(self):
+        rules, features, targets = generate(rules=40, depth=3, fan_in=2, alternatives=2, cycles=0.15,
+                                            base=8, seed=35)
+        optimized = InferenceEngine(rules[:20], features, targets, optimize=True)
+        plain = InferenceEngine(rules[:20], features, targets)
+        for engine in (optimized, plain):
+            engine.add_rules(rules[20:])
+            engine.delete_rules([3, 7])
+        rng = random.Random(0)
+        names = list(features.values())
+        for _ in range(50):
+            facts = rng.sample(names, rng.randint(0, len(names)))
+            self.assertEqual(_closure(optimized, facts), _closure(plain, facts))
+
+
+class UpdateTest(unittest.TestCase):
+    """增删规则后 optimizer.update 增量维护的结果"""
+
+    def engine(self, rules, features=("A", "B")):
+        features = {str(k): name for k, name in enumerate(features, 1)}
+        return InferenceEngine(rules, features, ["T"], optimize=True)
+
+    def assertConsistent(self, engine):
+        # 每条规则恰好属于一类，匹配网络与优化结果一致
+        report = engine.optimization
+        groups = [set(report["rules"]), set(report["unreachable"]), set(report["cyclic"]),
+                  set(report["duplicates"]), set(report["subsumed"])]
+        self.assertEqual(sum(map(len, groups)), len(engine.rules))
+        self.assertEqual(set().union(*groups), set(engine.rules.ids()))
+        self.assertEqual(report["after"]["rules"], len(report["rules"]))
+        self.assertEqual(report["before"]["rules"], len(engine.rules))
+        network = engine.compile()
+        self.assertEqual(set(network.premise_count), set(report["rules"]))
+
+    def test_edits_do_not_rerun_the_pass(self):
+        engine = self.engine([{"if": ["A"], "then": "X"}])
+        engine.compile()
+        with mock.patch("engine.optimize") as full_pass:
+            rid = engine.add_rule({"if": ["X", "B"], "then": "T"})
+            engine.delete_rule(rid)
+            engine.undo()
+            engine.redo()
+        full_pass.assert_not_called()
+
+    def test_deleting_kept_rule_restores_duplicate(self):
+        engine = self.engine([{"if": ["A"], "then": "T"}, {"if": ["A"], "then": "T"}, {"if": ["A", "B"], "then": "T"}])
+        self.assertEqual(engine.optimization["duplicates"], {1: 0})
+        self.assertEqual(engine.optimization["subsumed"], {2: 0})
+        engine.compile()
+        engine.delete_rule(0)
+        self.assertConsistent(engine)
+        self.assertIn("T", engine.forward(["A"])["facts"])
+
+    def test_deleting_implication_restores_redundant_premise(self):
+        # B 由 A 推出才被去掉；删掉 A → B 之后只有 A 不能再推出 T
+        engine = self.engine([{"if": ["A"], "then": "B"}, {"if": ["A", "B"], "then": "T"}])
+        self.assertEqual(engine.optimization["redundant"], {1: ["B"]})
+        engine.compile()
+        engine.delete_rule(0)
+        self.assertEqual(engine.optimization["redundant"], {})
+        self.assertConsistent(engine)
+        self.assertNotIn("T", engine.forward(["A"])["facts"])
+        self.assertIn("T", engine.forward(["A", "B"])["facts"])
+
+    def test_added_rule_makes_rule_reachable(self):
+        engine = self.engine([{"if": ["Y"], "then": "Z"}, {"if": ["Z"], "then": "T"}])
+        self.assertEqual(engine.optimization["unreachable"], [0, 1])
+        engine.compile()
+        engine.add_rule({"if": ["A"], "then": "Y"})
+        self.assertEqual(engine.optimization["unreachable"], [])
+        self.assertConsistent(engine)
+        self.assertIn("T", engine.forward(["A"])["facts"])
+        engine.undo()
+        self.assertConsistent(engine)
+        self.assertEqual(engine.forward(["A"])["facts"], ["A"])
+
+    def test_added_rule_bypasses_cycle(self):
+        # Y → X 原来只在 X 已经成立时才能触发；加入 B → Y 之后它可以推出 X
+        engine = self.engine([{"if": ["A"], "then": "X"}, {"if": ["X"], "then": "Y"}, {"if": ["Y"], "then": "X"},
+                              {"if": ["X"], "then": "T"}])
+        self.assertEqual(engine.optimization["cyclic"], [2])
+        engine.compile()
+        engine.add_rule({"if": ["B"], "then": "Y"})
+        self.assertConsistent(engine)
+        self.assertIn("T", engine.forward(["B"])["facts"])
+
+    def test_added_duplicate_stays_out_of_network(self):
+        engine = self.engine([{"if": ["A"], "then": "T"}])
+        rid = engine.add_rule({"if": ["A", "B"], "then": "T"})
+        self.assertEqual(engine.optimization["subsumed"], {rid: 0})
+        self.assertConsistent(engine)
+        engine.delete_rule(0)
+        self.assertConsistent(engine)
+        self.assertIn("T", engine.forward(["A", "B"])["facts"])
+
+    def test_random_edits(self):
+        for seed in range(15):
+            rng = random.Random(seed)
+            rules, features, targets = generate(rules=60, depth=3, fan_in=2, alternatives=3, cycles=0.2,
+                                                base=6, seed=seed)
+            rules += [dict(rule) for rule in rng.sample(rules, 10)]  # 重复的规则
+            optimized = InferenceEngine(rules[:30], features, targets, optimize=True)
+            optimized.compile()
+            names = list(features.values())
+            for _ in range(25):
+                op = rng.random()
+                if op < 0.35:
+                    optimized.add_rules(rng.sample(rules, rng.randint(1, 4)))
+                elif op < 0.65 and len(optimized.rules):
+                    optimized.delete_rules(rng.sample(list(optimized.rules.ids()), min(3, len(optimized.rules))))
+                elif op < 0.85:
+                    optimized.undo()
+                else:
+                    optimized.redo()
+                self.assertConsistent(optimized)
+                plain = InferenceEngine(list(optimized.rules), features, targets)
+                for _ in range(10):
+                    facts = rng.sample(names, rng.randint(0, len(names)))
+                    self.assertEqual(_closure(optimized, facts), _closure(plain, facts), (seed, facts))
+
+
+if __name__ == "__main__":
+    unittest.main()
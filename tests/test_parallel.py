@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import shared_memory
+
+import parallel
+from batch import BatchForward
+from engine import InferenceEngine
+from parallel import SharedKnowledgeBase, run_parallel
+
+
+class SharedKnowledgeBaseTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = InferenceEngine()
+        self.batch = BatchForward(list(self.engine.rules), self.engine.features, self.engine.animal_targets)
+
+    def test_attached_views_match_arrays(self):
+        shared = SharedKnowledgeBase(self.batch, self.batch.compiled.symbols.names)
+        try:
+            shm, views = SharedKnowledgeBase.attach(shared.name, shared.layout)
+            for name, array in self.batch.arrays().items():
+                self.assertEqual(shared.layout[name][0] % parallel.ALIGN, 0)
+                self.assertTrue((views[name] == array).all(), name)
+            names = bytes(views.pop("symbol_blob")).decode("utf-8").split("\0")
+            self.assertEqual(names, list(self.batch.compiled.symbols.names))
+            del views
+            shm.close()
+        finally:
+            shared.close()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=shared.name)
+
+
+class RunShardTest(unittest.TestCase):
+    def setUp(self):
+        engine = InferenceEngine()
+        batch = BatchForward(list(engine.rules), engine.features, engine.animal_targets)
+        self.shared = SharedKnowledgeBase(batch, batch.compiled.symbols.names)
+        parallel._init_worker(self.shared.name, self.shared.layout, engine.features, engine.animal_targets)
+
+    def tearDown(self):
+        parallel._worker.pop("batch")
+        parallel._worker.pop("shm").close()
+        self.shared.close()
+
+    def test_record_forms(self):
+        lines = [
+            '{"id": 7, "features": ["有羽毛", "善飞"]}',
+            '["3", "20"]',
+            '{"id": "x", "features": ["未知特征"]}',
+            '{"id": 8, "features": 5}',
+            'not json',
+        ]
+        output = [json.loads(line) for line in parallel._run_shard(lines)]
+        self.assertEqual(output[0], {"id": 7, "derived": ["鸟类", "信天翁"], "animal": "信天翁"})
+        self.assertEqual(output[1]["animal"], "信天翁")
+        self.assertEqual(output[2], {"id": "x", "derived": [], "animal": None})
+        self.assertEqual(list(output[3]), ["id", "error"])
+        self.assertEqual(list(output[4]), ["error"])
+
+
+class RunParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = InferenceEngine()
+        names = list(dict.fromkeys(self.engine.features.values()))
+        self.observations = [names[i % 7:i % 7 + i % 5] + names[i % 3::6] for i in range(40)]
+
+    def test_order_and_results(self):
+        lines = [json.dumps({"id": i, "features": facts}, ensure_ascii=False)
+                 for i, facts in enumerate(self.observations)]
+        lines.insert(5, "")
+        output = [json.loads(line) for line in run_parallel(self.engine, lines, workers=2, shard_size=3)]
+        self.assertEqual([item["id"] for item in output], list(range(40)))
+        for facts, item in zip(self.observations, output):
+            derived = set(self.engine.forward(facts)["derived"])
+            self.assertEqual(set(item["derived"]), derived, facts)
+            self.assertEqual(item["animal"], next((t for t in self.engine.animal_targets if t in derived), None))
+
+    def test_main_writes_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            source = os.path.join(directory, "observations.jsonl")
+            target = os.path.join(directory, "results.jsonl")
+            with open(source, "w", encoding="utf-8") as fp:
+                for facts in self.observations[:10]:
+                    fp.write(json.dumps(facts, ensure_ascii=False) + "\n")
+            parallel.main([source, "-o", target, "--workers", "1", "--shard-size", "4"])
+            with open(target, encoding="utf-8") as fp:
+                output = [json.loads(line) for line in fp]
+            self.assertEqual(len(output), 10)
+            for facts, item in zip(self.observations, output):
+                self.assertEqual(set(item["derived"]), set(self.engine.forward(facts)["derived"]))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
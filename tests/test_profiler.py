@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import unittest
+from unittest import mock
+
+from engine import InferenceEngine
+from profiler import export_csv, export_json
+from rete import Cancelled
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = InferenceEngine()
+        self.engine.enable_profiling()
+
+    def rows(self):
+        return {row["rid"]: row for row in self.engine.profile_stats()["rules"]}
+
+    def test_counts(self):
+        self.engine.forward(["有羽毛", "善飞"])
+        rows = self.rows()
+        self.assertEqual({rid: row["checks"] for rid, row in rows.items()}, {2: 1, 12: 1, 13: 1, 14: 2})
+        self.assertEqual({rid: row["fired"] for rid, row in rows.items() if row["fired"]}, {2: 1, 14: 1})
+        self.assertEqual(rows[12]["failed_on"], {"不会飞": 1})
+        self.assertEqual(rows[13]["failures"], 1)
+        self.assertEqual((rows[14]["failures"], rows[14]["failed_on"]), (0, {}))
+        self.assertGreater(rows[2]["time_ms"], 0)
+        self.assertEqual(rows[12]["time_ms"], 0.0)
+        forward = self.engine.profile_stats()["forward"]
+        self.assertEqual((forward["runs"], forward["iterations"], forward["max_iterations"]), (1, 1, 1))
+
+    def test_rounds_and_stop(self):
+        # 规则 0 要等规则 1 触发后才满足，按 order 策略要扫描两轮
+        engine = InferenceEngine([{"if": ["b"], "then": "c"}, {"if": ["a"], "then": "b"}], {"1": "a"}, ["c"])
+        engine.enable_profiling()
+        engine.forward(["a"])
+        self.assertEqual(engine.profile_stats()["forward"]["iterations"], 2)
+        engine.forward(["a", "x"], "salience")
+        self.assertEqual(engine.profile_stats()["forward"]["iterations"], 4)
+        self.assertEqual(engine.profile_stats()["forward"]["max_iterations"], 2)
+        self.engine.enable_profiling(False)
+        self.engine.enable_profiling()
+        self.engine.forward(["有羽毛", "善飞", "不会飞"], stop_at_target=True)
+        rows = self.rows()
+        self.assertEqual(rows[14]["fired"], 1)
+        self.assertNotIn(15, rows)
+        self.assertEqual(rows[12]["failed_on"], {"长脖": 1})
+
+    def test_same_results_and_no_cache(self):
+        plain = InferenceEngine()
+        for strategy in ("order", "salience", "specificity", "recency"):
+            for facts in (["有毛发", "吃肉", "黄褐色", "有斑点"], ["产奶", "有蹄", "有黑色条纹"], []):
+                self.assertEqual(self.engine.forward(facts, strategy), plain.forward(facts, strategy))
+                self.assertEqual(self.engine.forward(facts, strategy), plain.forward(facts, strategy))
+        self.assertEqual(self.engine.profile_stats()["forward"]["runs"], 24)
+
+    def test_cancelled_run_is_not_counted(self):
+        seen = []
+
+        def observer(rid):
+            seen.append(rid)
+            if len(seen) == 2:
+                raise Cancelled()
+
+        with self.assertRaises(Cancelled):
+            self.engine.forward(["有毛发", "吃肉", "黄褐色", "有斑点"], observer=observer)
+        self.assertEqual(seen, [0, 4])
+        self.assertEqual(self.engine.profile_stats()["forward"]["runs"], 0)
+        self.engine.forward(["有毛发"], observer=seen.append)
+        self.assertEqual(seen[-1], 0)
+
+    def test_backward(self):
+        self.engine.backward("企鹅")
+        backward = self.engine.profile_stats()["backward"]
+        self.assertEqual(backward["runs"], 1)
+        self.assertGreaterEqual(backward["max_depth"], 2)
+        self.assertGreaterEqual(backward["goals"], backward["max_depth"])
+        self.assertGreater(backward["rules_examined"], 0)
+
+    def test_disabled(self):
+        engine = InferenceEngine()
+        self.assertIsNone(engine.profile_stats())
+        network = engine.compile()
+        with mock.patch.object(network, "forward", wraps=network.forward) as forward:
+            engine.forward(["有羽毛", "善飞"])
+        self.assertIsNone(forward.call_args[0][3])  # 没有计时钩子
+
+    def test_export(self):
+        self.engine.forward(["有羽毛", "善飞"])
+        self.engine.delete_rule(13)
+        stats = self.engine.profile_stats()
+        self.assertIsNone(self.rows()[13]["rule"])
+        self.assertIn("信天翁", self.rows()[14]["rule"])
+        fp = io.StringIO()
+        export_json(stats, fp)
+        self.assertEqual(json.loads(fp.getvalue()), stats)
+        fp = io.StringIO()
+        export_csv(stats, fp)
+        rows = list(csv.DictReader(io.StringIO(fp.getvalue())))
+        self.assertEqual([row["rid"] for row in rows], ["2", "12", "13", "14"])
+        self.assertEqual(rows[1]["failed_on"], "不会飞:1")
+        self.assertEqual(rows[3]["checks"], "2")
+
+
+if __name__ == "__main__":
+    unittest.main()
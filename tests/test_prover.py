@@ -0,0 +1,135 @@
+import itertools
+import random
+import unittest
+
+from engine import InferenceEngine
+from kbgen import generate
+from prover import GoalProver
+from ranking import CandidateRanker
+from rulebase import RuleBase
+
+
+def _provable(engine, facts, target):
+    return target in engine.forward(sorted(facts))["facts"]
+
+
+class GoalProverTest(unittest.TestCase):
+    def test_proofs_are_minimal_and_complete(self):
+        # 基本特征少，可以穷举所有组合来核对
+        for seed in range(10):
+            rules, features, targets = generate(rules=30, depth=3, fan_in=2, alternatives=2, cycles=0.1,
+                                                base=6, seed=seed)
+            engine = InferenceEngine(rules, features, targets, optimize=False)
+            prover = GoalProver(engine.rules, features.values(), limit=1000)
+            names = list(features.values())
+            for target in targets:
+                proofs = prover.proofs(target)
+                for proof in proofs:
+                    self.assertTrue(_provable(engine, proof, target))
+                    for name in proof:
+                        self.assertFalse(_provable(engine, proof - {name}, target))
+                for size in range(len(names) + 1):
+                    for facts in itertools.combinations(names, size):
+                        expected = _provable(engine, facts, target)
+                        self.assertEqual(any(proof <= set(facts) for proof in proofs), expected)
+
+    def test_capped(self):
+        # 目标 T 的方案是 {a_i, b_j} 的全部 25 种组合
+        rules = [{"if": [f"a{i}"], "then": "A"} for i in range(5)]
+        rules += [{"if": [f"b{i}"], "then": "B"} for i in range(5)]
+        rules += [{"if": ["A", "B"], "then": "T"}, {"if": ["a0"], "then": "U"}]
+        features = {str(k): name for k, name in enumerate([f"a{i}" for i in range(5)] + [f"b{i}" for i in range(5)])}
+        prover = GoalProver(RuleBase(rules), features.values(), limit=20)
+        self.assertEqual(len(prover.proofs("T")), 20)
+        self.assertEqual(len(prover.proofs("U")), 1)
+        self.assertIn("T", prover.capped)
+        self.assertNotIn("U", prover.capped)
+        prover = GoalProver(RuleBase(rules), features.values(), limit=25)
+        self.assertEqual(len(prover.proofs("T")), 25)
+        self.assertNotIn("T", prover.capped)
+
+        engine = InferenceEngine(rules, features, ["T", "U"])
+        self.assertTrue(engine.backward("T")["capped"])
+        self.assertFalse(engine.backward("U")["capped"])
+        ranked = {item["target"]: item for item in CandidateRanker(engine.rules, features, ["T", "U"]).rank(["a0"])}
+        self.assertTrue(ranked["T"]["capped"])
+        self.assertFalse(ranked["U"]["capped"])
+
+
+class GoalProverEdgeCaseTest(unittest.TestCase):
+    def prover(self, rules, base=("a", "b", "c"), limit=20):
+        return GoalProver(RuleBase(rules), base, limit)
+
+    def test_base_and_unprovable_goals(self):
+        prover = self.prover([{"if": ["b"], "then": "a"}, {"if": ["x"], "then": "y"}])
+        self.assertEqual(prover.proofs("c"), [frozenset(["c"])])
+        # 基本特征也可以由规则推出，两种方案都保留
+        self.assertEqual(prover.proofs("a"), [frozenset(["a"]), frozenset(["b"])])
+        self.assertEqual(prover.proofs("y"), [])
+        self.assertEqual(prover.proofs("没有规则"), [])
+        self.assertEqual(prover.explain("y"), [{"rule": {"if": ["x"], "then": "y"}}, {"missing": "x"}])
+
+    def test_cycles(self):
+        rules = [
+            {"if": ["q"], "then": "p"},
+            {"if": ["p"], "then": "q"},
+            {"if": ["a"], "then": "q"},
+            {"if": ["p", "b"], "then": "r"},
+            {"if": ["s"], "then": "s"},
+        ]
+        prover = self.prover(rules)
+        self.assertEqual(prover.proofs("r"), [frozenset(["a", "b"])])
+        self.assertEqual(prover.proofs("p"), [frozenset(["a"])])
+        self.assertEqual(prover.proofs("s"), [])
+        self.assertEqual(prover.stack, {})
+        # 从循环的另一端开始求解，结果相同
+        self.assertEqual(self.prover(rules).proofs("q"), [frozenset(["a"])])
+
+    def test_memo_is_reused(self):
+        engine = InferenceEngine()
+        prover = GoalProver(engine.rules, engine.features.values())
+        prover.proofs("企鹅")
+        examined = prover.examined
+        prover.proofs("企鹅")
+        self.assertEqual(prover.examined, examined)
+        prover.proofs("鸵鸟")  # 鸟类 已在备忘录中
+        self.assertEqual(prover.examined, examined + 1)
+
+    def test_cancelled_search_keeps_memo_consistent(self):
+        engine = InferenceEngine()
+        prover = GoalProver(engine.rules, engine.features.values())
+        expected = GoalProver(engine.rules, engine.features.values()).proofs("虎")
+
+        def cancel(goal):
+            if goal == "哺乳类":
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            prover.proofs("虎", cancel)
+        self.assertNotIn("虎", prover.memo)
+        self.assertEqual(prover.stack, {})
+        self.assertEqual(prover.proofs("虎"), expected)
+
+    def test_capped_subgoal_marks_users(self):
+        rules = [{"if": [f"a{i}"], "then": "A"} for i in range(4)]
+        rules += [{"if": ["A"], "then": "T"}, {"if": ["b"], "then": "T"}]
+        prover = self.prover(rules, base=["a0", "a1", "a2", "a3", "b"], limit=2)
+        self.assertEqual(prover.proofs("T"), [frozenset(["a0"]), frozenset(["a1"])])
+        self.assertEqual(prover.capped, {"A", "T"})
+        prover.reset()
+        self.assertEqual((prover.memo, prover.capped), ({}, set()))
+
+    def test_engine_after_edit(self):
+        engine = InferenceEngine()
+        expected = engine.backward("信天翁")["proofs"]
+        self.assertEqual(len(expected), 2)
+        rid = engine.add_rule({"if": ["善飞"], "then": "鸟类"})
+        self.assertEqual(engine.backward("信天翁")["proofs"], [["善飞"]])  # 其他方案都包含它
+        engine.delete_rule(rid)
+        self.assertEqual(engine.backward("信天翁")["proofs"], expected)
+        result = engine.backward("信天翁", limit=1)
+        self.assertEqual((result["proofs"], result["capped"]), (expected[:1], True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import random
+import unittest
+
+from benchmark import chain_rules, naive_forward
+from engine import InferenceEngine
+from kbgen import generate
+from rete import STRATEGIES, Cancelled, ReteNetwork
+
+
+class MatchNetworkTest(unittest.TestCase):
+    def check(self, engine, rules, facts):
+        # order 策略与原来的逐轮扫描触发顺序相同，其他策略推出的事实集合相同
+        expected, fired = naive_forward(rules, facts)
+        result = engine.forward(facts)
+        self.assertEqual(result["facts"], expected)
+        self.assertEqual(result["trace"], [rules[i] for i in fired])
+        for strategy in STRATEGIES:
+            self.assertEqual(set(engine.forward(facts, strategy)["facts"]), set(expected))
+
+    def test_matches_naive_loop(self):
+        for seed in range(10):
+            rng = random.Random(seed)
+            rules, features, targets = generate(rules=150, depth=4, alternatives=2, cycles=0.1, base=20, seed=seed)
+            engine = InferenceEngine(rules, features, targets, optimize=False)
+            names = list(features.values())
+            for _ in range(10):
+                self.check(engine, rules, rng.sample(names, rng.randint(0, 12)))
+
+    def test_deep_chains(self):
+        rules, facts = chain_rules(depth=30, width=5)
+        self.check(InferenceEngine(rules, {}, [], optimize=False), rules, facts)
+
+    def test_after_edits(self):
+        # 增删规则后网络逐条更新，结果与按当前规则重新扫描相同
+        rng = random.Random(0)
+        rules, features, targets = generate(rules=200, depth=4, alternatives=2, cycles=0.1, base=20)
+        engine = InferenceEngine(rules[:100], features, targets, optimize=False)
+        names = list(features.values())
+        for _ in range(20):
+            engine.add_rules(rng.sample(rules, 3))
+            engine.delete_rules(rng.sample(list(engine.rules.ids()), 3))
+            current = list(engine.rules)
+            for _ in range(5):
+                self.check(engine, current, rng.sample(names, 8))
+
+
+class ReteNetworkTest(unittest.TestCase):
+    def test_unconditional_rules(self):
+        network = ReteNetwork([{"if": [], "then": "a"}, {"if": ["a"], "then": "b"}, {"if": [], "then": "c"}])
+        self.assertEqual(network.run([]), (["a", "b", "c"], [0, 1, 2]))
+        for strategy in STRATEGIES:
+            self.assertEqual(set(network.run([], strategy)[0]), {"a", "b", "c"}, strategy)
+        # 结论已经是初始事实的规则不触发
+        self.assertEqual(network.run(["c"]), (["c", "a", "b"], [0, 1]))
+
+    def test_repeated_premise(self):
+        network = ReteNetwork([{"if": ["a", "a"], "then": "b"}, {"if": ["b", "a", "b"], "then": "c"}])
+        self.assertEqual(network.run(["a"]), (["a", "b", "c"], [0, 1]))
+        self.assertEqual(network.run(["a", "a"])[1], [0, 1])
+
+    def test_unknown_names_and_strategy(self):
+        network = ReteNetwork([{"if": ["a"], "then": "b"}])
+        self.assertEqual(network.run(["x", "a"]), (["x", "a", "b"], [0]))
+        self.assertEqual(network.run([], stop=["x"]), ([], []))
+        with self.assertRaises(ValueError):
+            network.run(["a"], "fifo")
+
+    def test_stop(self):
+        rules = [{"if": ["a"], "then": "b"}, {"if": ["a"], "then": "c"}, {"if": ["b"], "then": "d"}]
+        network = ReteNetwork(rules)
+        self.assertEqual(network.run(["a"], stop=["b"]), (["a", "b"], [0]))
+        self.assertEqual(network.run(["a"], "specificity", stop=["c", "d"]), (["a", "b", "c"], [0, 1]))
+        self.assertEqual(network.run(["b"], stop=["b"]), (["b", "d"], [2]))  # 初始事实不算推出
+
+    def test_cancelled_then_reused(self):
+        network = ReteNetwork([{"if": ["a"], "then": "b"}, {"if": ["b"], "then": "c"}])
+
+        def cancel(rid):
+            raise Cancelled()
+
+        for strategy in ("order", "salience"):
+            with self.assertRaises(Cancelled):
+                network.run(["a"], strategy, observer=cancel)
+        self.assertEqual(network.run(["a"]), (["a", "b", "c"], [0, 1]))
+
+    def test_edits(self):
+        rules = [{"if": ["a"], "then": "b"}, {"if": ["b", "x"], "then": "c"}, {"if": ["b"], "then": "d"}]
+        network = ReteNetwork(rules)
+        network.remove(0, rules[0])
+        self.assertEqual(network.run(["a", "x"]), (["a", "x"], []))
+        self.assertEqual(network.examined, 1)  # 只有以 x 为前提的规则被访问
+        network.add(3, {"if": ["a"], "then": "b", "salience": 5})
+        self.assertEqual(network.run(["a", "x"]), (["a", "x", "b", "c", "d"], [3, 1, 2]))
+        self.assertEqual(network.examined, 3)
+        # 规则 2 要等下一轮扫描，此前 d 已由规则 4 推出；salience 策略下规则 4 最先触发
+        network.add(4, {"if": ["a"], "then": "d", "salience": 9})
+        self.assertEqual(network.run(["a"])[1], [3, 4])
+        self.assertEqual(network.run(["a"], "salience")[1], [4, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,257 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import kbfile
+from compiler import rule_parts
+from engine import InferenceEngine
+from kbgen import generate
+from rulebase import BITS, RuleBase
+
+
+def _index(entries):
+    return {symbol: list(bucket) for symbol, bucket in entries if bucket}
+
+
+def _expected_index(model):
+    conclusions, premises = {}, {}
+    for rid, rule in sorted(model.items()):
+        body, head = rule_parts(rule)
+        conclusions.setdefault(head, []).append(rid)
+        for name in dict.fromkeys(body):
+            premises.setdefault(name, []).append(rid)
+    return conclusions, premises
+
+
+class RuleBaseTest(unittest.TestCase):
+    def assertMatches(self, base, model):
+        self.assertEqual(list(base.items()), sorted(model.items()))
+        self.assertEqual(len(base), len(model))
+        self.assertEqual(base.max_id(), max(model, default=-1))
+        conclusions, premises = _expected_index(model)
+        self.assertEqual(_index(base.by_conclusion.items()), conclusions)
+        self.assertEqual(_index(base.by_premise.items()), premises)
+
+    def assertDiff(self, changes, old, new):
+        self.assertEqual(changes["added"], sorted((rid, rule) for rid, rule in new.items() if rid not in old))
+        self.assertEqual(changes["removed"], sorted((rid, rule) for rid, rule in old.items() if rid not in new))
+
+    def test_against_reference_model(self):
+        # 参照模型：当前版本是一个字典，撤销 / 重做历史是字典的列表
+        for seed in range(5):
+            rng = random.Random(seed)
+            rules, _, _ = generate(rules=400, depth=4, alternatives=2, base=30, seed=seed)
+            base = RuleBase(rules[:100])
+            model = dict(enumerate(rules[:100]))
+            next_id = 100
+            undo, redo = [], []
+            copies = []
+            for _ in range(300):
+                op = rng.random()
+                if op < 0.3:
+                    base.checkpoint()
+                    undo.append(dict(model))
+                    redo.clear()
+                    for _ in range(rng.randint(1, 20)):
+                        rule = rng.choice(rules)
+                        self.assertEqual(base.add(rule), next_id)
+                        model[next_id] = rule
+                        next_id += 1
+                elif op < 0.5 and model:
+                    base.checkpoint()
+                    undo.append(dict(model))
+                    redo.clear()
+                    for rid in rng.sample(sorted(model), min(len(model), rng.randint(1, 20))):
+                        self.assertEqual(base.remove(rid), model.pop(rid))
+                elif op < 0.7:
+                    changes = base.undo()
+                    if not undo:
+                        self.assertIsNone(changes)
+                        continue
+                    redo.append(model)
+                    model, old = undo.pop(), model
+                    self.assertDiff(changes, old, model)
+                elif op < 0.85:
+                    changes = base.redo()
+                    if not redo:
+                        self.assertIsNone(changes)
+                        continue
+                    undo.append(model)
+                    model, old = redo.pop(), model
+                    self.assertDiff(changes, old, model)
+                else:
+                    copies.append((base.copy(), dict(model)))
+                self.assertMatches(base, model)
+            # 副本固定在复制时的版本，之后的修改和撤销都不影响它
+            for copy, expected in copies:
+                self.assertMatches(copy, expected)
+                self.assertDiff(copy.diff(base), expected, model)
+                self.assertDiff(base.diff(copy), model, expected)
+
+    def test_unchecked_edit_clears_redo(self):
+        base = RuleBase([{"if": ["a"], "then": "b"}])
+        base.checkpoint()
+        base.add({"if": ["b"], "then": "c"})
+        self.assertIsNotNone(base.undo())
+        self.assertTrue(base.can_redo)
+        base.add({"if": ["c"], "then": "d"})
+        self.assertFalse(base.can_redo)
+        self.assertIsNone(base.redo())
+
+
+class EngineUndoTest(unittest.TestCase):
+    def test_forward_after_undo_redo(self):
+        # 每次切换版本后，引擎的推理结果与按当前规则新建的引擎相同（优化后只比较事实集合）
+        for seed in range(3):
+            rng = random.Random(seed)
+            rules, features, targets = generate(rules=200, depth=4, alternatives=2, cycles=0.05, base=20, seed=seed)
+            names = list(features.values())
+            queries = [rng.sample(names, 6) for _ in range(10)]
+            for optimize in (False, True):
+                engine = InferenceEngine(rules[:120], features, targets, optimize=optimize)
+                for _ in range(20):
+                    op = rng.random()
+                    if op < 0.3:
+                        engine.add_rules(rng.sample(rules, 5))
+                    elif op < 0.5:
+                        engine.delete_rules(rng.sample(list(engine.rules.ids()), 5))
+                    elif op < 0.75:
+                        engine.undo()
+                    else:
+                        engine.redo()
+                    fresh = InferenceEngine(list(engine.rules), features, targets)
+                    for facts in queries:
+                        for strategy in ("order", "recency"):
+                            result, expected = engine.forward(facts, strategy), fresh.forward(facts, strategy)
+                            if optimize:
+                                self.assertEqual(set(result["facts"]), set(expected["facts"]))
+                                continue
+                            self.assertEqual(result["facts"], expected["facts"])
+                            self.assertEqual(result["trace"], expected["trace"])
+
+
+class HistoryBoundaryTest(unittest.TestCase):
+    RULE = {"if": ["a"], "then": "b"}
+
+    def test_empty_history(self):
+        base = RuleBase([self.RULE])
+        self.assertFalse(base.can_undo or base.can_redo)
+        self.assertIsNone(base.undo())
+        self.assertIsNone(base.redo())
+        self.assertEqual(list(base.items()), [(0, self.RULE)])
+
+    def test_undo_to_the_first_version_and_back(self):
+        base = RuleBase([self.RULE])
+        versions = [base.version]
+        for name in "cde":
+            base.checkpoint()
+            base.add({"if": ["b"], "then": name})
+            versions.append(base.version)
+        for expected in reversed(versions[:-1]):
+            self.assertIsNotNone(base.undo())
+            self.assertEqual(base.version, expected)
+        self.assertIsNone(base.undo())
+        self.assertEqual(list(base.ids()), [0])
+        for expected in versions[1:]:
+            self.assertIsNotNone(base.redo())
+            self.assertEqual(base.version, expected)
+        self.assertIsNone(base.redo())
+        self.assertEqual(list(base.ids()), [0, 1, 2, 3])
+
+    def test_history_limit(self):
+        with mock.patch("rulebase.HISTORY_LIMIT", 3):
+            base = RuleBase()
+        for i in range(5):
+            base.checkpoint()
+            base.add({"if": ["a"], "then": f"x{i}"})
+        undone = 0
+        while base.undo() is not None:
+            undone += 1
+        self.assertEqual(undone, 3)
+        self.assertEqual(list(base.ids()), [0, 1])  # 最早的两个版本已经不在历史里
+
+    def test_ids_and_versions_are_not_reused(self):
+        base = RuleBase([self.RULE])
+        base.checkpoint()
+        rid = base.add({"if": ["b"], "then": "c"})
+        version = base.version
+        base.undo()
+        self.assertEqual(base.add({"if": ["b"], "then": "d"}), rid + 1)
+        self.assertGreater(base.version, version)
+        self.assertFalse(base.can_redo)
+
+    def test_invalid_ids(self):
+        base = RuleBase([self.RULE])
+        for rid in (1, -1, "0", None, 1 << 40):
+            self.assertNotIn(rid, base)
+            with self.assertRaises(KeyError):
+                base[rid]
+        base.remove(0)
+        with self.assertRaises(KeyError):
+            base.remove(0)
+        self.assertEqual((len(base), base.max_id()), (0, -1))
+
+    def test_copy_has_no_history(self):
+        base = RuleBase([self.RULE])
+        base.checkpoint()
+        base.add({"if": ["b"], "then": "c"})
+        copy = base.copy()
+        self.assertIsNone(copy.undo())
+        copy.remove(0)
+        self.assertEqual(list(base.ids()), [0, 1])
+        self.assertEqual(copy.diff(base), {"added": [(0, self.RULE)], "removed": []})
+        self.assertEqual(base.diff(base.copy()), {"added": [], "removed": []})
+
+    def test_diff_across_tree_heights(self):
+        base = RuleBase([self.RULE])
+        small = base.copy()
+        rules = [{"if": ["a"], "then": f"x{i}"} for i in range(1 << BITS)]
+        for rule in rules:
+            base.add(rule)
+        base.remove(0)
+        self.assertEqual(small.diff(base), {"added": list(enumerate(rules, 1)), "removed": [(0, self.RULE)]})
+        self.assertEqual(base.diff(small)["added"], [(0, self.RULE)])
+
+
+class EngineHistoryBoundaryTest(unittest.TestCase):
+    def test_nothing_to_undo(self):
+        engine = InferenceEngine()
+        self.assertIsNone(engine.undo())
+        self.assertIsNone(engine.redo())
+        engine.add_rules([])
+        engine.delete_rules([])
+        self.assertIsNone(engine.undo())
+        self.assertEqual(len(engine.rules), 15)
+
+    def test_undo_restores_forward_result(self):
+        engine = InferenceEngine()
+        expected = engine.forward(["有羽毛", "善飞"])
+        engine.delete_rules([2, 14])
+        self.assertIsNone(engine.forward(["有羽毛", "善飞"])["animal"])
+        changes = engine.undo()
+        self.assertEqual([rid for rid, _ in changes["added"]], [2, 14])
+        self.assertEqual(engine.forward(["有羽毛", "善飞"]), expected)
+        self.assertIsNone(engine.undo())
+        self.assertEqual([rid for rid, _ in engine.redo()["removed"]], [2, 14])
+        self.assertIsNone(engine.redo())
+
+    def test_mapped_rule_base(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "animals.kb")
+            InferenceEngine().save(path)
+            engine = InferenceEngine.load(kbfile.compiled_path(path))
+            self.assertIsNone(engine.undo())
+            engine.delete_rule(14)
+            self.assertIsNone(engine.forward(["有羽毛", "善飞"])["animal"])
+            engine.undo()
+            self.assertEqual(engine.forward(["有羽毛", "善飞"])["animal"], "信天翁")
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
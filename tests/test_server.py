@@ -0,0 +1,123 @@
+import asyncio
+import json
+import unittest
+
+from engine import InferenceEngine, handle_record
+from server import MicroBatcher, handle_connection
+
+
+class MicroBatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = InferenceEngine()
+
+    def test_closure_matches_forward(self):
+        batcher = MicroBatcher(self.engine)
+        observations = [["有毛发", "吃肉", "黄褐色", "有斑点"], ["3", "20"], ["产奶", "有蹄", "有黑色条纹"], []]
+        records = [{"id": i, "mode": "closure", "features": facts} for i, facts in enumerate(observations)]
+        results = batcher._process(records)
+        for i, (facts, result) in enumerate(zip(observations, results)):
+            expected = self.engine.forward(self.engine.resolve(facts))
+            self.assertEqual(result["id"], i)
+            self.assertEqual(set(result["derived"]), set(expected["derived"]))
+            self.assertEqual(result["animal"], expected["animal"])
+            self.assertEqual(result, {"id": i, **handle_record(self.engine, records[i])})
+
+    def test_errors_keep_ids(self):
+        batcher = MicroBatcher(self.engine)
+        records = [
+            {"id": "a", "mode": "closure", "features": "有毛发"},
+            {"id": "b", "mode": "closure", "features": ["有羽毛", "善飞"]},
+            {"id": "c", "mode": "nonsense"},
+            {"id": "d", "features": ["有羽毛", "善飞"]},
+        ]
+        results = batcher._process(records)
+        self.assertEqual([result["id"] for result in results], ["a", "b", "c", "d"])
+        self.assertIn("error", results[0])
+        self.assertEqual(results[1]["animal"], "信天翁")
+        self.assertIn("error", results[2])
+        self.assertEqual(results[3]["trace"], self.engine.forward(["有羽毛", "善飞"])["trace"])
+
+    def test_default_mode(self):
+        batcher = MicroBatcher(self.engine, mode="closure")
+        result = batcher._process([["有羽毛", "善飞"]])[0]
+        self.assertEqual(result["animal"], "信天翁")
+        self.assertEqual(set(result["derived"]), {"鸟类", "信天翁"})
+        self.assertNotIn("trace", result)
+
+    def test_connection_keeps_order(self):
+        async def scenario():
+            batcher = MicroBatcher(self.engine, max_wait=0.01)
+            runner = asyncio.create_task(batcher.run())
+            server = await asyncio.start_server(
+                lambda reader, writer: handle_connection(batcher, reader, writer), "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            lines = [
+                {"id": 1, "features": ["有羽毛", "善飞"]},
+                {"id": 2, "mode": "closure", "features": ["有毛发", "有蹄", "有黑色条纹"]},
+                {"id": 3, "mode": "backward", "target": "企鹅"},
+            ]
+            for line in lines:
+                writer.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+            writer.write(b"not json\n")
+            await writer.drain()
+            replies = [json.loads(await reader.readline()) for _ in range(4)]
+            writer.close()
+            server.close()
+            runner.cancel()
+            return replies
+
+        replies = asyncio.run(scenario())
+        self.assertEqual([reply.get("id") for reply in replies], [1, 2, 3, None])
+        self.assertEqual(replies[0]["animal"], "信天翁")
+        self.assertEqual(replies[1]["animal"], "斑马")
+        self.assertTrue(replies[2]["proofs"])
+        self.assertIn("error", replies[3])
+
+
+class HandleRecordTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = InferenceEngine()
+
+    def test_k_must_be_positive_int(self):
+        for mode in ("rank", "cf"):
+            record = {"mode": mode, "features": ["有毛发"], "k": 2}
+            self.assertLessEqual(len(handle_record(self.engine, record)["candidates"]), 2)
+            for k in (0, -1, 1.5, "3", True, None):
+                with self.assertRaisesRegex(ValueError, "k 应为正整数"):
+                    handle_record(self.engine, {**record, "k": k})
+
+    def test_limit_must_be_positive_int(self):
+        self.assertTrue(handle_record(self.engine, {"mode": "backward", "target": "企鹅", "limit": 1})["proofs"])
+        with self.assertRaisesRegex(ValueError, "limit 应为正整数"):
+            handle_record(self.engine, {"mode": "backward", "target": "企鹅", "limit": 0})
+
+    def test_features_must_be_string_list(self):
+        message = "features 应为特征名称或编号的列表"
+        for mode in ("forward", "closure", "classify", "rank"):
+            for features in ("有毛发", ["有毛发", 1], {"有毛发": 1}, None):
+                with self.assertRaisesRegex(TypeError, message):
+                    handle_record(self.engine, {"mode": mode, "features": features})
+        with self.assertRaisesRegex(TypeError, "absent 应为"):
+            handle_record(self.engine, {"mode": "rank", "features": [], "absent": "善飞"})
+        for features in ("有毛发", [["有毛发"]], {"有毛发": "高"}, {"有毛发": True}):
+            with self.assertRaisesRegex(TypeError, "features 应为"):
+                handle_record(self.engine, {"mode": "cf", "features": features})
+        self.assertTrue(handle_record(self.engine, {"mode": "cf", "features": ["有毛发", ["吃肉", 0.5]]}))
+        with self.assertRaisesRegex(TypeError, "target 应为"):
+            handle_record(self.engine, {"mode": "backward", "target": ["企鹅"]})
+
+    def test_same_error_in_every_mode(self):
+        records = [{"id": mode, "mode": mode, "features": "有毛发"} for mode in ("forward", "closure", "classify")]
+        results = MicroBatcher(self.engine)._process(records)
+        self.assertEqual(results, [{"id": mode, "error": "features 应为特征名称或编号的列表"}
+                                   for mode in ("forward", "closure", "classify")])
+
+    def test_error_reply(self):
+        result = MicroBatcher(self.engine)._process([{"id": 7, "mode": "cf", "features": ["有毛发"], "k": 0}])[0]
+        self.assertEqual(result["id"], 7)
+        self.assertIn("k 应为正整数", result["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
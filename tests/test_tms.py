@@ -0,0 +1,129 @@
+import random
+import unittest
+
+from compiler import rule_parts
+from engine import InferenceEngine
+from kbgen import generate
+
+
+class TruthMaintenanceTest(unittest.TestCase):
+    def check(self, engine, result, base, before):
+        # 与从当前基本事实重新做一次正向推理的结果相同
+        expected = set(engine.forward(sorted(base))["facts"])
+        facts = set(result["facts"])
+        self.assertEqual(facts, expected)
+        # added 只含新推出的结论，removed 含撤回的基本事实本身
+        self.assertEqual(facts - base, (before | set(result["added"])) - set(result["removed"]) - base)
+        self.assertEqual(result["animal"] is None, not expected & set(engine.animal_targets))
+        # 每个推导结论的依据规则的前提都成立
+        self.assertEqual(len(result["trace"]), len(facts - base))
+        for rule in result["trace"]:
+            premises, conclusion = rule_parts(rule)
+            self.assertIn(conclusion, facts)
+            self.assertTrue(set(premises) <= facts)
+        return facts
+
+    def test_toggles_match_full_forward(self):
+        for seed in range(10):
+            rng = random.Random(seed)
+            rules, features, targets = generate(rules=150, depth=4, alternatives=3, cycles=0.2, base=15, seed=seed)
+            engine = InferenceEngine(rules, features, targets, optimize=False)
+            names = list(features.values())
+            base = set(rng.sample(names, 5))
+            facts = self.check(engine, engine.reset_facts(sorted(base)), base, set())
+            for _ in range(100):
+                name = rng.choice(names)
+                present = name not in base
+                base = base | {name} if present else base - {name}
+                facts = self.check(engine, engine.toggle_fact(name, present), base, facts)
+
+    def test_derived_fact_asserted_and_retracted(self):
+        engine = InferenceEngine([{"if": ["a"], "then": "b"}, {"if": ["b"], "then": "c"},
+                                  {"if": ["c"], "then": "b"}], {"1": "a", "2": "b"}, [])
+        facts = self.check(engine, engine.reset_facts(["a"]), {"a"}, set())
+        facts = self.check(engine, engine.toggle_fact("b", True), {"a", "b"}, facts)
+        facts = self.check(engine, engine.toggle_fact("a", False), {"b"}, facts)
+        # b 和 c 互为依据，撤回 b 之后都不能留下
+        self.check(engine, engine.toggle_fact("b", False), set(), facts)
+
+    def test_after_rule_edits(self):
+        rng = random.Random(0)
+        rules, features, targets = generate(rules=200, depth=4, alternatives=2, cycles=0.1, base=15)
+        engine = InferenceEngine(rules[:100], features, targets, optimize=False)
+        names = list(features.values())
+        base = set(rng.sample(names, 6))
+        engine.reset_facts(sorted(base))
+        for _ in range(10):
+            engine.add_rules(rng.sample(rules, 5))
+            before = set(engine.reset_facts(sorted(base))["facts"])
+            name = rng.choice(names)
+            present = name not in base
+            base = base | {name} if present else base - {name}
+            self.check(engine, engine.toggle_fact(name, present), base, before)
+
+
+class TruthMaintenanceEdgeCaseTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = InferenceEngine([
+            {"if": ["a"], "then": "b"},
+            {"if": ["c"], "then": "b"},
+            {"if": ["b", "d"], "then": "e"},
+            {"if": [], "then": "f"},
+        ], {"1": "a", "2": "c", "3": "d"}, ["e"])
+
+    def justification(self, result, fact):
+        return next(rule for rule in result["trace"] if rule_parts(rule)[1] == fact)
+
+    def test_toggle_without_reset(self):
+        result = self.engine.toggle_fact("a", True)
+        self.assertEqual(result["added"], ["b"])
+        self.assertEqual(result["facts"], ["a", "f", "b"])
+
+    def test_repeated_and_unknown_toggles(self):
+        self.engine.reset_facts(["a"])
+        self.assertEqual(self.engine.toggle_fact("a", True)["added"], [])
+        result = self.engine.toggle_fact("c", False)  # 没有断言过
+        self.assertEqual((result["removed"], result["facts"]), ([], ["a", "f", "b"]))
+        self.assertEqual(self.engine.toggle_fact("未知", True)["added"], [])
+        self.assertEqual(self.engine.toggle_fact("未知", False)["removed"], ["未知"])
+
+    def test_alternative_justification(self):
+        result = self.engine.reset_facts(["a", "c", "d"])
+        self.assertEqual(result["animal"], "e")
+        self.assertEqual(self.justification(result, "b"), {"if": ["a"], "then": "b"})
+        result = self.engine.toggle_fact("a", False)
+        self.assertEqual(result["removed"], ["a"])
+        self.assertEqual(self.justification(result, "b"), {"if": ["c"], "then": "b"})
+        self.assertEqual(result["animal"], "e")
+        result = self.engine.toggle_fact("c", False)
+        self.assertEqual(set(result["removed"]), {"c", "b", "e"})
+        self.assertIsNone(result["animal"])
+
+    def test_derived_fact_becomes_base(self):
+        self.engine.reset_facts(["a", "d"])
+        result = self.engine.toggle_fact("b", True)
+        self.assertEqual(result["added"], [])
+        self.assertEqual(len(result["trace"]), 2)  # 只剩 f 和 e 的依据
+        result = self.engine.toggle_fact("b", False)
+        self.assertEqual(result["removed"], [])  # 仍可由 a 推出
+        self.assertEqual(self.justification(result, "b"), {"if": ["a"], "then": "b"})
+        self.assertIn("e", result["facts"])
+
+    def test_unconditional_conclusion(self):
+        result = self.engine.reset_facts([])
+        self.assertEqual(result["facts"], ["f"])
+        self.assertEqual(self.engine.toggle_fact("f", True)["added"], [])
+        self.assertEqual(self.engine.toggle_fact("f", False)["removed"], [])
+        self.assertEqual(self.engine.toggle_fact("f", False)["facts"], ["f"])
+
+    def test_deleted_rule_withdraws_conclusions(self):
+        self.engine.reset_facts(["a", "d"])
+        self.engine.delete_rule(0)
+        result = self.engine.toggle_fact("c", False)
+        self.assertEqual(result["facts"], ["a", "d", "f"])
+        self.engine.undo()
+        self.assertEqual(set(self.engine.toggle_fact("d", True)["facts"]), {"a", "d", "f", "b", "e"})
+
+
+if __name__ == "__main__":
+    unittest.main()
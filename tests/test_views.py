@@ -0,0 +1,214 @@
+import os
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication
+
+from engine import InferenceEngine, parse_rules
+from views import TRACE_KINDS, FeatureSelector, RuleListModel, TraceView
+
+app = QApplication.instance() or QApplication([])
+
+
+class TraceViewTest(unittest.TestCase):
+    def setUp(self):
+        self.view = TraceView()
+        self.view.append("=== 正向推理过程 ===", "header")
+        self.view.append("初始事实: 有羽毛 ∧ 善飞", "fact")
+        self.view.extend([("rule", "规则 3: ", {"if": ["有羽毛"], "then": "鸟类"}),
+                          ("rule", "规则 15: ", {"if": ["鸟类", "善飞"], "then": "信天翁"})])
+        self.view.append("\n=== 推理结果 ===", "header")
+        self.view.append("识别结果: 信天翁", "result")
+        self.view.append("（共 2 条规则）")
+
+    def rows(self):
+        model = self.view.model
+        return [model.data(model.index(row)) for row in range(model.rowCount())]
+
+    def select_kind(self, kind):
+        self.view.kind_combo.setCurrentIndex(self.view.kind_combo.findData(kind))
+
+    def test_every_kind_is_filterable(self):
+        kinds = {record[0] for record in self.view.model.records}
+        self.assertLessEqual(kinds, set(TRACE_KINDS))
+        for kind in kinds:
+            self.select_kind(kind)
+            self.assertGreater(len(self.rows()), 0, kind)
+        self.select_kind("info")
+        self.assertEqual(self.rows(), ["（共 2 条规则）"])
+
+    def test_multiline_text_and_rules(self):
+        lines = self.view.lines()
+        self.assertEqual(len(lines), 8)
+        self.assertEqual(lines[4:6], ["", "=== 推理结果 ==="])
+        self.assertTrue(lines[2].startswith("规则 3: "))
+        self.assertIn("鸟类", lines[2])
+        self.assertEqual(self.view.count_label.text(), "8 行")
+
+    def test_filters_combine(self):
+        self.select_kind("rule")
+        self.assertEqual(len(self.rows()), 2)
+        self.view.filter_input.setText("信天翁")
+        self.assertEqual(len(self.rows()), 1)
+        self.assertEqual(self.view.count_label.text(), "1/8")
+        self.view.append("规则 16: 信天翁", "fact")
+        self.view.extend([("rule", "规则 17: 信天翁", None)])
+        self.assertEqual(self.rows()[-1], "规则 17: 信天翁")
+        self.assertEqual(len(self.rows()), 2)
+        self.select_kind(None)
+        self.view.filter_input.setText("")
+        self.assertIsNone(self.view.model.visible)
+        self.assertEqual(len(self.rows()), 10)
+
+    def test_find_wraps_around(self):
+        self.view.search_input.setText("===")
+        self.view.find_next()
+        self.assertEqual(self.view.list_view.currentIndex().row(), 0)
+        self.view.find_next()
+        self.assertEqual(self.view.list_view.currentIndex().row(), 5)
+        self.view.find_next()
+        self.assertEqual(self.view.list_view.currentIndex().row(), 0)
+        self.view.find_previous()
+        self.assertEqual(self.view.list_view.currentIndex().row(), 5)
+        self.view.search_input.setText("没有这一行")
+        self.view.find_next()
+        self.assertEqual(self.view.list_view.currentIndex().row(), 5)
+
+    def test_clear_keeps_filter(self):
+        self.select_kind("header")
+        self.view.clear()
+        self.assertEqual(self.rows(), [])
+        self.view.append("=== 咨询 ===", "header")
+        self.view.append("有羽毛？ 是", "fact")
+        self.assertEqual(self.rows(), ["=== 咨询 ==="])
+        self.assertEqual(self.view.model.data(self.view.model.index(0), Qt.ForegroundRole).name(), "#1565c0")
+
+
+class RuleListModelTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = InferenceEngine()
+        self.model = RuleListModel(self.engine.rules)
+
+    def rids(self):
+        return [self.model.data(self.model.index(row), Qt.UserRole) for row in range(self.model.rowCount())]
+
+    def test_rows_are_rule_ids(self):
+        self.assertEqual(self.rids(), list(range(15)))
+        self.assertIn("信天翁", self.model.data(self.model.index(14)))
+        self.assertIsNone(self.model.data(self.model.index(15)))
+
+    def test_filter_by_field(self):
+        self.model.set_filter("哺乳类", "premise")
+        self.assertEqual(self.rids(), [4, 6, 7, 8, 9])
+        self.model.set_filter("哺乳类", "conclusion")
+        self.assertEqual(self.rids(), [0, 1])
+        self.model.set_filter(" 哺乳类 ")
+        self.assertEqual(self.rids(), [0, 1, 4, 6, 7, 8, 9])
+        self.model.set_filter("")
+        self.assertEqual(len(self.rids()), 15)
+
+    def test_narrowing_only_scans_previous_rows(self):
+        self.model.set_filter("鸟", "all")
+        self.assertEqual(self.rids(), [2, 3, 12, 13, 14])
+        scanned = []
+        matches = self.model._matches
+        self.model._matches = lambda rid, *args: scanned.append(rid) or matches(rid, *args)
+        self.model.set_filter("鸟类 ", "all")
+        self.assertEqual(scanned, [2, 3, 12, 13, 14])
+        scanned.clear()
+        self.model.set_filter("鸟类", "premise")  # 换了字段，重新扫描
+        self.assertEqual(len(scanned), 15)
+        self.assertEqual(self.rids(), [12, 13, 14])
+
+    def test_refresh_after_bulk_edit(self):
+        self.model.set_filter("蝙蝠", "conclusion")
+        self.assertEqual(self.rids(), [])
+        rules, errors = parse_rules(["有毛发 善飞，蝙蝠", "", "# 注释", "善飞，", "会下蛋 会飞，蝙蝠"])
+        self.assertEqual(errors, ["第 4 行: 缺少结论"])
+        added = self.engine.add_rules(rules)
+        self.model.refresh()
+        self.assertEqual(self.rids(), added)
+        self.engine.delete_rules([0, added[0]])
+        self.model.refresh()
+        self.assertEqual(self.rids(), added[1:])
+        self.engine.undo()
+        self.model.set_filter("")
+        self.assertEqual(self.rids(), list(range(15)) + added)
+
+    def test_duplicates_in_import(self):
+        rules, _ = parse_rules(["有羽毛，鸟类", "有羽毛 会游泳，鸟类", "会游泳，水禽", "会游泳 黑白二色，水禽"])
+        messages = self.engine.find_duplicates(rules)
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(messages[0].startswith("第 1 条: 重复"))
+        self.assertTrue(messages[1].startswith("第 2 条: 被已有规则包含"))
+        self.assertTrue(messages[2].startswith("第 4 条: 被已有规则包含"))
+
+
+class FeatureSelectorTest(unittest.TestCase):
+    def setUp(self):
+        self.selector = FeatureSelector()
+        self.selector.set_features(InferenceEngine().features)
+        self.toggled = []
+        self.selector.model.toggled.connect(lambda name, present: self.toggled.append((name, present)))
+
+    def shown(self):
+        proxy = self.selector.proxy
+        return [proxy.data(proxy.index(row, 0), Qt.UserRole) for row in range(proxy.rowCount())]
+
+    def check(self, name, state=Qt.Checked):
+        model = self.selector.model
+        return model.setData(model.index(model.names.index(name)), state, Qt.CheckStateRole)
+
+    def test_same_names_share_a_row(self):
+        model = self.selector.model
+        self.assertEqual(len(model.names), len(set(InferenceEngine().features.values())))
+        self.assertEqual(model.labels[model.names.index("不会飞")], "4/17: 不会飞")
+        self.assertEqual(self.selector.count_label.text(), f"{len(model.names)} 个，已选 0")
+
+    def test_check_and_toggle_signal(self):
+        self.assertTrue(self.check("善飞"))
+        self.assertTrue(self.check("有羽毛"))
+        self.assertTrue(self.check("善飞"))  # 状态不变时不再通知
+        self.assertEqual(self.selector.checked_features(), ["有羽毛", "善飞"])
+        self.assertTrue(self.check("善飞", Qt.Unchecked))
+        self.assertEqual(self.toggled, [("善飞", True), ("有羽毛", True), ("善飞", False)])
+        self.assertFalse(self.selector.model.setData(self.selector.model.index(0), Qt.Checked, Qt.EditRole))
+
+    def test_search_keeps_checked_features(self):
+        self.check("有羽毛")
+        self.selector.search_input.setText("黑")
+        self.assertEqual(self.shown(), ["有黑色条纹", "黑白二色"])
+        self.assertEqual(self.selector.count_label.text(), f"2/{self.selector.model.rowCount()}，已选 1")
+        self.selector.search_input.setText("17")
+        self.assertEqual(self.shown(), ["不会飞"])
+        self.assertEqual(self.selector.checked_features(), ["有羽毛"])
+        self.selector.search_input.setText("")
+        self.assertEqual(len(self.shown()), self.selector.model.rowCount())
+
+    def test_disable_is_one_state_change(self):
+        changes = []
+        self.selector.model.dataChanged.connect(lambda *args: changes.append(args))
+        self.check("有羽毛")
+        changes.clear()
+        self.selector.set_enabled(False)
+        self.selector.set_enabled(False)
+        self.assertEqual(len(changes), 1)
+        index = self.selector.model.index(0)
+        self.assertFalse(self.selector.model.flags(index) & Qt.ItemIsEnabled)
+        self.assertFalse(self.check("善飞"))
+        self.assertEqual(self.selector.checked_features(), ["有羽毛"])
+        self.selector.set_enabled(True)
+        self.assertTrue(self.selector.model.flags(index) & Qt.ItemIsEnabled)
+
+    def test_new_vocabulary_keeps_remaining_checks(self):
+        self.check("有羽毛")
+        self.check("善飞")
+        self.selector.set_features({"1": "有羽毛", "2": "会游泳"})
+        self.assertEqual(self.selector.checked_features(), ["有羽毛"])
+        self.assertEqual(self.selector.count_label.text(), "2 个，已选 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
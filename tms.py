@@ -0,0 +1,112 @@
+from collections import deque
+
+from compiler import rule_parts
+
+
+class TruthMaintenance:
+    """基于依据的真值维护（增量正向推理）
+
+    每次断言或撤回一个基本事实，只处理依赖它的规则和结论：
+    断言时沿前提索引向前传播；撤回时先删除所有可能依赖它的推导结论，
+    再检查这些结论是否还有别的依据，能重新推出的就恢复（DRed 方法），
+    因此规则中存在循环时也不会留下失去依据的结论。
+    规则库变化后需要调用 reset。
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.base = {}     # 基本事实（按断言顺序）
+        self.derived = {}  # 推导出的事实 -> 作为依据的规则编号（按推出顺序）
+        self.count = {}    # 规则编号 -> 当前成立的前提数
+        self.need = {}     # 规则编号 -> 去重后的前提数
+        self.reset()
+
+    def holds(self, fact):
+        return fact in self.base or fact in self.derived
+
+    def _need(self, rid):
+        need = self.need.get(rid)
+        if need is None:
+            need = self.need[rid] = len(set(rule_parts(self.rules[rid])[0]))
+        return need
+
+    def reset(self):
+        """按当前规则库和基本事实重新建立全部推导"""
+        self.derived.clear()
+        self.count.clear()
+        self.need.clear()
+        added = []
+        for rid, rule in self.rules.items():
+            conclusion = rule_parts(rule)[1]
+            if self._need(rid) == 0 and not self.holds(conclusion):
+                self.derived[conclusion] = rid
+                added.append(conclusion)
+        self._propagate(list(self.base) + added, [])
+
+    def _propagate(self, queue, added):
+        queue = deque(queue)
+        while queue:
+            fact = queue.popleft()
+            for rid in self.rules.by_premise.get(fact, ()):
+                count = self.count.get(rid, 0) + 1
+                self.count[rid] = count
+                if count == self._need(rid):
+                    conclusion = rule_parts(self.rules[rid])[1]
+                    if not self.holds(conclusion):
+                        self.derived[conclusion] = rid
+                        added.append(conclusion)
+                        queue.append(conclusion)
+
+    def assert_fact(self, fact):
+        """断言一个基本事实，返回因此新推出的事实"""
+        if fact in self.base:
+            return []
+        held = self.holds(fact)
+        self.base[fact] = None
+        if held:
+            # 原来是推导结论，现在成为基本事实，不影响其他事实
+            del self.derived[fact]
+            return []
+        added = []
+        self._propagate([fact], added)
+        return added
+
+    def retract_fact(self, fact):
+        """撤回一个基本事实，返回因此失去依据的事实（包括它自己）"""
+        if fact not in self.base:
+            return []
+        del self.base[fact]
+
+        # 第一步：删除所有可能依赖它的推导结论
+        removed = [fact]
+        stack = [fact]
+        while stack:
+            current = stack.pop()
+            for rid in self.rules.by_premise.get(current, ()):
+                count = self.count[rid]
+                self.count[rid] = count - 1
+                if count == self._need(rid):
+                    conclusion = rule_parts(self.rules[rid])[1]
+                    if conclusion in self.derived:
+                        del self.derived[conclusion]
+                        removed.append(conclusion)
+                        stack.append(conclusion)
+
+        # 第二步：仍有其他依据的结论重新推出
+        for conclusion in removed:
+            if self.holds(conclusion):
+                continue
+            for rid in self.rules.by_conclusion.get(conclusion, ()):
+                if self.count.get(rid, 0) == self._need(rid):
+                    self.derived[conclusion] = rid
+                    self._propagate([conclusion], [])
+                    break
+
+        return [fact for fact in removed if not self.holds(fact)]
+
+    def facts(self):
+        return list(self.base) + list(self.derived)
+
+    def trace(self):
+        """每个推导结论及其依据规则，按推出顺序"""
+        return [self.rules[rid] for rid in self.derived.values()]
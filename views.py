@@ -0,0 +1,405 @@
+"""界面用到的模型/视图组件
+
+列表内容都保存在模型里，QListView 只为可见的行取数据，
+几十万行的推理过程或规则库也不会拖慢界面。
+"""
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel, pyqtSignal
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QListView, QLineEdit, QComboBox, QPushButton, QLabel
+)
+
+from compiler import rule_parts
+from engine import format_rule
+
+# 推理过程记录的类别：类别 -> 过滤框中的名称
+TRACE_KINDS = {
+    "header": "标题",
+    "fact": "事实",
+    "rule": "规则",
+    "result": "结果",
+    "warning": "警告",
+    "info": "说明",
+}
+
+KIND_COLORS = {
+    "header": QColor("#1565C0"),
+    "result": QColor("#2E7D32"),
+    "warning": QColor("#C62828"),
+}
+
+
+class TraceModel(QAbstractListModel):
+    """推理过程模型
+
+    每条记录是 (类别, 文本, 规则)：规则记录的显示文本是“文本 + 规则”，
+    在显示时才格式化。过滤条件（类别、包含的文字）生效时，
+    visible 保存通过过滤的记录下标。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+        self.visible = None
+        self.kind = None
+        self.pattern = ""
+
+    @staticmethod
+    def text(record):
+        kind, text, rule = record
+        return text if rule is None else text + format_rule(rule)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.records) if self.visible is None else len(self.visible)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        record = self.records[row if self.visible is None else self.visible[row]]
+        if role == Qt.DisplayRole:
+            return self.text(record)
+        if role == Qt.ForegroundRole:
+            return KIND_COLORS.get(record[0])
+        return None
+
+    def _accepts(self, record):
+        if self.kind is not None and record[0] != self.kind:
+            return False
+        return not self.pattern or self.pattern in self.text(record)
+
+    def extend(self, records):
+        """追加一批记录，整批只通知视图一次"""
+        if not records:
+            return
+        start = len(self.records)
+        if self.visible is None:
+            self.beginInsertRows(QModelIndex(), start, start + len(records) - 1)
+            self.records.extend(records)
+            self.endInsertRows()
+            return
+        self.records.extend(records)
+        rows = [start + i for i, record in enumerate(records) if self._accepts(record)]
+        if rows:
+            first = len(self.visible)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.visible.extend(rows)
+            self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.records = []
+        if self.visible is not None:
+            self.visible = []
+        self.endResetModel()
+
+    def set_filter(self, kind=None, pattern=""):
+        """只显示指定类别且包含 pattern 的记录；两者都为空时显示全部"""
+        self.beginResetModel()
+        self.kind = kind
+        self.pattern = pattern
+        if kind is None and not pattern:
+            self.visible = None
+        else:
+            self.visible = [i for i, record in enumerate(self.records) if self._accepts(record)]
+        self.endResetModel()
+
+    def find(self, pattern, start, step=1):
+        """从第 start 行（不含）起按 step 方向循环查找包含 pattern 的行，找不到返回 -1"""
+        count = self.rowCount()
+        records = self.records
+        visible = self.visible
+        for offset in range(1, count + 1):
+            row = (start + step * offset) % count
+            if pattern in self.text(records[row if visible is None else visible[row]]):
+                return row
+        return -1
+
+    def lines(self):
+        """全部记录的文本（不受过滤影响）"""
+        return [self.text(record) for record in self.records]
+
+
+class RuleListModel(QAbstractListModel):
+    """规则库的列表模型
+
+    rows 只保存规则编号，文本在显示时才格式化；Qt.UserRole 返回规则编号。
+    按前提或结论过滤：新的关键字包含上一次的关键字（边输入边过滤）时，
+    只在上一次的结果里继续筛选，不必重新扫描整个规则库。
+    """
+
+    FIELDS = ("all", "premise", "conclusion")
+
+    def __init__(self, rules, parent=None):
+        """rules 为 RuleBase"""
+        super().__init__(parent)
+        self.rules = rules
+        self.field = "all"
+        self.pattern = ""
+        self.rows = list(rules.ids())
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        rid = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return format_rule(self.rules[rid])
+        if role == Qt.UserRole:
+            return rid
+        return None
+
+    def _matches(self, rid, pattern, field):
+        premises, conclusion = rule_parts(self.rules[rid])
+        if field != "premise" and pattern in conclusion:
+            return True
+        return field != "conclusion" and any(pattern in cond for cond in premises)
+
+    def set_filter(self, pattern, field="all"):
+        pattern = pattern.strip()
+        self.beginResetModel()
+        if not pattern:
+            self.rows = list(self.rules.ids())
+        else:
+            narrowing = field == self.field and self.pattern and self.pattern in pattern
+            candidates = self.rows if narrowing else self.rules.ids()
+            self.rows = [rid for rid in candidates if self._matches(rid, pattern, field)]
+        self.field = field
+        self.pattern = pattern
+        self.endResetModel()
+
+    def refresh(self):
+        """规则库变化后按当前过滤条件重新取行"""
+        pattern, self.pattern = self.pattern, ""
+        self.set_filter(pattern, self.field)
+
+
+class FeatureModel(QAbstractListModel):
+    """可勾选的特征列表模型
+
+    每行是一个特征名称，同名的特征编号（如 4 和 17 都是“不会飞”）合并为一行，
+    显示为“4/17: 不会飞”；Qt.UserRole 返回特征名称。勾选状态保存在模型里，
+    视图只为可见的行取数据。enabled 为整个模型的状态，切换时只通知视图一次。
+    """
+
+    toggled = pyqtSignal(str, bool)  # 特征名称、是否勾选
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.names = []
+        self.labels = []
+        self.checked = set()
+        self.enabled = True
+
+    def set_features(self, features):
+        """按 特征编号 -> 名称 重建各行，保留仍然存在的特征的勾选状态"""
+        keys = {}
+        for key, name in features.items():
+            keys.setdefault(name, []).append(key)
+        self.beginResetModel()
+        self.names = list(keys)
+        self.labels = [f"{'/'.join(same)}: {name}" for name, same in keys.items()]
+        self.checked &= keys.keys()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.labels[row]
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.names[row] in self.checked else Qt.Unchecked
+        if role == Qt.UserRole:
+            return self.names[row]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if not self.enabled:
+            return Qt.ItemIsUserCheckable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole or not self.enabled:
+            return False
+        name = self.names[index.row()]
+        present = value == Qt.Checked
+        if present == (name in self.checked):
+            return True
+        if present:
+            self.checked.add(name)
+        else:
+            self.checked.discard(name)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.toggled.emit(name, present)
+        return True
+
+    def set_enabled(self, enabled):
+        """启用或禁用全部特征"""
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if self.names:
+            self.dataChanged.emit(self.index(0), self.index(len(self.names) - 1), [])
+
+    def checked_features(self):
+        """勾选的特征名称，按特征的顺序"""
+        checked = self.checked
+        return [name for name in self.names if name in checked]
+
+
+class FeatureSelector(QWidget):
+    """带搜索框的特征选择区
+
+    过滤交给 QSortFilterProxyModel，按显示文本（编号和名称）边输入边过滤，
+    不影响勾选状态；被过滤掉的已勾选特征仍然参与推理。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = FeatureModel(self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        # 过滤条件与勾选状态无关，勾选或启用/禁用时不必重新过滤
+        self.proxy.setDynamicSortFilter(False)
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("搜索特征…")
+        self.search_input.setClearButtonEnabled(True)
+        self.count_label = QLabel()
+
+        self.list_view = QListView()
+        self.list_view.setModel(self.proxy)
+        self.list_view.setUniformItemSizes(True)
+
+        tools = QHBoxLayout()
+        tools.addWidget(self.search_input, 1)
+        tools.addWidget(self.count_label)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(tools)
+        layout.addWidget(self.list_view)
+
+        self.search_input.textChanged.connect(self.apply_filter)
+        self.model.toggled.connect(self.update_count)
+        self.model.modelReset.connect(self.update_count)
+
+    def set_features(self, features):
+        self.model.set_features(features)
+        self.apply_filter()
+
+    def set_enabled(self, enabled):
+        self.model.set_enabled(enabled)
+
+    def checked_features(self):
+        return self.model.checked_features()
+
+    def apply_filter(self):
+        self.proxy.setFilterFixedString(self.search_input.text().strip())
+        self.update_count()
+
+    def update_count(self):
+        shown = self.proxy.rowCount()
+        total = self.model.rowCount()
+        checked = len(self.model.checked)
+        text = f"{shown}/{total}" if shown != total else f"{total} 个"
+        self.count_label.setText(f"{text}，已选 {checked}")
+
+
+class TraceView(QWidget):
+    """带类别过滤、文字过滤和查找的推理过程显示区
+
+    append 与原来 QTextBrowser.append 的用法相近，
+    但记录按类别保存，显示交给 QListView 按需绘制。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = TraceModel(self)
+
+        self.kind_combo = QComboBox()
+        self.kind_combo.addItem("全部", None)
+        for kind, title in TRACE_KINDS.items():
+            self.kind_combo.addItem(title, kind)
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("过滤…")
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("查找…")
+        self.btn_prev = QPushButton("上一个")
+        self.btn_next = QPushButton("下一个")
+        self.count_label = QLabel()
+
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        # 行高一致时视图不需要逐行测量，滚动与行数无关
+        self.list_view.setUniformItemSizes(True)
+
+        tools = QHBoxLayout()
+        tools.addWidget(self.kind_combo)
+        tools.addWidget(self.filter_input, 1)
+        tools.addWidget(self.search_input, 1)
+        tools.addWidget(self.btn_prev)
+        tools.addWidget(self.btn_next)
+        tools.addWidget(self.count_label)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(tools)
+        layout.addWidget(self.list_view)
+
+        self.kind_combo.currentIndexChanged.connect(self.apply_filter)
+        self.filter_input.textChanged.connect(self.apply_filter)
+        self.search_input.returnPressed.connect(self.find_next)
+        self.btn_next.clicked.connect(self.find_next)
+        self.btn_prev.clicked.connect(self.find_previous)
+        self.model.rowsInserted.connect(self.update_count)
+        self.model.modelReset.connect(self.update_count)
+
+    def append(self, text, kind="info"):
+        """追加文本，多行文本拆成多条记录"""
+        self.model.extend([(kind, line, None) for line in text.split("\n")])
+
+    def extend(self, records):
+        """追加 (类别, 文本, 规则) 记录"""
+        self.model.extend(records)
+
+    def clear(self):
+        self.model.clear()
+
+    def lines(self):
+        return self.model.lines()
+
+    def apply_filter(self):
+        self.model.set_filter(self.kind_combo.currentData(), self.filter_input.text())
+
+    def update_count(self):
+        shown = self.model.rowCount()
+        total = len(self.model.records)
+        self.count_label.setText(f"{shown}/{total}" if shown != total else f"{total} 行")
+
+    def find_next(self):
+        self._find(1)
+
+    def find_previous(self):
+        self._find(-1)
+
+    def _find(self, step):
+        pattern = self.search_input.text()
+        if not pattern or not self.model.rowCount():
+            return
+        current = self.list_view.currentIndex()
+        start = current.row() if current.isValid() else (-1 if step > 0 else 0)
+        row = self.model.find(pattern, start, step)
+        if row >= 0:
+            index = self.model.index(row)
+            self.list_view.setCurrentIndex(index)
+            self.list_view.scrollTo(index, QListView.PositionAtCenter)